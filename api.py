@@ -0,0 +1,404 @@
+"""
+班表轉換 HTTP API（ASGI / Starlette），給病房儀表板、訊息機器人等其他工具使用，不必爬 Streamlit 頁面。
+
+    GET /schedules                                       近三個月的共用班表（Drive 列檔）
+    GET /schedules/{id}/codes/{code}?format=json|csv|ics  某個代號在該份班表的班
+    GET /schedules/{id}/diagnostics                      時間規則診斷：各規則命中數、沒有時間的班（所有代號）
+    GET /feeds/{code}.ics                                 訂閱用日曆：某個代號在近三個月所有班表的班
+    GET /metrics/google-api                               Google API 節流指標（google_limits.py）
+
+轉換走與頁面相同的 drive_client / schedule_core，共用同一組行程內快取（schedule_cache.py）：
+同一份班表只下載、解析一次，同一個代號只轉換一次，快取命中時每個請求只剩序列化輸出。
+時間規則使用目前生效的規則版本（rule_sets.get_active_rule_set），發布新版本不必重啟；
+縮寫使用該代號在頁面上儲存的縮寫設定（profiles.py），沒有儲存時用規則版本的預設縮寫。
+班表清單、metadata 與內容先讀本機鏡像（schedule_mirror.py），鏡像沒有時才連 Drive。
+
+啟動方式：
+    uvicorn api:app --port 8502                  獨立行程（快取與頁面分開）
+    SCHEDULE_API_PORT=8502 streamlit run ...     與頁面同一個行程（ensure_background_workers 會啟動），共用快取
+
+轉換都是同步的 pandas 運算，端點寫成一般函式，Starlette 會放到執行緒池執行，可同時處理多個請求。
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+import numpy as np
+import pandas as pd
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from drive_client import (
+    SCHEDULE_MIMES,
+    DriveConfigError,
+    get_drive_file_metadata,
+    has_service_account,
+    is_valid_drive_file_id,
+    schedule_sort_key,
+)
+from google_limits import google_api_metrics
+from profiles import profile_simplify_map, profile_updated_at
+from rule_sets import get_active_rule_set
+from schedule_mirror import (
+    list_schedule_files,
+    load_schedule_file,
+    mirror_is_stale,
+    mirror_metadata,
+    start_mirror_sync_worker,
+)
+from schedule_cache import feed_cache
+from schedule_core import (
+    DRIVE_SOURCES,
+    NoMatchingShiftsError,
+    ScheduleConvertError,
+    convert_schedule,
+    date_labels,
+    diagnostics_json,
+    empty_shift_frame,
+    parse_year_month_from_drive_filename,
+    rule_diagnostics,
+    simplify_map_hash,
+)
+from schedule_export import csv_export, ics_export
+
+
+logger = logging.getLogger(__name__)
+
+API_HOST = os.environ.get("SCHEDULE_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("SCHEDULE_API_PORT", "0") or 0)
+
+FORMATS = ("json", "csv", "ics")
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def error_response(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status)
+
+
+# ============================================================
+# 1) 取得班表與轉換
+# ============================================================
+def schedule_info(meta: dict) -> dict:
+    ym = parse_year_month_from_drive_filename(meta.get("name", ""))
+    return {
+        "id": meta["id"],
+        "name": meta.get("name", ""),
+        "modifiedTime": meta.get("modifiedTime"),
+        "year_month": ym[2] if ym else None,
+    }
+
+
+def load_schedule(file_id: str) -> tuple:
+    """file_id -> (meta, 班表 bytes)；先讀本機鏡像，沒有時經過 drive_client 的快取查詢、下載。"""
+    if not is_valid_drive_file_id(file_id):
+        raise ApiError(400, "檔案 ID 格式不正確")
+    meta = mirror_metadata(file_id)
+    if meta is None:
+        from googleapiclient.errors import HttpError
+
+        try:
+            meta = get_drive_file_metadata(file_id)
+        except HttpError as e:
+            if e.resp.status in (403, 404):
+                raise ApiError(404, "找不到這個檔案，或檔案尚未共用給服務帳號") from e
+            raise
+    if meta.get("mimeType") not in SCHEDULE_MIMES:
+        raise ApiError(404, "這個檔案不是 Google 試算表或 Excel（.xlsx）班表")
+    bio, _ = load_schedule_file(meta)
+    return meta, bio.getvalue()
+
+
+def code_simplify_map(code: str, rule_set) -> dict:
+    """代號儲存的縮寫設定；沒有儲存時用規則版本的預設縮寫。"""
+    simplify_map = profile_simplify_map(code)
+    return rule_set.simplify_map if simplify_map is None else simplify_map
+
+
+def convert_code(file_id: str, code: str, rule_set=None) -> tuple:
+    """回傳 (meta, df_output, year_month)；找不到代號或無法轉換時拋出 ApiError。rule_set 預設為目前版本。"""
+    rule_set = rule_set or get_active_rule_set()
+    meta, excel_bytes = load_schedule(file_id)
+    try:
+        df_output, year_month = convert_schedule(
+            code, DRIVE_SOURCES[0], excel_bytes, meta.get("name", ""), code_simplify_map(code, rule_set),
+            time_rules=rule_set.time_rules,
+        )
+    except NoMatchingShiftsError as e:
+        raise ApiError(404, str(e)) from e
+    except ScheduleConvertError as e:
+        raise ApiError(422, str(e)) from e
+    return meta, df_output, year_month
+
+
+def shifts_json(df_output) -> list:
+    """每個班 -> {subject, date, start, end}；start / end 為 ISO 8601 當地時間（跨夜的班 end 在隔天），沒有時間為 null。"""
+    def iso(times):
+        text = np.datetime_as_string(times.to_numpy(dtype="datetime64[ns]"), unit="m")
+        return [None if t == "NaT" else t for t in text.tolist()]
+
+    return [
+        {"subject": subject, "date": day, "start": start, "end": end}
+        for subject, day, start, end in zip(
+            df_output["Subject"].tolist(), date_labels(df_output["Date"]).tolist(),
+            iso(df_output["Start"]), iso(df_output["End"]),
+        )
+    ]
+
+
+# ============================================================
+# 2) 端點
+# ============================================================
+def schedule_listing() -> tuple:
+    """
+    近三個月、檔名看得出年月的班表，新的在前（先讀本機鏡像，沒有時向 Drive 列檔，經過 drive_client 的快取）。
+    回傳 (schedules, synced_at)；synced_at 見 schedule_mirror.list_schedule_files。
+    """
+    files, synced_at = list_schedule_files()
+    schedules = [f for f in files if schedule_sort_key(f.get("name")) >= 0]
+    schedules.sort(key=lambda f: schedule_sort_key(f["name"]), reverse=True)
+    return schedules, synced_at
+
+
+def recent_schedules() -> list:
+    return schedule_listing()[0]
+
+
+def list_schedules(request):
+    try:
+        schedules, synced_at = schedule_listing()
+    except DriveConfigError as e:
+        return error_response(503, str(e))
+    return JSONResponse({
+        "schedules": [schedule_info(f) for f in schedules],
+        # 清單來自本機鏡像時的最後同步時間；stale 表示鏡像過期而且 Drive 連不上，清單可能不是最新的
+        "mirror_synced_at": synced_at,
+        "stale": bool(synced_at) and mirror_is_stale(synced_at),
+    })
+
+
+def code_shifts(request):
+    file_id = request.path_params["file_id"]
+    code = request.path_params["code"].strip()
+    fmt = request.query_params.get("format", "json")
+    if fmt not in FORMATS:
+        return error_response(400, f"format 只支援 {' / '.join(FORMATS)}")
+    if not code:
+        return error_response(400, "請提供班表代號")
+
+    try:
+        meta, df_output, year_month = convert_code(file_id, code)
+    except ApiError as e:
+        return error_response(e.status, e.message)
+    except DriveConfigError as e:
+        return error_response(503, str(e))
+
+    if fmt == "json":
+        return JSONResponse({
+            "schedule": schedule_info(meta),
+            "code": code,
+            "year_month": year_month,
+            "shifts": shifts_json(df_output),
+        })
+
+    stem = f"{year_month}個人班表({code})"
+    if fmt == "csv":
+        export, media_type = csv_export(df_output), "text/csv; charset=utf-8"
+    else:
+        export, media_type = ics_export(df_output, stem), "text/calendar; charset=utf-8"
+    return StreamingResponse(
+        export.iter_chunks(),
+        media_type=media_type,
+        headers={
+            "Content-Length": str(export.size),
+            "Content-Disposition": f"attachment; filename*=UTF-8''{_quote(stem)}.{fmt}",
+        },
+    )
+
+
+def schedule_diagnostics(request):
+    file_id = request.path_params["file_id"]
+    try:
+        meta, excel_bytes = load_schedule(file_id)
+        time_rules = get_active_rule_set().time_rules
+        df_rule_stats, df_untimed, year_month = rule_diagnostics(
+            DRIVE_SOURCES[0], excel_bytes, meta.get("name", ""), time_rules=time_rules,
+        )
+    except ApiError as e:
+        return error_response(e.status, e.message)
+    except ScheduleConvertError as e:
+        return error_response(422, str(e))
+    except DriveConfigError as e:
+        return error_response(503, str(e))
+    report = diagnostics_json(df_rule_stats, df_untimed, year_month, time_rules)
+    return JSONResponse({"schedule": schedule_info(meta), **report})
+
+
+def _quote(text: str) -> str:
+    from urllib.parse import quote
+
+    return quote(text, safe="")
+
+
+# ============================================================
+# 3) 訂閱用日曆
+# ============================================================
+# 日曆軟體每隔幾小時輪詢一次；內容沒變時回 304，不下載、不轉換、不重新產生 ICS
+FEED_CACHE_CONTROL = "max-age=900"
+
+
+def feed_key(code: str, schedules: list, rule_set, last_modified) -> tuple:
+    """
+    只由列檔結果（file_id、modifiedTime）、縮寫表與時間規則的 hash，以及 DTSTAMP（last_modified）決定；
+    都沒更新時 key 不變。內容相同但重新發布規則、刪除縮寫設定時 DTSTAMP 不同，檔案（與 ETag）也不同。
+    """
+    versions = tuple((f["id"], f.get("modifiedTime", "")) for f in schedules)
+    return (
+        code, versions, simplify_map_hash(code_simplify_map(code, rule_set)), rule_set.time_rules.hash, last_modified,
+    )
+
+
+def feed_etag(key: tuple) -> str:
+    return '"' + hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def feed_last_modified(code: str, schedules: list, rule_set):
+    """
+    日曆內容最後一次可能改變的時間（datetime，UTC）：各班表的 modifiedTime、規則版本的發布時間，
+    以及代號縮寫設定最後一次儲存或刪除的時間，取最大值（feed_key 的每個來源都算進去）；都沒有時回傳 None。
+    """
+    stamps = [f.get("modifiedTime") for f in schedules] + [rule_set.published_at, profile_updated_at(code)]
+    times = []
+    for stamp in filter(None, stamps):
+        try:
+            parsed = datetime.fromisoformat(stamp.replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        times.append(parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc))
+    return max(times).astimezone(timezone.utc).replace(microsecond=0) if times else None
+
+
+def not_modified(request, etag: str, last_modified) -> bool:
+    """If-None-Match 優先（RFC 9110）；沒有時才看 If-Modified-Since。"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def build_feed(code: str, schedules: list, dtstamp, rule_set) -> bytes:
+    """把代號在每份班表的班合成一份 ICS；某份班表沒有這個代號或無法轉換時略過。"""
+    frames = []
+    for meta in reversed(schedules):
+        try:
+            _, df_output, _ = convert_code(meta["id"], code, rule_set)
+        except ApiError as e:
+            if e.status != 404:
+                logger.warning("訂閱日曆略過 %s：%s", meta.get("name"), e.message)
+            continue
+        frames.append(df_output)
+    df_all = pd.concat(frames, ignore_index=True) if frames else empty_shift_frame()
+    # DTSTAMP 固定為內容最後改變的時間（feed_last_modified）：內容相同的請求產生完全相同的檔案
+    export = ics_export(df_all, f"班表（{code}）", dtstamp)
+    try:
+        return export.getvalue()
+    finally:
+        export.close()
+
+
+def code_feed(request):
+    code = request.path_params["code"].strip()
+    if not code:
+        return error_response(400, "請提供班表代號")
+    try:
+        schedules = recent_schedules()
+    except DriveConfigError as e:
+        return error_response(503, str(e))
+
+    # 整份日曆用同一個規則版本產生（ETag 也以它計算）
+    rule_set = get_active_rule_set()
+    last_modified = feed_last_modified(code, schedules, rule_set)
+    key = feed_key(code, schedules, rule_set, last_modified)
+    etag = feed_etag(key)
+    headers = {"ETag": etag, "Cache-Control": FEED_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    body = feed_cache.get(key)
+    if body is None:
+        try:
+            body = build_feed(code, schedules, last_modified, rule_set)
+        except DriveConfigError as e:
+            return error_response(503, str(e))
+        feed_cache.set(key, body)
+    return Response(body, media_type="text/calendar; charset=utf-8", headers=headers)
+
+
+def google_api_limits(request):
+    return JSONResponse(google_api_metrics())
+
+
+ROUTES = [
+    Route("/schedules", list_schedules),
+    Route("/schedules/{file_id}/codes/{code}", code_shifts),
+    Route("/schedules/{file_id}/diagnostics", schedule_diagnostics),
+    Route("/feeds/{code}.ics", code_feed),
+    Route("/metrics/google-api", google_api_limits),
+]
+
+
+def create_app(background_workers: bool = True) -> Starlette:
+    """
+    background_workers：獨立執行時自己啟動背景預載與 Drive 變更追蹤（快取才會在班表更新時清掉）；
+    與頁面同一個行程時由頁面負責，這裡不重複啟動。
+    """
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        if background_workers and has_service_account():
+            from drive_changes import start_change_watcher
+            from prefetch import refresh_after_change, start_prefetch_worker
+
+            start_prefetch_worker()
+            start_mirror_sync_worker()
+            start_change_watcher("api", on_change=refresh_after_change)
+        yield
+
+    return Starlette(routes=ROUTES, lifespan=lifespan)
+
+
+app = create_app()
+
+
+# ============================================================
+# 4) 與 Streamlit 頁面同一個行程執行
+# ============================================================
+def start_api_server(host: str = API_HOST, port: int = API_PORT):
+    """在背景執行緒啟動 uvicorn，回傳 uvicorn.Server（server.should_exit = True 可停止）。"""
+    import uvicorn
+
+    config = uvicorn.Config(create_app(background_workers=False), host=host, port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="schedule-api", daemon=True)
+    thread.start()
+    logger.info("班表 API 已啟動：http://%s:%s", host, port)
+    return server
@@ -0,0 +1,27 @@
+"""
+效能測試與開發工具（不會被 Streamlit 頁面 import）。
+
+請在 repo 根目錄用 `python -m benchmarks.<模組>` 執行。
+驗證腳本（check_*.py）共用 Checks：逐項 expect 印出 ✅ / ❌，最後 finish，有任何一項失敗時以 exit code 1 結束。
+"""
+import sys
+
+
+class Checks:
+    """一個驗證腳本的檢查結果。"""
+
+    def __init__(self):
+        self.failures = []
+
+    def expect(self, label: str, condition) -> bool:
+        print(f"  {'✅' if condition else '❌'} {label}")
+        if not condition:
+            self.failures.append(label)
+        return bool(condition)
+
+    def finish(self, message: str):
+        """有失敗時以 exit code 1 結束，否則印出 message。"""
+        if self.failures:
+            print(f"\n❌ {len(self.failures)} 項失敗")
+            sys.exit(1)
+        print(f"\n✅ {message}")
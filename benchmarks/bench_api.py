@@ -0,0 +1,222 @@
+"""
+HTTP API（api.py）驗證與壓力測試（對本機假 Drive）：
+
+    - /schedules 列出假 Drive 上的班表
+    - /schedules/{id}/diagnostics 的各規則命中數與直接呼叫 rule_diagnostics 相同
+    - /schedules/{id}/codes/{code} 的 JSON / CSV / ICS 與直接呼叫 convert_schedule / schedule_export 相同
+    - 錯誤狀態碼：ID 格式不對 400、找不到檔案或代號 404、不支援的 format 400
+    - 訂閱日曆 /feeds/{code}.ics：If-None-Match / If-Modified-Since 回 304、不碰 Drive 也不重新產生；
+      班表更新（變更追蹤）後 ETag 改變、內容重新產生；儲存 / 刪除縮寫設定、發布規則版本後
+      Last-Modified 與 DTSTAMP 往後，舊的 If-Modified-Since 回 200
+    - 同時送出多個請求（快取已暖），回報每秒請求數與 p50 / p95 / p99 延遲
+
+uvicorn 在背景執行緒啟動（與頁面內嵌 API 的方式相同），用 httpx 的執行緒池送請求。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --clients 16 --requests 400
+"""
+import argparse
+import os
+import random
+import socket
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import httpx
+import pandas as pd
+
+from benchmarks import Checks
+from benchmarks.fake_drive import FakeDriveServer, seed_schedules
+from benchmarks.load_test import percentile
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook, staff_codes
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def without_dtstamp(ics: bytes) -> bytes:
+    """DTSTAMP 是產生檔案的時間，比對時略過。"""
+    return b"\r\n".join(line for line in ics.split(b"\r\n") if not line.startswith(b"DTSTAMP:"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API 驗證與壓力測試")
+    parser.add_argument("--staff", type=int, default=60)
+    parser.add_argument("--tasks", type=int, default=58)
+    parser.add_argument("--clients", type=int, default=8, help="同時送請求的用戶端數")
+    parser.add_argument("--requests", type=int, default=200, help="壓力測試的請求總數")
+    args = parser.parse_args()
+
+    server = FakeDriveServer().start()
+    # drive_client 在 import 時讀取端點設定
+    os.environ["DRIVE_API_ENDPOINT"] = server.endpoint
+    # 以內建規則與預設縮寫比對：不受本機 rules/ 目錄裡發布過的版本、儲存過的縮寫設定影響
+    rules_dir = tempfile.TemporaryDirectory()
+    os.environ["SCHEDULE_RULES_DIR"] = rules_dir.name
+    os.environ["SCHEDULE_PROFILES_PATH"] = str(Path(rules_dir.name) / "profiles.sqlite3")
+    # 不讀本機鏡像裡同步過的真實班表
+    os.environ["SCHEDULE_MIRROR_DIR"] = str(Path(rules_dir.name) / "mirror")
+    import schedule_core as core
+    import api
+    from api import start_api_server
+    from drive_changes import ChangeTracker
+    from profiles import delete_profile, save_profile
+    from rule_sets import BUILTIN_RULE_SET, publish_rule_set
+    from schedule_export import csv_export, ics_export
+
+    ids = seed_schedules(server.drive, [(2026, 2), (2026, 3)], n_staff=args.staff, n_task_rows=args.tasks)
+    file_name = drive_file_name(2026, 3)
+    file_id = ids[file_name]
+    content = server.drive.files[file_id]["content"]
+    codes = staff_codes(args.staff)
+
+    port = free_port()
+    api_server = start_api_server(port=port)
+    while not api_server.started:
+        time.sleep(0.01)
+    base = f"http://127.0.0.1:{port}"
+    checks = Checks()
+    expect = checks.expect
+
+    with httpx.Client(base_url=base, timeout=30) as client:
+        print("📋 /schedules")
+        listed = client.get("/schedules").json()["schedules"]
+        expect("列出兩份班表（新的在前）", [s["id"] for s in listed] == [ids[drive_file_name(2026, 3)], ids[drive_file_name(2026, 2)]])
+        expect("附年月", listed[0]["year_month"] == "202603")
+
+        print("📄 /schedules/{id}/codes/{code}")
+        code = codes[0]
+        df_output, year_month = core.convert_schedule(
+            code, core.DRIVE_SOURCES[0], content, file_name, BUILTIN_RULE_SET.simplify_map, use_cache=False,
+        )
+        body = client.get(f"/schedules/{file_id}/codes/{code}").json()
+        expect("JSON 班數相同", len(body["shifts"]) == len(df_output) and body["year_month"] == year_month)
+        expect("JSON 內容相同", [s["subject"] for s in body["shifts"]] == list(df_output["Subject"]))
+        resp = client.get(f"/schedules/{file_id}/codes/{code}", params={"format": "csv"})
+        expect("CSV 與頁面下載相同", resp.content == csv_export(df_output).getvalue())
+        resp = client.get(f"/schedules/{file_id}/codes/{code}", params={"format": "ics"})
+        expected_ics = ics_export(df_output, f"{year_month}個人班表({code})").getvalue()
+        expect("ICS 與頁面下載相同", without_dtstamp(resp.content) == without_dtstamp(expected_ics))
+        def uids(df):
+            return [line for line in ics_export(df, "UID").getvalue().split(b"\r\n") if line.startswith(b"UID:")]
+
+        doubled = uids(pd.concat([df_output.head(1)] * 2, ignore_index=True))
+        expect("開始時間與內容都相同的兩個班 UID 不同（第一個與只有一個班時相同）",
+               len(set(doubled)) == 2 and doubled[0] == uids(df_output.head(1))[0])
+        expect("Content-Length 正確", int(resp.headers["content-length"]) == len(resp.content))
+
+        print("🩺 /schedules/{id}/diagnostics")
+        df_rule_stats, df_untimed, _ = core.rule_diagnostics(core.DRIVE_SOURCES[0], content, file_name, use_cache=False)
+        body = client.get(f"/schedules/{file_id}/diagnostics").json()
+        expect("各規則命中數與直接計算相同", [r["timed"] for r in body["rules"]] == list(df_rule_stats["設定時間班數"])
+               and len(body["untimed"]) == len(df_untimed) and body["schedule"]["id"] == file_id)
+
+        limits = client.get("/metrics/google-api").json()
+        expect("Google API 節流指標", limits["endpoints"]["files.get_media"]["calls"] >= 1)
+
+        print("🚫 錯誤狀態碼")
+        expect("ID 格式不對 400", client.get(f"/schedules/abc/codes/{code}").status_code == 400)
+        expect("找不到檔案 404", client.get(f"/schedules/{'x' * 33}/codes/{code}").status_code == 404)
+        expect("找不到代號 404", client.get(f"/schedules/{file_id}/codes/不存在").status_code == 404)
+        expect("不支援的 format 400", client.get(f"/schedules/{file_id}/codes/{code}", params={"format": "pdf"}).status_code == 400)
+
+        print("🔔 /feeds/{code}.ics")
+        feed_url = f"/feeds/{code}.ics"
+        n_events = sum(
+            len(core.convert_schedule(code, core.DRIVE_SOURCES[0], server.drive.files[fid]["content"], name,
+                                      BUILTIN_RULE_SET.simplify_map, use_cache=False)[0])
+            for name, fid in ids.items()
+        )
+        resp = client.get(feed_url)
+        etag, last_modified = resp.headers["etag"], resp.headers["last-modified"]
+        expect("合併兩個月份的班", resp.status_code == 200 and resp.content.count(b"BEGIN:VEVENT") == n_events)
+        again = client.get(feed_url)
+        expect("重複請求內容完全相同（含 DTSTAMP）", again.content == resp.content and again.headers["etag"] == etag)
+        server.drive.reset_counts()
+        builds = []
+        build_feed, api.build_feed = api.build_feed, lambda *a: builds.append(a) or build_feed(*a)
+        expect("If-None-Match 相同回 304", client.get(feed_url, headers={"If-None-Match": etag}).status_code == 304)
+        expect("If-Modified-Since 回 304",
+               client.get(feed_url, headers={"If-Modified-Since": last_modified}).status_code == 304)
+        expect("If-None-Match 不同回 200", client.get(feed_url, headers={"If-None-Match": '"old"'}).status_code == 200)
+        expect("304 與快取命中不碰 Drive、不重新產生", server.drive.request_counts == {} and not builds)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tracker = ChangeTracker(token_path=Path(tmp) / "token.json")
+            tracker.poll()
+            server.drive.update_file(file_id, make_schedule_workbook(args.staff, args.tasks, 2026, 3, seed=1))
+            tracker.poll()
+        resp = client.get(feed_url, headers={"If-None-Match": etag})
+        expect("班表更新後 ETag 改變並重新產生", resp.status_code == 200 and resp.headers["etag"] != etag and len(builds) == 1)
+        api.build_feed = build_feed
+
+        # Last-Modified 以秒為單位：每次變更前等到下一秒
+        changes = [
+            ("儲存縮寫設定", lambda: save_profile(code, [{"原始關鍵字": "處方判讀", "簡化後": "判讀"}])),
+            ("發布規則版本", lambda: publish_rule_set(note="bench_api")),
+            ("刪除縮寫設定", lambda: delete_profile(code)),
+        ]
+        for label, change in changes:
+            last_modified = resp.headers["last-modified"]
+            time.sleep(1.1)
+            change()
+            resp = client.get(feed_url, headers={"If-Modified-Since": last_modified})
+            stamp = parsedate_to_datetime(resp.headers["last-modified"]).strftime("DTSTAMP:%Y%m%dT%H%M%SZ").encode()
+            expect(f"{label}後 Last-Modified 往後、舊的 If-Modified-Since 回 200、DTSTAMP 相同",
+                   resp.status_code == 200 and resp.headers["last-modified"] != last_modified and stamp in resp.content)
+
+        n = 200
+        start = time.perf_counter()
+        for _ in range(n):
+            client.get(feed_url, headers={"If-None-Match": resp.headers["etag"]})
+        print(f"     304：{(time.perf_counter() - start) / n * 1000:.2f}ms/次", end="")
+        api.feed_cache.clear()
+        start = time.perf_counter()
+        client.get(feed_url)
+        print(f"   重新產生（轉換已快取）：{(time.perf_counter() - start) * 1000:.1f}ms")
+
+        # 暖快取：每個代號先轉換一次
+        for code in codes:
+            client.get(f"/schedules/{file_id}/codes/{code}")
+
+    print(f"\n⏱  {args.clients} 個用戶端、{args.requests} 個請求（快取已暖，nproc={os.cpu_count()}）")
+    rng = random.Random(0)
+    urls = [
+        (f"/schedules/{file_id}/codes/{rng.choice(codes)}", {"format": rng.choice(["json", "csv", "ics"])})
+        for _ in range(args.requests)
+    ]
+    latencies, statuses = [], []
+    with httpx.Client(base_url=base, timeout=30, limits=httpx.Limits(max_connections=args.clients)) as client:
+        def fetch(item):
+            url, params = item
+            start = time.perf_counter()
+            status = client.get(url, params=params).status_code
+            return time.perf_counter() - start, status
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            for latency, status in pool.map(fetch, urls):
+                latencies.append(latency)
+                statuses.append(status)
+        elapsed = time.perf_counter() - start
+
+    ok = sum(1 for s in statuses if s in (200, 404))
+    print(f"  {len(urls) / elapsed:.0f} req/s   p50 {percentile(latencies, 50) * 1000:.1f}ms   "
+          f"p95 {percentile(latencies, 95) * 1000:.1f}ms   p99 {percentile(latencies, 99) * 1000:.1f}ms")
+    expect("全部請求都有回應（200 / 找不到代號 404）", ok == len(urls))
+
+    api_server.should_exit = True
+    server.stop()
+    rules_dir.cleanup()
+    checks.finish("HTTP API 輸出與頁面相同")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+轉換流程效能測試。
+
+用 synth_schedule 產生不同規模（人數、工作內容列數、月份）的班表，
+分別計時 schedule_core 的各個階段與整個 convert_schedule：
+
+    parse    read_schedule_grid（pandas 讀 Excel）
+    holiday  build_holiday_map（openpyxl 讀灰底）
+    match    build_date_mapping + match_code_rows
+    rules    apply_time_rules
+    export   shift_frame + export_calendar_csv（型別化，再輸出 CSV 文字）
+    convert  convert_schedule（= 頁面上的 run_convert，清空所有快取後的冷流程）
+    cached   再轉換一次同樣的班表與代號（結果快取命中）
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.bench_convert              # 跑一次並印出結果
+    python -m benchmarks.bench_convert --record     # 寫入 benchmarks/baselines.json
+    python -m benchmarks.bench_convert --check      # 與基準比較，變慢超過門檻時 exit 1
+    python -m benchmarks.bench_convert --quick      # 只跑最小的情境
+    python -m benchmarks.bench_convert --memory     # 另外列出每月班表快取占用的記憶體
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import schedule_core as core
+from schedule_cache import layout_cache, parse_cache, result_cache, template_cache
+from benchmarks.synth_schedule import make_schedule_workbook, staff_codes
+
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+
+# (情境名稱, 人數, 工作內容列數, 月份清單)
+SCENARIOS = [
+    ("small", 30, 30, [(2026, 2)]),
+    ("sample", 60, 58, [(2026, 3)]),
+    ("large", 200, 120, [(2026, 3)]),
+    ("quarter", 60, 58, [(2026, 1), (2026, 2), (2026, 3)]),
+]
+
+STAGES = ["parse", "holiday", "match", "rules", "export", "convert", "cached"]
+
+# 比基準慢超過這個倍數就算退步（計時本身有雜訊，不要設太緊）
+DEFAULT_TOLERANCE = 1.5
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run_stages(excel_bytes: bytes, code: str, simplify_map: dict) -> dict:
+    """對一份班表、一個代號跑完整流程一次，回傳各階段秒數。"""
+    timings = {}
+
+    grid, timings["parse"] = _timed(core.read_schedule_grid, excel_bytes)
+    holiday_map, timings["holiday"] = _timed(core.build_holiday_map, io.BytesIO(excel_bytes))
+
+    start = time.perf_counter()
+    year, month, _ = core.resolve_year_month(grid, "上傳 Excel", None)
+    date_mapping, col_index_map = core.build_date_mapping(grid, year, month)
+    results = core.match_code_rows(grid, code, date_mapping, simplify_map)
+    timings["match"] = time.perf_counter() - start
+
+    df_result = pd.DataFrame(results)
+    df_result["Start Time"] = ""
+    df_result["End Time"] = ""
+    df_result, timings["rules"] = _timed(core.apply_time_rules, df_result, holiday_map, col_index_map)
+    _, timings["export"] = _timed(lambda df: core.export_calendar_csv(core.shift_frame(df)), df_result)
+
+    # convert 量的是冷的完整流程，先清掉所有快取；cached 量的是同樣輸入第二次轉換
+    parse_cache.clear()
+    layout_cache.clear()
+    template_cache.clear()
+    result_cache.clear()
+    _, timings["convert"] = _timed(core.convert_schedule, code, "上傳 Excel", excel_bytes, None, simplify_map)
+    _, timings["cached"] = _timed(core.convert_schedule, code, "上傳 Excel", excel_bytes, None, simplify_map)
+    return timings
+
+
+def run_scenario(n_staff: int, n_task_rows: int, months: list, repeat: int) -> dict:
+    """
+    產生情境所需的每個月份班表，每月取三個代號各跑 repeat 次，
+    回傳各階段（跨月加總後）的中位數秒數。
+    """
+    simplify_map = {r["原始關鍵字"]: r["簡化後"] for r in core.default_rules}
+    codes = staff_codes(n_staff)
+    probe_codes = [codes[0], codes[len(codes) // 2], codes[-1]]
+    workbooks = [make_schedule_workbook(n_staff, n_task_rows, y, m) for y, m in months]
+
+    samples = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        for code in probe_codes:
+            total = dict.fromkeys(STAGES, 0.0)
+            for excel_bytes in workbooks:
+                for stage, sec in run_stages(excel_bytes, code, simplify_map).items():
+                    total[stage] += sec
+            for stage in STAGES:
+                samples[stage].append(total[stage])
+
+    return {stage: statistics.median(values) for stage, values in samples.items()}
+
+
+def run_all(scenarios: list, repeat: int) -> dict:
+    results = {}
+    for name, n_staff, n_task_rows, months in scenarios:
+        results[name] = run_scenario(n_staff, n_task_rows, months, repeat)
+    return results
+
+
+def grid_memory(n_staff: int, n_task_rows: int, months: list) -> tuple:
+    """回傳 (整張 DataFrame 的 bytes, ScheduleGrid 的 bytes)，跨月加總。"""
+    df_bytes = grid_bytes = 0
+    for y, m in months:
+        df = pd.read_excel(io.BytesIO(make_schedule_workbook(n_staff, n_task_rows, y, m)), header=None)
+        df_bytes += int(df.memory_usage(deep=True).sum())
+        grid_bytes += core.compact_schedule_grid(df).nbytes()
+    return df_bytes, grid_bytes
+
+
+def print_table(results: dict, baseline: dict = None):
+    header = f"{'scenario':<10}" + "".join(f"{s:>12}" for s in STAGES)
+    print(header)
+    print("-" * len(header))
+    for name, timings in results.items():
+        row = f"{name:<10}" + "".join(f"{timings[s] * 1000:>10.1f}ms" for s in STAGES)
+        print(row)
+        if baseline and name in baseline:
+            ratios = "".join(
+                f"{timings[s] / baseline[name][s]:>11.2f}x" if baseline[name].get(s) else f"{'-':>12}"
+                for s in STAGES
+            )
+            print(f"{'  vs base':<10}{ratios}")
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """回傳 [(情境, 階段, 目前秒數, 基準秒數)]，只列出變慢超過 tolerance 倍的項目。"""
+    regressions = []
+    for name, timings in results.items():
+        for stage, sec in timings.items():
+            base = baseline.get(name, {}).get(stage)
+            if base and sec > base * tolerance:
+                regressions.append((name, stage, sec, base))
+    return regressions
+
+
+def load_baseline() -> dict:
+    if not BASELINE_PATH.exists():
+        return {}
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results: dict):
+    data = {
+        "meta": {
+            "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+        },
+        "results": {
+            name: {stage: round(sec, 6) for stage, sec in timings.items()}
+            for name, timings in results.items()
+        },
+    }
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="班表轉換效能測試")
+    parser.add_argument("--record", action="store_true", help="把結果寫成新的基準")
+    parser.add_argument("--check", action="store_true", help="與基準比較，退步時 exit 1")
+    parser.add_argument("--quick", action="store_true", help="只跑 small 情境")
+    parser.add_argument("--memory", action="store_true", help="列出 DataFrame 與 ScheduleGrid 的記憶體用量")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS[:1] if args.quick else SCENARIOS
+    results = run_all(scenarios, args.repeat)
+
+    baseline = load_baseline().get("results", {})
+    print_table(results, baseline)
+
+    if args.memory:
+        print(f"\n{'scenario':<10}{'DataFrame':>12}{'ScheduleGrid':>14}{'ratio':>8}")
+        for name, n_staff, n_task_rows, months in scenarios:
+            df_bytes, grid_bytes = grid_memory(n_staff, n_task_rows, months)
+            print(f"{name:<10}{df_bytes / 1024:>10.1f}KB{grid_bytes / 1024:>12.1f}KB{df_bytes / grid_bytes:>7.1f}x")
+
+    if args.record:
+        save_baseline(results)
+        print(f"\n已寫入基準：{BASELINE_PATH}")
+
+    if args.check:
+        if not baseline:
+            print("\n尚未有基準，請先執行 --record")
+            sys.exit(1)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ 以下項目比基準慢超過 {args.tolerance}x：")
+            for name, stage, sec, base in regressions:
+                print(f"  {name}/{stage}: {sec * 1000:.1f}ms（基準 {base * 1000:.1f}ms）")
+            sys.exit(1)
+        print("\n✅ 沒有效能退步")
+
+
+if __name__ == "__main__":
+    main()
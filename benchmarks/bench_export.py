@@ -0,0 +1,86 @@
+"""
+匯出的記憶體用量：多個代號打包 ZIP，比較「先組好每個 CSV 字串再壓縮」與 schedule_export 的串流寫法。
+用 tracemalloc 量 Python 配置的峰值（暫存檔寫到磁碟的部分不計）。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --staff 200 --months 12
+"""
+import argparse
+import io
+import tracemalloc
+import zipfile
+
+import schedule_core as core
+import schedule_export
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook, staff_codes
+
+
+def in_memory_zip(jobs: list) -> int:
+    """舊做法：每個代號的 CSV 文字都留在記憶體，最後一次寫進 BytesIO。"""
+    texts = []
+    for excel_bytes, file_name, code in jobs:
+        try:
+            df_output, year_month = core.convert_schedule(
+                code, core.DRIVE_SOURCES[0], excel_bytes, file_name, {}, use_cache=False,
+            )
+        except core.NoMatchingShiftsError:
+            continue
+        texts.append((f"{year_month}個人班表({code}).csv", core.export_calendar_csv(df_output)))
+    bio = io.BytesIO()
+    with zipfile.ZipFile(bio, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, text in texts:
+            zf.writestr(name, text)
+    return len(bio.getvalue())
+
+
+def streamed_zip(jobs: list) -> int:
+    def entries():
+        for excel_bytes, file_name, code in jobs:
+            try:
+                df_output, year_month = core.convert_schedule(
+                    code, core.DRIVE_SOURCES[0], excel_bytes, file_name, {}, use_cache=False,
+                )
+            except core.NoMatchingShiftsError:
+                continue
+            yield (
+                f"{year_month}個人班表({code}).csv",
+                lambda member, df=df_output: schedule_export.write_calendar_csv(member, df),
+            )
+
+    export = schedule_export.zip_export(entries())
+    size = export.size
+    export.close()
+    return size
+
+
+def peak_bytes(fn, jobs: list) -> tuple:
+    tracemalloc.start()
+    size = fn(jobs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多代號 ZIP 匯出的記憶體用量")
+    parser.add_argument("--staff", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=120)
+    parser.add_argument("--months", type=int, default=3)
+    args = parser.parse_args()
+
+    jobs = []
+    for month in range(1, args.months + 1):
+        year, m = 2026 + (month - 1) // 12, (month - 1) % 12 + 1
+        excel_bytes = make_schedule_workbook(args.staff, args.tasks, year, m)
+        core.get_parsed_workbook(excel_bytes)   # 解析結果先快取，只量匯出本身
+        jobs += [(excel_bytes, drive_file_name(year, m), code) for code in staff_codes(args.staff)]
+
+    print(f"{len(jobs)} 份個人班表（{args.staff} 人 x {args.months} 個月）")
+    for name, fn in [("字串組合", in_memory_zip), ("串流寫入", streamed_zip)]:
+        size, peak = peak_bytes(fn, jobs)
+        print(f"  {name}  ZIP {size / 1024:>8.1f}KB   峰值 {peak / 1024:>8.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+多工作表班表的解析計時：依序解析 vs 行程池平行解析，並與「最大的一張」單獨解析比較。
+同時確認兩種方式的轉換結果相同，且合併後的筆數等於各張分別轉換的總和。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.bench_sheets                 # 預設 4 張 200 人 x 120 列
+    python -m benchmarks.bench_sheets --sheets 6 --staff 120 --tasks 80
+"""
+import argparse
+import os
+import time
+
+import schedule_core as core
+from benchmarks import Checks
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook, staff_codes
+from schedule_cache import layout_cache, parse_cache, template_cache
+
+
+def _timed_parse(excel_bytes: bytes, parallel: bool) -> tuple:
+    layout_cache.clear()
+    template_cache.clear()
+    start = time.perf_counter()
+    parsed = core.parse_workbook(excel_bytes, parallel=parallel)
+    return parsed, time.perf_counter() - start
+
+
+def convert_codes(excel_bytes: bytes, parsed, codes: list, file_name: str) -> dict:
+    """用指定的解析結果轉換每個代號，回傳 {代號: CSV 文字}。"""
+    parse_cache.set(core.content_hash(excel_bytes), parsed)
+    outputs = {}
+    for code in codes:
+        try:
+            df_output, _ = core.convert_schedule(
+                code, core.DRIVE_SOURCES[0], excel_bytes, file_name, {}, use_cache=False,
+            )
+            outputs[code] = core.export_calendar_csv(df_output)
+        except core.NoMatchingShiftsError:
+            outputs[code] = ""
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多工作表解析計時")
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--staff", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    year, month = 2026, 3
+    file_name = drive_file_name(year, month)
+    data = make_schedule_workbook(args.staff, args.tasks, year, month, n_sheets=args.sheets)
+    single = make_schedule_workbook(args.staff, args.tasks, year, month)
+    print(f"{args.sheets} 張工作表，檔案 {len(data) / 1024:.0f}KB，CPU {os.cpu_count()} 顆")
+
+    # 第一次平行解析包含行程池啟動，不列入計時
+    core.parse_workbook(data, parallel=True)
+
+    timings = {"一張": [], "依序": [], "平行": []}
+    for _ in range(args.repeat):
+        _, sec = _timed_parse(single, parallel=False)
+        timings["一張"].append(sec)
+        sequential, sec = _timed_parse(data, parallel=False)
+        timings["依序"].append(sec)
+        parallel, sec = _timed_parse(data, parallel=True)
+        timings["平行"].append(sec)
+
+    for name, samples in timings.items():
+        print(f"  {name:<4}{sorted(samples)[len(samples) // 2] * 1000:>10.1f}ms")
+
+    checks = Checks()
+    codes = staff_codes(args.staff)[:20]
+    expected = convert_codes(data, sequential, codes, file_name)
+    checks.expect("平行解析的轉換結果與依序相同", convert_codes(data, parallel, codes, file_name) == expected)
+
+    # 合併結果的筆數 = 每張工作表分別轉換的筆數總和
+    mismatched = []
+    for code in codes:
+        per_sheet = 0
+        for sheet in sequential.sheets:
+            date_mapping, _ = core.build_date_mapping(sheet.grid, year, month)
+            per_sheet += len(core.match_code_rows(sheet.grid, code, date_mapping, {}))
+        merged = max(len(expected[code].splitlines()) - 1, 0)
+        if merged != per_sheet:
+            mismatched.append(f"{code}：合併 {merged} 筆，各張總和 {per_sheet} 筆")
+    checks.expect("合併筆數 = 各張分別轉換的總和" + (f"（{'；'.join(mismatched[:5])}）" if mismatched else ""), not mismatched)
+
+    core._reset_sheet_pool()
+    checks.finish("平行解析結果與依序相同，合併筆數正確")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+冷啟動 import 成本測試。
+
+容器閒置縮減後，第一個使用者要等 Streamlit 重新執行頁面，
+頁面最上方的 import 就是第一頁延遲的主要來源之一。
+這裡每一項都開一個全新的 Python 行程量測，避免模組快取影響結果：
+
+    page     duty_noDL_allfunction.py 最上層的所有 import（開頁面一定要付的成本）
+    core     import schedule_core
+    drive    Google Drive API 套件（只有用到 Drive 的路徑才需要）
+    openpyxl 讀灰底才需要
+
+同時列出 page 這一項載入了哪些重量級套件，確認它們沒有被提早 import。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --record
+    python -m benchmarks.bench_startup --check
+"""
+import argparse
+import ast
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).with_name("startup_baseline.json")
+PAGE_SCRIPT = REPO_ROOT / "duty_noDL_allfunction.py"
+
+# 只在特定路徑才需要的套件：頁面最上層不應該載入它們
+HEAVY_MODULES = ["googleapiclient.discovery", "google.oauth2.service_account", "openpyxl"]
+
+DEFAULT_TOLERANCE = 1.5
+
+
+def page_import_source() -> str:
+    """取出頁面檔案最上層的 import 敘述（不執行 Streamlit 頁面本身）。"""
+    tree = ast.parse(PAGE_SCRIPT.read_text(encoding="utf-8"))
+    nodes = [n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    return ast.unparse(ast.Module(body=nodes, type_ignores=[]))
+
+
+def targets() -> dict:
+    return {
+        "page": page_import_source(),
+        "core": "import schedule_core",
+        "drive": (
+            "import googleapiclient.discovery\n"
+            "import googleapiclient.http\n"
+            "import google.oauth2.service_account"
+        ),
+        "openpyxl": "import openpyxl",
+    }
+
+
+_PROBE = """
+import sys, time, json
+_t = time.perf_counter()
+exec(compile({source!r}, "<startup>", "exec"))
+_elapsed = time.perf_counter() - _t
+print(json.dumps({{"seconds": _elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(source: str) -> dict:
+    """在全新的行程裡執行 source，回傳 {seconds, loaded}。"""
+    code = _PROBE.format(source=source, heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_all(repeat: int) -> tuple:
+    """回傳 ({名稱: 中位數秒數}, {名稱: 載入的重量級套件})。"""
+    seconds = {}
+    loaded = {}
+    for name, source in targets().items():
+        samples = [measure(source) for _ in range(repeat)]
+        seconds[name] = statistics.median(s["seconds"] for s in samples)
+        loaded[name] = samples[-1]["loaded"]
+    return seconds, loaded
+
+
+def load_baseline() -> dict:
+    if not BASELINE_PATH.exists():
+        return {}
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(seconds: dict):
+    data = {
+        "meta": {
+            "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": {name: round(sec, 6) for name, sec in seconds.items()},
+    }
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷啟動 import 成本測試")
+    parser.add_argument("--record", action="store_true", help="把結果寫成新的基準")
+    parser.add_argument("--check", action="store_true", help="與基準比較，退步或頁面提早載入重量級套件時 exit 1")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    seconds, loaded = run_all(args.repeat)
+    baseline = load_baseline()
+
+    for name, sec in seconds.items():
+        line = f"{name:<10}{sec * 1000:>9.1f}ms"
+        if name in baseline:
+            line += f"   ({sec / baseline[name]:.2f}x 基準)"
+        if loaded[name]:
+            line += f"   載入：{', '.join(loaded[name])}"
+        print(line)
+
+    if args.record:
+        save_baseline(seconds)
+        print(f"\n已寫入基準：{BASELINE_PATH}")
+
+    if args.check:
+        problems = []
+        if loaded["page"]:
+            problems.append(f"頁面最上層就載入了：{', '.join(loaded['page'])}")
+        for name, sec in seconds.items():
+            if name in baseline and sec > baseline[name] * args.tolerance:
+                problems.append(f"{name}: {sec * 1000:.1f}ms（基準 {baseline[name] * 1000:.1f}ms）")
+        if problems:
+            print("\n❌ 冷啟動變慢：")
+            for p in problems:
+                print(f"  {p}")
+            sys.exit(1)
+        print("\n✅ 冷啟動沒有退步")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Drive 變更追蹤驗證：對本機假 Drive 跑一輪情境，確認只清除該清的快取。
+
+    1) 列檔、下載並解析三個月班表（快取全滿）
+    2) 沒有任何變更時 poll：不清任何快取，之後也不需要再打列檔 / 下載
+    3) 更新其中一份：只清掉那一份的下載與解析快取
+    4) 新增一份班表：列檔快取被清掉，既有班表的下載快取不受影響
+    5) page token 保存在檔案；頁面與 API 各用一個檔案
+    6) 背景追蹤只延長目前的列檔快取，不改動 listing_cache 的存活時間設定
+    7) 留言回饋試算表與其他不是班表的檔案變更：不清列檔快取、不回報變更（不會觸發重新預載）
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_change_tracker
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import Checks
+from benchmarks.fake_drive import FakeDriveServer, seed_schedules
+from benchmarks.synth_schedule import make_schedule_workbook
+
+
+def main():
+    server = FakeDriveServer().start()
+    os.environ["DRIVE_API_ENDPOINT"] = server.endpoint
+
+    # drive_client 在 import 時讀取端點設定
+    import drive_client
+    from drive_client import SPREADSHEET_MIME
+    from drive_changes import ChangeTracker, ChangeWatcher, token_path_for
+    from schedule_cache import LISTING_TTL_SECONDS, download_cache, listing_cache, parse_cache
+    from schedule_core import get_parsed_workbook
+
+    drive = server.drive
+    ids = seed_schedules(drive, [(2026, 1), (2026, 2), (2026, 3)], n_staff=30, n_task_rows=30)
+    checks = Checks()
+    expect = checks.expect
+
+    def load_all():
+        for f in drive_client.list_recent_drive_files():
+            bio, _ = drive_client.download_drive_file_as_bytes(f["id"], meta=f)
+            get_parsed_workbook(bio.getvalue())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tracker = ChangeTracker(token_path=Path(tmp) / "token.json")
+
+        print("1) 初次載入")
+        tracker.poll()   # 取得起始 token
+        load_all()
+        expect("三份班表都已快取", len(download_cache) == 3 and len(parse_cache) == 3)
+
+        print("2) 沒有變更")
+        drive.reset_counts()
+        result = tracker.poll()
+        load_all()
+        expect("poll 沒有回報變更", result["changed"] == [])
+        expect("沒有再列檔或下載", drive.request_counts == {"changes.list": 1})
+
+        print("3) 更新 11502班表")
+        target = ids["11502班表"]
+        drive.update_file(target, make_schedule_workbook(30, 30, 2026, 2, seed=1))
+        drive.reset_counts()
+        result = tracker.poll()
+        expect("只回報 11502班表", result["changed"] == [target])
+        expect("只清掉一份下載與解析快取", result["invalidated"]["download"] == 1 and result["invalidated"]["parse"] == 1)
+        load_all()
+        expect(
+            "只重新下載 11502班表",
+            drive.request_counts.get("files.get_media") == 1 and drive.request_counts.get("files.list") == 1,
+        )
+
+        print("4) 新增 11504班表")
+        drive.reset_counts()
+        drive.add_file("11504班表", make_schedule_workbook(30, 30, 2026, 4))
+        result = tracker.poll()
+        expect("列檔快取被清掉", result["invalidated"]["listing"] == 1 and len(listing_cache) == 0)
+        expect("既有班表的下載快取保留", result["invalidated"]["download"] == 0)
+        load_all()
+        expect("只下載新班表", drive.request_counts.get("files.get_media") == 1)
+
+        print("5) token 保存在檔案")
+        expect("重新建立 tracker 會沿用 token", ChangeTracker(token_path=Path(tmp) / "token.json").page_token == tracker.page_token)
+        expect("頁面與 API 的 token 檔不同", token_path_for("page") != token_path_for("api"))
+
+        print("6) 背景追蹤延長列檔快取")
+        watcher = ChangeWatcher(tracker=tracker, interval=0.05, listing_ttl=3600)
+        watcher.start()
+        time.sleep(0.3)
+        watcher.stop()
+        watcher.join()
+        expect("listing_cache 的存活時間設定不變", listing_cache.ttl == LISTING_TTL_SECONDS)
+        expect("列檔快取已經延長過", len(listing_cache) == 1 and listing_cache.extend_ttl(3600) == 0)
+
+        print("7) 留言回饋與其他檔案")
+        feedback_id = drive.add_file("留言回饋", b"feedback", mime_type=SPREADSHEET_MIME)
+        drive.add_file("會議紀錄", b"notes", mime_type=SPREADSHEET_MIME)
+        tracker.ignore_file_ids = {feedback_id}
+        result = tracker.poll()
+        expect("新增不是班表的檔案不回報、不清列檔快取", result["changed"] == [] and len(listing_cache) == 1)
+        listing_cache.clear()
+        expect("留言回饋試算表在列檔結果裡", feedback_id in {f["id"] for f in drive_client.list_recent_drive_files()})
+        drive.update_file(feedback_id, content=b"feedback 2")
+        drive.reset_counts()
+        result = tracker.poll()
+        drive_client.list_recent_drive_files()
+        expect("新增留言不回報變更", result["changed"] == [] and len(listing_cache) == 1)
+        expect("沒有重新列檔", drive.request_counts == {"changes.list": 1})
+
+    server.stop()
+    checks.finish("變更追蹤正常")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+時間規則診斷（schedule_core.rule_diagnostics）驗證：
+
+    - 各規則設定時間的班數合計 = 全員統計的班數 - 未定時間班數；沒有時間的班數 = 未定時間班數
+    - 從未符合的規則標為「未使用」，列在 dead_rules
+    - 沒有任何規則符合的新工作內容列在沒有時間的班，原因為 UNTIMED_NO_RULE
+    - 結果存在 result_cache，換時間規則另算；JSON 可以序列化
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_diagnostics
+"""
+import json
+import time
+
+import schedule_core as core
+from benchmarks import Checks
+from benchmarks.check_normalization import UNKNOWN_LABEL, relabel
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook, task_labels
+from schedule_cache import result_cache
+
+
+N_STAFF, N_TASKS = 40, 48
+DEAD_RULE = {"名稱": "不會出現的工作", "關鍵字": ["不會出現的工作"], "時間": [{"起": "08:00", "迄": "12:00"}]}
+
+
+def main():
+    checks = Checks()
+    expect = checks.expect
+
+    data = make_schedule_workbook(N_STAFF, N_TASKS, 2026, 3)
+    file_name = drive_file_name(2026, 3)
+    source = core.DRIVE_SOURCES[0]
+    time_rules = core.compile_time_rules(core.DEFAULT_TIME_RULES + [DEAD_RULE])
+
+    print("🩺 與全員統計一致")
+    start = time.perf_counter()
+    df_rule_stats, df_untimed, year_month = core.rule_diagnostics(source, data, file_name, time_rules=time_rules)
+    elapsed = time.perf_counter() - start
+    df_summary, _ = core.workload_summary(source, data, file_name, use_cache=False, time_rules=time_rules)
+    report = core.diagnostics_json(df_rule_stats, df_untimed, year_month, time_rules)
+    n_untimed = int(df_summary["未定時間班數"].sum())
+    expect("設定時間的班數合計相同", report["timed_shifts"] == int(df_summary["班數"].sum()) - n_untimed)
+    expect("沒有時間的班數相同", report["untimed_shifts"] == n_untimed)
+    relabeled = df_untimed.assign(代號=df_untimed["代號"].str.replace("、", " / "))
+    expect("班數不受代號的顯示格式影響", core.diagnostics_json(
+        df_rule_stats, relabeled, year_month, time_rules)["untimed_shifts"] == n_untimed)
+    expect("符合班數不少於設定時間班數", bool((df_rule_stats["符合班數"] >= df_rule_stats["設定時間班數"]).all()))
+    dead = len(time_rules.rules) - 1
+    expect("從未符合的規則標為未使用", dead in report["dead_rules"]
+           and df_rule_stats.loc[dead, "狀態"] == "未使用")
+    print(f"     {report['timed_shifts']} 班有時間、{report['untimed_shifts']} 班沒有時間、"
+          f"{len(report['dead_rules'])} 條未使用的規則（{elapsed * 1000:.1f}ms）")
+
+    print("🔎 新的工作內容")
+    unknown = relabel(data, {list(dict.fromkeys(task_labels(N_TASKS)))[0]: UNKNOWN_LABEL})
+    _, df_unknown, _ = core.rule_diagnostics(source, unknown, file_name, use_cache=False, time_rules=time_rules)
+    rows = df_unknown[df_unknown["工作內容"] == UNKNOWN_LABEL]
+    expect("列在沒有時間的班，原因為沒有符合的規則",
+           len(rows) > 0 and (rows["原因"] == core.UNTIMED_NO_RULE).all())
+
+    print("💾 快取與 JSON")
+    expect("再算一次直接用快取", core.rule_diagnostics(source, data, file_name, time_rules=time_rules)[0] is df_rule_stats)
+    core.rule_diagnostics(source, data, file_name)
+    expect("換時間規則另外存放", sum(1 for k in result_cache.keys() if k[1] == "規則診斷") == 2)
+    text = json.dumps(report, ensure_ascii=False)
+    expect("JSON 可以序列化、讀回相同", json.loads(text) == report)
+
+    checks.finish("時間規則診斷正常")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+試算表連結的解析與 metadata 快取驗證（對本機假 Drive）：
+
+    1) 各種連結格式都解析出同一個 ID；格式明顯不對的連結不會連線就被擋下
+    2) 第一次貼連結查一次 metadata，重複貼同一個連結不再查
+    3) 列檔過的檔案貼連結時直接用列檔結果，不查 metadata
+    4) 不存在的檔案、不是班表的檔案回報 DriveLinkError
+    5) 檔案更新後，變更追蹤清掉 metadata，下一次載入拿到新內容
+
+另外量測 extract_drive_file_id 每次解析的時間。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_drive_links
+"""
+import os
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks import Checks
+from benchmarks.fake_drive import FakeDriveServer, seed_schedules
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook
+
+
+def main():
+    server = FakeDriveServer().start()
+    os.environ["DRIVE_API_ENDPOINT"] = server.endpoint
+
+    # drive_client 在 import 時讀取端點設定
+    import drive_client
+    from drive_changes import ChangeTracker
+    from schedule_cache import metadata_cache
+
+    drive = server.drive
+    ids = seed_schedules(drive, [(2026, 1), (2026, 2)], n_staff=20, n_task_rows=20)
+    file_id = ids[drive_file_name(2026, 2)]
+    checks = Checks()
+    expect = checks.expect
+
+    def link_error(url) -> bool:
+        try:
+            drive_client.resolve_drive_link(url)
+        except drive_client.DriveLinkError:
+            return True
+        return False
+
+    print("1) 連結格式")
+    links = [
+        f"https://docs.google.com/spreadsheets/d/{file_id}/edit#gid=0",
+        f"https://drive.google.com/file/d/{file_id}/view?usp=sharing",
+        f"https://drive.google.com/open?id={file_id}",
+        f"https://drive.google.com/uc?export=download&id={file_id}",
+        f"  {file_id}  ",
+    ]
+    expect("五種格式都解析出同一個 ID", all(drive_client.extract_drive_file_id(u) == file_id for u in links))
+    drive.reset_counts()
+    bad = ["", "https://docs.google.com/spreadsheets/d/abc/edit", "https://example.com/", "not a link"]
+    expect("格式不對的連結回傳 None", all(drive_client.extract_drive_file_id(u) is None for u in bad))
+    expect("格式不對的連結不會連線", all(link_error(u) for u in bad) and drive.request_counts == {})
+
+    print("2) 重複貼同一個連結")
+    metadata_cache.clear()
+    drive.reset_counts()
+    for url in links:
+        meta = drive_client.resolve_drive_link(url)
+        drive_client.download_drive_file_as_bytes(meta["id"], meta=meta)
+    expect("metadata 只查一次", drive.request_counts.get("files.get") == 1)
+    expect("只下載一次", drive.request_counts.get("files.get_media") == 1)
+    expect("metadata 含大小", int(meta["size"]) > 0)
+
+    print("3) 列檔過的檔案")
+    metadata_cache.clear()
+    drive_client.list_recent_drive_files(use_cache=False)
+    drive.reset_counts()
+    drive_client.resolve_drive_link(f"https://drive.google.com/open?id={ids[drive_file_name(2026, 1)]}")
+    expect("不查 metadata", "files.get" not in drive.request_counts)
+
+    print("4) 錯誤的檔案")
+    expect("不存在的檔案", link_error("https://drive.google.com/open?id=" + "x" * 33))
+    notes_id = drive.add_file("說明.txt", b"hello", mime_type="text/plain")
+    expect("不是班表的檔案", link_error(f"https://drive.google.com/file/d/{notes_id}/view"))
+
+    print("5) 檔案更新")
+    with tempfile.TemporaryDirectory() as tmp:
+        tracker = ChangeTracker(token_path=Path(tmp) / "token.json")
+        tracker.poll()
+        new_content = make_schedule_workbook(20, 20, 2026, 2, seed=1)
+        drive.update_file(file_id, new_content)
+        tracker.poll()
+        meta = drive_client.resolve_drive_link(links[0])
+        bio, _ = drive_client.download_drive_file_as_bytes(meta["id"], meta=meta)
+        expect("下載到新內容", bio.getvalue() == new_content)
+
+    server.stop()
+
+    n = 20000
+    sec = timeit.timeit(lambda: [drive_client.extract_drive_file_id(u) for u in links], number=n // len(links))
+    print(f"\nextract_drive_file_id：{sec / n * 1e6:.2f}µs/次")
+
+    checks.finish("連結解析與 metadata 快取正常")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+匯出暫存檔（schedule_export.ExportFile）的關閉時機驗證：
+
+    1) 下載用的讀取端（download_reader）：照 Streamlit 的讀法（seek(0) 後 read()）讀到結尾即歸還，
+       暫存檔隨即關閉，不必等垃圾回收
+    2) 同一份匯出可同時有多個讀取端，各自的讀取位置互不影響；建立者與所有讀取端都歸還後才關閉，
+       之後再要讀取端時拋出 ExportClosedError
+    3) 背景工作的 ZIP 結果：工作過期移除時歸還工作表的參照；
+       正在下載的讀取端讀完後暫存檔關閉，過期後再按下載拿到 ExportClosedError
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_exports
+"""
+import time
+
+import pandas as pd
+
+import schedule_export
+from jobs import JobQueue
+from benchmarks import Checks
+
+
+def sample_frame() -> pd.DataFrame:
+    return pd.DataFrame({"代號": [f"A{i:03d}" for i in range(200)], "時數": range(200)})
+
+
+def main():
+    checks = Checks()
+    expect = checks.expect
+    df = sample_frame()
+    with schedule_export.table_csv_export(df) as export:
+        expected = export.getvalue()
+
+    print("1) 單次下載的讀取端")
+    reader = schedule_export.download_reader(schedule_export.table_csv_export, df)
+    spool = reader._export._file
+    expect("讀取前暫存檔還開著", not spool.closed)
+    reader.seek(0)
+    data = reader.read()
+    expect("讀到的內容與直接匯出相同", data == expected)
+    expect("讀到結尾後讀取端關閉", reader.closed)
+    expect("暫存檔隨即關閉", spool.closed)
+
+    print("2) 多個讀取端")
+    export = schedule_export.table_csv_export(df)
+    first, second = export.reader(), export.reader()
+    head = first.read(5)
+    expect("各自的讀取位置", second.read() == expected and head == expected[:5])
+    expect("一個讀完、建立者與另一個還持有時不關閉", second.closed and not export.closed)
+    export.release()
+    expect("建立者歸還後仍可讀", first.read() == expected[5:])
+    expect("最後一個讀取端讀完後關閉", first.closed and export.closed)
+    try:
+        export.reader()
+        expect("關閉後拋出 ExportClosedError", False)
+    except schedule_export.ExportClosedError:
+        expect("關閉後拋出 ExportClosedError", True)
+
+    print("3) 背景工作的結果")
+    queue = JobQueue(ttl=0)
+    job = queue.wait(queue.submit("zip", lambda progress: {"export": schedule_export.table_csv_export(df)}), timeout=10)
+    export = job.result["export"]
+    downloading = export.reader()
+    time.sleep(0.01)
+    queue.wait(queue.submit("other", lambda progress: None), timeout=10)   # submit 時清掉過期的工作
+    expect("過期的工作已移除", queue.get(job.id) is None)
+    expect("下載中的讀取端仍可讀完", downloading.read() == expected)
+    expect("讀完後暫存檔關閉", export.closed and export._file.closed)
+    try:
+        export.reader()
+        expect("過期後再下載拋出 ExportClosedError", False)
+    except schedule_export.ExportClosedError:
+        expect("過期後再下載拋出 ExportClosedError", True)
+
+    checks.finish("匯出暫存檔的關閉時機正常")
+
+
+if __name__ == "__main__":
+    main()
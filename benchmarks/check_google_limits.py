@@ -0,0 +1,169 @@
+"""
+Google API 呼叫節流（google_limits.py）驗證（對本機假 Drive，模擬延遲與配額）：
+
+    1) 合併：多個執行緒同時查同一個檔案的 metadata、下載同一份班表，只送出一次
+    2) 同時呼叫上限：各端點同時處理中的請求不超過設定
+    3) 假 Drive 直接回 429：暫停 Retry-After 後重試成功，計入指標；
+       不是冪等的寫入（留言板新增一列）遇到 5xx 不重送，被限流時才重試
+    4) 配額比較（同樣的請求量）：
+         不節流、不重試    -> 超過配額的請求直接失敗（原本的行為）
+         不節流、限流時重試 -> 全部成功，但打出很多 429
+         token bucket 節流 -> 全部成功，幾乎沒有 429
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_google_limits
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import Checks
+from benchmarks.fake_drive import FakeDriveServer
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook
+
+
+N_THREADS = 16
+N_FILES = 40
+QUOTA_RATE, QUOTA_BURST = 40, 5
+FILES_GET_LIMIT = 3
+
+
+class FakeHttpError(Exception):
+    """與 googleapiclient 的 HttpError 相同的形狀：resp.status、resp 的 header、content。"""
+
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.resp = type("Response", (dict,), {"status": status})({"retry-after": "0.01"})
+        self.content = b""
+
+
+def main():
+    server = FakeDriveServer().start()
+    os.environ["DRIVE_API_ENDPOINT"] = server.endpoint
+    os.environ["GOOGLE_API_CONCURRENCY"] = f"files.get={FILES_GET_LIMIT}"
+
+    # drive_client / google_limits 在 import 時讀取設定
+    import drive_client
+    import google_limits
+    from schedule_cache import download_cache, metadata_cache
+
+    drive = server.drive
+    checks = Checks()
+    expect = checks.expect
+
+    def use_limiter(rate, max_retries=5):
+        google_limits.limiter = google_limits.GoogleApiLimiter(
+            {"drive": (rate, QUOTA_BURST), "sheets": (0, 1)},
+            google_limits.limiter.concurrency, max_retries,
+        )
+        return google_limits.limiter
+
+    content = make_schedule_workbook(30, 30, 2026, 3)
+    file_id = drive.add_file(drive_file_name(2026, 3), content)
+    ids = [drive.add_file(f"其他檔案{i}.xlsx", b"x") for i in range(N_FILES)]
+
+    print("1) 合併相同的呼叫")
+    limiter = use_limiter(0)
+    drive.latency = 0.2
+    drive.reset_counts()
+    with ThreadPoolExecutor(N_THREADS) as pool:
+        metas = list(pool.map(lambda _: drive_client.get_drive_file_metadata(file_id, use_cache=False), range(N_THREADS)))
+    expect(f"{N_THREADS} 個執行緒查同一個檔案，只送出一次", drive.request_counts == {"files.get": 1}
+           and all(m == metas[0] for m in metas))
+    expect("其餘計為合併", limiter.metrics()["endpoints"]["files.get"]["coalesced"] == N_THREADS - 1)
+    meta = metas[0]
+    download_cache.clear()
+    drive.reset_counts()
+    with ThreadPoolExecutor(N_THREADS) as pool:
+        data = list(pool.map(lambda _: drive_client.download_drive_file_as_bytes(file_id, meta=meta)[0].getvalue(), range(N_THREADS)))
+    expect("同時下載同一份班表，只下載一次", drive.request_counts == {"files.get_media": 1}
+           and all(d == content for d in data))
+
+    print("2) 同時呼叫上限")
+    drive.latency = 0.05
+    drive.reset_counts()
+    with ThreadPoolExecutor(N_THREADS) as pool:
+        list(pool.map(lambda fid: drive_client.get_drive_file_metadata(fid, use_cache=False), ids[:N_THREADS]))
+    peak = limiter.metrics()["endpoints"]["files.get"]["peak_in_flight"]
+    expect(f"files.get 同時最多 {FILES_GET_LIMIT} 個", drive.peak_in_flight["files.get"] <= FILES_GET_LIMIT
+           and peak == FILES_GET_LIMIT)
+
+    print("3) 429 後重試")
+    drive.latency = 0
+    limiter = use_limiter(0)
+    drive.inject_rate_limits(3)
+    meta = drive_client.get_drive_file_metadata(file_id, use_cache=False)
+    row = limiter.metrics()["endpoints"]["files.get"]
+    expect("重試後成功", meta["id"] == file_id)
+    expect("指標記錄 3 次限流、3 次重試", row["throttled"] == 3 and row["retries"] == 3 and row["errors"] == 0)
+
+    calls = []
+
+    def flaky_append(status):
+        def append():
+            calls.append(status)
+            if len(calls) == 1:
+                raise FakeHttpError(status)
+            return "ok"
+        return append
+
+    calls.clear()
+    failed = False
+    try:
+        google_limits.google_call("spreadsheets.values.append", flaky_append(503), idempotent=False)
+    except FakeHttpError:
+        failed = True
+    expect("寫入遇到 5xx 不重送（可能已經寫入）", failed and len(calls) == 1)
+    calls.clear()
+    expect("寫入被限流時重試", google_limits.google_call(
+        "spreadsheets.values.append", flaky_append(429), idempotent=False) == "ok" and len(calls) == 2)
+    calls.clear()
+    try:
+        google_limits.google_call("spreadsheets.values.append", flaky_append(503), key="feedback", idempotent=False)
+        refused = False
+    except ValueError:
+        refused = True
+    expect("寫入不能合併（給 key 時拒絕、沒有送出）", refused and not calls)
+    calls.clear()
+    expect("合併的讀取照常在 5xx 時重試", google_limits.google_call(
+        "spreadsheets.values.get", flaky_append(503), key="feedback") == "ok" and calls == [503, 503])
+
+    print(f"4) 配額（每秒 {QUOTA_RATE} 次、最多累積 {QUOTA_BURST} 次）下查 {N_FILES} 個檔案")
+    drive.latency = 0.01
+
+    def run(label, rate, max_retries):
+        limiter = use_limiter(rate, max_retries)
+        metadata_cache.clear()
+        drive.reset_counts()
+        drive.set_quota(QUOTA_RATE, QUOTA_BURST)
+        time.sleep(QUOTA_BURST / QUOTA_RATE)
+        ok = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(N_THREADS) as pool:
+            for future in [pool.submit(drive_client.get_drive_file_metadata, fid) for fid in ids]:
+                try:
+                    future.result()
+                    ok += 1
+                except Exception:
+                    pass
+        elapsed = time.perf_counter() - start
+        throttled = drive.throttled_counts.get("files.get", 0)
+        row = limiter.metrics()["endpoints"]["files.get"]
+        print(f"     {label:<18} 成功 {ok:>2}/{N_FILES}  429 {throttled:>3} 次  "
+              f"{elapsed:.2f}s  排隊合計 {row['wait_seconds']:.2f}s")
+        return ok, throttled
+
+    ok_raw, _ = run("不節流、不重試", 0, 0)
+    ok_retry, throttled_retry = run("不節流、限流時重試", 0, 5)
+    ok_bucket, throttled_bucket = run("token bucket", QUOTA_RATE * 0.9, 5)
+    drive.set_quota(None)
+    expect("不節流、不重試時有請求失敗", ok_raw < N_FILES)
+    expect("限流時重試：全部成功", ok_retry == N_FILES)
+    expect("token bucket：全部成功，429 比不節流少", ok_bucket == N_FILES and throttled_bucket < throttled_retry)
+
+    server.stop()
+    checks.finish("Google API 節流正常")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+版面偵測驗證：同一份合成班表用不同版面（synth_schedule.TEMPLATES）產生，
+每個代號的轉換結果都必須與標準版面相同；另外確認範例班表偵測到的版面與原本寫死的位置一致、
+「附　註」只略過那一列（後面有工作內容的列照常轉換）、
+同一種範本下個月的新檔案沿用上次的版面（不適用時重新偵測），以及跨月的週班表（3/29 ~ 4/4）每個班的日期正確。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_layouts
+"""
+import io
+from datetime import date
+from pathlib import Path
+
+from openpyxl import load_workbook
+
+import schedule_core as core
+from benchmarks import Checks
+from benchmarks.synth_schedule import (
+    TEMPLATES, drive_file_name, make_schedule_workbook, make_week_workbook, staff_codes,
+)
+from schedule_cache import layout_cache, parse_cache, template_cache
+
+
+SAMPLE_PATH = Path(__file__).resolve().parent.parent / "11404班表範例.xlsx"
+
+# (人數, 工作列數, 年, 月)
+CASES = [(30, 30, 2026, 2), (60, 58, 2026, 3)]
+
+# 跨月的週班表：(說明, 第一天, 標題的月份, 有沒有星期列)
+WEEK_CASES = [
+    ("標題為開始的月份", date(2026, 3, 29), 3, True),
+    ("標題為結束的月份", date(2026, 3, 29), 4, True),
+    ("沒有星期列、標題為結束的月份", date(2026, 3, 29), 4, False),
+    ("跨年", date(2025, 12, 29), 12, True),
+]
+
+
+def convert_all(data: bytes, codes: list, file_name: str) -> dict:
+    """回傳 {代號: CSV 文字}；找不到班的代號記為空字串。"""
+    outputs = {}
+    for code in codes:
+        try:
+            df_output, _ = core.convert_schedule(code, core.DRIVE_SOURCES[0], data, file_name, {}, use_cache=False)
+            csv_text = core.export_calendar_csv(df_output)
+        except core.NoMatchingShiftsError:
+            csv_text = ""
+        outputs[code] = csv_text
+    return outputs
+
+
+def main():
+    checks = Checks()
+    expect = checks.expect
+
+    print("📄 11404班表範例.xlsx")
+    layout = core.parse_workbook(SAMPLE_PATH.read_bytes()).sheets[0].grid.layout
+    expect(
+        "日期第 2 列、星期第 3 列、A 欄工作內容、B 欄起日期",
+        (layout.date_row, layout.weekday_row, layout.label_col, layout.first_day_col) == (1, 2, 0, 1),
+    )
+    expect("偵測到附註列", layout.footer_row is not None)
+
+    print("📄 「附　註」之後的列")
+    wb = load_workbook(io.BytesIO(make_schedule_workbook(30, 30, 2026, 3)))
+    ws = wb.active
+    extra_row = ws.max_row + 1
+    ws.cell(row=extra_row, column=1, value="藥物諮詢 (備註：視訊)")
+    ws.cell(row=extra_row, column=6, value="測")
+    bio = io.BytesIO()
+    wb.save(bio)
+    grid = core.parse_workbook(bio.getvalue()).sheets[0].grid
+    df_output, _ = core.convert_schedule("測", "上傳 Excel", bio.getvalue(), "", {}, use_cache=False)
+    expect("只略過「附　註」那一列", "附　註" not in grid.row_labels)
+    expect("後面的工作列（含「備註」字樣）照常轉換",
+           df_output["Date"].dt.strftime("%Y-%m-%d").tolist() == ["2026-03-05"])
+
+    for n_staff, n_task_rows, year, month in CASES:
+        codes = staff_codes(n_staff)
+        file_name = drive_file_name(year, month)
+        print(f"📄 synth_{n_staff}x{n_task_rows}_{year}{month:02d}")
+        expected = convert_all(make_schedule_workbook(n_staff, n_task_rows, year, month), codes, file_name)
+        for template in TEMPLATES:
+            if template == "standard":
+                continue
+            data = make_schedule_workbook(n_staff, n_task_rows, year, month, template=template)
+            parse_cache.clear()
+            layout_cache.clear()
+            template_cache.clear()
+            actual = convert_all(data, codes, file_name)
+            diff = [code for code in codes if actual[code] != expected[code]]
+            expect(f"{template:<12} 與標準版面相同" + (f"（不同：{''.join(diff[:10])}）" if diff else ""), not diff)
+
+            # 解析快取被清掉後，重新解析直接用快取的版面，不再逐張偵測
+            parse_cache.clear()
+            before = core.detect_layout
+            core.detect_layout = lambda *a, **k: (_ for _ in ()).throw(AssertionError("不應重新偵測"))
+            try:
+                core.get_parsed_workbook(data)
+                expect(f"{template:<12} 重新解析沿用快取的版面", True)
+            except AssertionError:
+                expect(f"{template:<12} 重新解析沿用快取的版面", False)
+            finally:
+                core.detect_layout = before
+
+    print("📄 同一種範本的下個月班表")
+    for label, previous, template in (("沿用上個月的版面", "offset", "offset"), ("範本不同時重新偵測", "standard", "no_weekday")):
+        data = make_schedule_workbook(30, 30, 2026, 4, template=template)
+        parse_cache.clear()
+        layout_cache.clear()
+        template_cache.clear()
+        expected = core.parse_workbook(data, parallel=False).sheets[0].grid.layout
+        layout_cache.clear()
+        template_cache.clear()
+        core.parse_workbook(make_schedule_workbook(30, 30, 2026, 3, template=previous), parallel=False)
+
+        detected, jobs = [], []
+        detect, parse_sheets = core.detect_layout, core.parse_sheets
+        core.detect_layout = lambda values, sheet_name=0: detected.append(sheet_name) or detect(values, sheet_name)
+        core.parse_sheets = lambda data, sheet_jobs: jobs.extend(name for name, _ in sheet_jobs) or parse_sheets(data, sheet_jobs)
+        try:
+            layout = core.parse_workbook(data, parallel=False).sheets[0].grid.layout
+        finally:
+            core.detect_layout, core.parse_sheets = detect, parse_sheets
+        if previous == template:
+            expect(f"{label}：只讀班表工作表、不偵測，天數與附註列依新檔案調整",
+                   jobs == ["原始"] and not detected and layout == expected and layout.n_days == 30)
+        else:
+            expect(f"{label}：版面與直接偵測相同", detected == ["原始"] and layout == expected)
+
+    print("📄 跨月的週班表")
+    for label, start, title_month, weekday in WEEK_CASES:
+        data, expected = make_week_workbook(start, title_month=title_month, weekday=weekday)
+        layout = core.parse_workbook(data).sheets[0].grid.layout
+        actual = {}
+        for code in expected:
+            df_output, _ = core.convert_schedule(code, "上傳 Excel", data, "", {}, use_cache=False)
+            actual[code] = df_output["Date"].dt.strftime("%Y-%m-%d").tolist()
+        expect(f"{label}：偵測到 7 天、每個班的日期正確", layout.n_days == 7 and actual == expected)
+
+    checks.finish("版面偵測正常")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+共用班表本機鏡像（schedule_mirror.py）驗證（對本機假 Drive）：
+
+    1) 還沒同步時照原本向 Drive 列檔
+    2) 同步：檔名看得出年月的班表下載內容，其他檔案只記 metadata；沒有更新時不重新下載
+    3) Drive 連不上（假 Drive 關閉、記憶體快取清空）：頁面與 HTTP API 的清單、載入都從鏡像讀，內容與 Drive 相同
+    4) Drive 上的班表更新：下一次同步只下載那一份；下載失敗時保留上一次的版本
+    5) 從清單消失的檔案（丟到垃圾桶）在下一次同步時刪除
+    6) 班表變更後的重新預載與同步（prefetch.refresh_after_change）只列檔一次
+    7) 鏡像過期（同步一直失敗）：改向 Drive 列檔；Drive 也連不上時沿用舊的鏡像，
+       頁面與 API 都標示為過期，之後一段時間內不再每次都等 Drive
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_mirror
+"""
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from benchmarks import Checks
+from benchmarks.fake_drive import FakeDriveServer, seed_schedules
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook
+
+
+def main():
+    server = FakeDriveServer().start()
+    tmp = tempfile.TemporaryDirectory()
+    # drive_client / schedule_mirror 在 import 時讀取設定
+    os.environ["DRIVE_API_ENDPOINT"] = server.endpoint
+    os.environ["SCHEDULE_MIRROR_DIR"] = str(Path(tmp.name) / "mirror")
+    os.environ["SCHEDULE_RULES_DIR"] = str(Path(tmp.name) / "rules")
+    os.environ["SCHEDULE_PROFILES_PATH"] = str(Path(tmp.name) / "profiles.sqlite3")
+    import api
+    import prefetch
+    import schedule_mirror
+    from schedule_cache import download_cache, listing_cache, metadata_cache
+
+    drive = server.drive
+    checks = Checks()
+    expect = checks.expect
+
+    def clear_memory_caches():
+        for cache in (download_cache, listing_cache, metadata_cache):
+            cache.clear()
+
+    ids = seed_schedules(drive, [(2026, 2), (2026, 3)], n_staff=30, n_task_rows=30)
+    other_id = drive.add_file("留言回饋", b"not a schedule")
+    latest_id = ids[drive_file_name(2026, 3)]
+
+    print("1) 還沒同步")
+    files, synced_at = schedule_mirror.list_schedule_files()
+    expect("向 Drive 列檔", synced_at is None and len(files) == 3)
+
+    print("2) 同步")
+    drive.reset_counts()
+    result = schedule_mirror.sync_mirror()
+    expect("下載兩份班表，其他檔案只記 metadata", sorted(result["downloaded"]) == sorted(ids)
+           and drive.request_counts.get("files.get_media") == 2)
+    files, synced_at = schedule_mirror.list_schedule_files()
+    expect("清單改讀鏡像（含其他檔案）", synced_at is not None and {f["id"] for f in files} == set(ids.values()) | {other_id})
+    expect("清單不含鏡像內部欄位", all("path" not in f and "bytes" not in f for f in files))
+    drive.reset_counts()
+    result = schedule_mirror.sync_mirror()
+    expect("沒有更新時只列檔、不下載", not result["downloaded"] and drive.request_counts == {"files.list": 1})
+
+    print("3) Drive 連不上")
+    expected = {fid: drive.files[fid]["content"] for fid in ids.values()}
+    port = server.httpd.server_address[1]
+    server.stop()
+    clear_memory_caches()
+    start = time.perf_counter()
+    files, _ = schedule_mirror.list_schedule_files()
+    meta = next(f for f in files if f["id"] == latest_id)
+    bio, file_name = schedule_mirror.load_schedule_file(meta)
+    elapsed = time.perf_counter() - start
+    expect("頁面：清單與載入都從鏡像讀，內容相同", bio.getvalue() == expected[latest_id]
+           and file_name == drive_file_name(2026, 3))
+    print(f"     列檔＋載入 {elapsed * 1000:.1f}ms（不連線）")
+    expect("載入後放進下載快取", download_cache.get((latest_id, meta["modifiedTime"])) is not None)
+    clear_memory_caches()
+    api_meta, content = api.load_schedule(ids[drive_file_name(2026, 2)])
+    expect("API：metadata 與內容從鏡像讀", content == expected[ids[drive_file_name(2026, 2)]]
+           and [s["id"] for s in api.recent_schedules()] == [latest_id, ids[drive_file_name(2026, 2)]])
+    try:
+        schedule_mirror.sync_mirror()
+        kept = False
+    except Exception:
+        kept = schedule_mirror.list_schedule_files()[0] == files
+    expect("同步失敗時鏡像維持原狀", kept)
+
+    print("4) 班表更新")
+    server = FakeDriveServer(drive, port=port).start()
+    new_content = make_schedule_workbook(31, 30, 2026, 3)
+    drive.update_file(latest_id, content=new_content)
+    drive.reset_counts()
+    result = schedule_mirror.sync_mirror()
+    expect("只下載更新的那一份", result["downloaded"] == [drive_file_name(2026, 3)]
+           and drive.request_counts.get("files.get_media") == 1)
+    clear_memory_caches()
+    meta = next(f for f in schedule_mirror.list_schedule_files()[0] if f["id"] == latest_id)
+    expect("載入新的內容", schedule_mirror.load_schedule_file(meta)[0].getvalue() == new_content)
+
+    drive.update_file(latest_id, content=make_schedule_workbook(32, 30, 2026, 3))
+    download = schedule_mirror.download_drive_file_as_bytes
+
+    def unavailable(*args, **kwargs):
+        raise OSError("模擬下載失敗")
+
+    schedule_mirror.download_drive_file_as_bytes = unavailable
+    result = schedule_mirror.sync_mirror()
+    schedule_mirror.download_drive_file_as_bytes = download
+    clear_memory_caches()
+    meta = next(f for f in schedule_mirror.list_schedule_files()[0] if f["id"] == latest_id)
+    expect("下載失敗時保留上一次的版本", result["failed"] == [drive_file_name(2026, 3)]
+           and schedule_mirror.load_schedule_file(meta)[0].getvalue() == new_content)
+
+    print("5) 刪除")
+    drive.trash_file(ids[drive_file_name(2026, 2)])
+    result = schedule_mirror.sync_mirror()
+    mirror_files = list((Path(tmp.name) / "mirror" / "files").iterdir())
+    expect("從清單消失的班表刪除", result["removed"] == 1 and len(mirror_files) == 1
+           and schedule_mirror.mirror_metadata(ids[drive_file_name(2026, 2)]) is None)
+
+    print("6) 變更後重新預載與同步")
+    drive.update_file(latest_id, content=make_schedule_workbook(33, 30, 2026, 3))
+    clear_memory_caches()
+    drive.reset_counts()
+    prefetch.refresh_after_change()
+    meta = next(f for f in schedule_mirror.list_schedule_files()[0] if f["id"] == latest_id)
+    expect("預載與同步共用同一次列檔", drive.request_counts.get("files.list") == 1)
+    expect("鏡像更新為新的內容", schedule_mirror.read_mirrored(latest_id, meta["modifiedTime"])
+           == drive.files[latest_id]["content"])
+
+    print("7) 鏡像過期")
+    index_path = Path(tmp.name) / "mirror" / "index.json"
+    index = json.loads(index_path.read_text(encoding="utf-8"))
+    old_synced_at = (datetime.now(timezone.utc) - timedelta(seconds=schedule_mirror.MIRROR_MAX_AGE_SECONDS + 60))
+    index["synced_at"] = old_synced_at.isoformat(timespec="seconds")
+    index_path.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+    clear_memory_caches()
+    drive.reset_counts()
+    files, synced_at = schedule_mirror.list_schedule_files()
+    expect("過期時改向 Drive 列檔", synced_at is None and drive.request_counts.get("files.list") == 1)
+
+    list_calls = []
+
+    def unreachable(*args, **kwargs):
+        list_calls.append(1)
+        raise OSError("模擬 Drive 連不上")
+
+    list_recent, schedule_mirror.list_recent_drive_files = schedule_mirror.list_recent_drive_files, unreachable
+    files, synced_at = schedule_mirror.list_schedule_files()
+    expect("Drive 也連不上時沿用舊的鏡像並標示過期", synced_at == index["synced_at"]
+           and schedule_mirror.mirror_is_stale(synced_at) and {f["id"] for f in files} == {f["id"] for f in index["files"]})
+    listed = json.loads(api.list_schedules(None).body)
+    expect("API 的清單標示過期", listed["stale"] is True and listed["mirror_synced_at"] == index["synced_at"])
+    expect("之後一段時間內不再每次都向 Drive 列檔", len(list_calls) == 1)
+    schedule_mirror.list_recent_drive_files = list_recent
+    expect("剛同步過的鏡像不算過期", not schedule_mirror.mirror_is_stale(datetime.now(timezone.utc).isoformat()))
+
+    server.stop()
+    tmp.cleanup()
+    checks.finish("班表鏡像正常")
+
+
+if __name__ == "__main__":
+    main()
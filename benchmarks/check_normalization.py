@@ -0,0 +1,105 @@
+"""
+工作內容正規化（schedule_core.normalize_label）驗證：
+
+    - 把合成班表的工作內容改成排班者常見的寫法差異（全形空白、全形括號 / 冒號 / 連字號、
+      全形英數、關鍵字中間多一個空白、英文大小寫），每個代號的起訖時間與原本完全相同
+    - 簡化後內容裡的全形括號時間同樣會去掉
+    - 沒有任何規則符合的工作內容出現在 unmatched_labels 的清單（含班數），原本的班表清單是空的
+    - 每種工作內容只正規化、比對一次；再檢查一次不重新比對
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_normalization
+"""
+import io
+import re
+import time
+
+from openpyxl import load_workbook
+
+import schedule_core as core
+from benchmarks import Checks
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook, staff_codes, task_labels
+
+
+N_STAFF, N_TASKS = 40, 48
+UNKNOWN_LABEL = "新工作項目（試辦）"
+
+# 半形 -> 排班者可能打成的寫法
+FULL_WIDTH = str.maketrans({" ": "　", "(": "（", ")": "）", ":": "：", "-": "－", "1": "１", "E": "Ｅ"})
+
+
+def variant(label: str) -> str:
+    """同一個工作內容的另一種寫法：全形字元、關鍵字中間多一個空白、英文大小寫不同。"""
+    text = label.translate(FULL_WIDTH).replace("hr", "HR").replace("~", "～")
+    return text[:2] + " " + text[2:]
+
+
+def relabel(data: bytes, mapping: dict) -> bytes:
+    """把 A 欄的工作內容依 mapping 換掉（其他格子不動）。"""
+    wb = load_workbook(io.BytesIO(data))
+    for ws in wb.worksheets:
+        for (cell,) in ws.iter_rows(min_col=1, max_col=1):
+            if cell.value in mapping:
+                cell.value = mapping[cell.value]
+    bio = io.BytesIO()
+    wb.save(bio)
+    return bio.getvalue()
+
+
+def shift_times(data: bytes, file_name: str, codes: list) -> dict:
+    times = {}
+    for code in codes:
+        try:
+            df, _ = core.convert_schedule(code, core.DRIVE_SOURCES[0], data, file_name, {}, use_cache=False)
+        except core.NoMatchingShiftsError:
+            continue
+        times[code] = (list(df["Date"]), list(df["Start"].astype(str)), list(df["End"].astype(str)), list(df["Subject"]))
+    return times
+
+
+def main():
+    checks = Checks()
+    expect = checks.expect
+
+    data = make_schedule_workbook(N_STAFF, N_TASKS, 2026, 3)
+    file_name = drive_file_name(2026, 3)
+    codes = staff_codes(N_STAFF)
+    labels = list(dict.fromkeys(task_labels(N_TASKS)))
+    variants = {label: variant(label) for label in labels}
+    varied = relabel(data, variants)
+
+    print("🔤 寫法差異")
+    print("     例：" + "、".join(variants[label] for label in labels[11:13]))
+    base, other = shift_times(data, file_name, codes), shift_times(varied, file_name, codes)
+    expect("每個代號的班相同", base.keys() == other.keys())
+    expect("起訖時間完全相同", all(base[c][:3] == other[c][:3] for c in base))
+    expect("簡化後內容去掉全形括號時間", not any(
+        re.search(r"\d{1,2}[:：]\d{2}", subject) for c in other for subject in other[c][3]
+    ))
+
+    print("🔎 沒有對應規則的工作內容")
+    expect("原本的班表沒有", core.unmatched_labels(core.get_parsed_workbook(data)).empty)
+    unknown = relabel(data, {labels[0]: UNKNOWN_LABEL})
+    df_unmatched = core.unmatched_labels(core.get_parsed_workbook(unknown))
+    expect("列出新的工作內容與班數", list(df_unmatched["工作內容"]) == [UNKNOWN_LABEL]
+           and df_unmatched["班數"].iloc[0] > 0)
+
+    print("⚡ 每種工作內容只比對一次")
+    time_rules = core.compile_time_rules(core.DEFAULT_TIME_RULES)
+    parsed = core.get_parsed_workbook(varied)
+    start = time.perf_counter()
+    core.unmatched_labels(parsed, time_rules)
+    first = time.perf_counter() - start
+    n_matched = len(time_rules._matches)
+    start = time.perf_counter()
+    core.unmatched_labels(parsed, time_rules)
+    again = time.perf_counter() - start
+    expect("比對結果依工作內容記住", n_matched == len(set(parsed.sheets[0].grid.row_labels))
+           and len(time_rules._matches) == n_matched)
+    print(f"     第一次 {first * 1000:.2f}ms   再檢查一次 {again * 1000:.2f}ms（{n_matched} 種工作內容）")
+
+    checks.finish("工作內容正規化正常")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+各代號縮寫設定（profiles.py）驗證：
+
+    - 儲存後重新讀取（清掉 profile_cache，從 SQLite 讀）內容相同；空白列會去掉
+    - 載入時已整理好縮寫表（simplifier_cache 命中），用它轉換的結果與直接給縮寫表相同
+    - 同一份縮寫設定不論哪個代號、轉換幾次，都共用同一個 Simplifier；每種工作內容只簡化一次
+    - 刪除後回到「沒有儲存」
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_profiles
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks import Checks
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook, staff_codes
+
+
+def main():
+    tmp = tempfile.TemporaryDirectory()
+    # profiles 在 import 時讀取資料庫位置
+    os.environ["SCHEDULE_PROFILES_PATH"] = str(Path(tmp.name) / "profiles.sqlite3")
+    import profiles
+    import schedule_core as core
+    from schedule_cache import profile_cache, simplifier_cache
+
+    checks = Checks()
+    expect = checks.expect
+
+    rows = pd.DataFrame(core.default_rules + [
+        {"原始關鍵字": "處方判讀", "簡化後": "判讀"},
+        {"原始關鍵字": None, "簡化後": None},
+        {"原始關鍵字": "(上午)", "簡化後": None},
+    ])
+    code = staff_codes(40)[3]
+
+    print("💾 儲存與讀取")
+    expect("沒有儲存時回傳 None", profiles.load_profile(code) is None)
+    saved = profiles.save_profile(code, rows)
+    expect("空白列去掉、空的簡化後存成空字串",
+           len(saved) == len(core.default_rules) + 2 and saved[-1] == {"原始關鍵字": "(上午)", "簡化後": ""})
+    profile_cache.clear()
+    simplifier_cache.clear()
+    expect("從資料庫讀回相同內容", profiles.load_profile(code) == saved)
+    simplify_map = profiles.profile_simplify_map(code)
+    expect("載入時已整理好縮寫表", core.simplify_map_hash(simplify_map) in simplifier_cache)
+
+    print("🔁 轉換")
+    data = make_schedule_workbook(40, 36, 2026, 3)
+    file_name = drive_file_name(2026, 3)
+    df_profile, _ = core.convert_schedule(code, core.DRIVE_SOURCES[0], data, file_name, simplify_map, use_cache=False)
+    df_direct, _ = core.convert_schedule(
+        code, core.DRIVE_SOURCES[0], data, file_name, {r["原始關鍵字"]: r["簡化後"] for r in saved}, use_cache=False,
+    )
+    expect("與直接給縮寫表的結果相同", core.export_calendar_csv(df_profile) == core.export_calendar_csv(df_direct))
+    expect("縮寫有套用", df_profile["Subject"].str.contains("判讀").any()
+           and not df_profile["Subject"].str.contains("上午").any())
+
+    simplifier = core.get_simplifier(simplify_map)
+    n_labels = len(simplifier._memo)
+    for other in staff_codes(40):
+        try:
+            core.convert_schedule(other, core.DRIVE_SOURCES[0], data, file_name, dict(simplify_map), use_cache=False)
+        except core.NoMatchingShiftsError:
+            pass
+    expect("所有代號共用同一個 Simplifier", core.get_simplifier(dict(simplify_map)) is simplifier)
+    expect("每種工作內容只簡化一次", n_labels <= len(simplifier._memo) <= len(set(core.get_parsed_workbook(data).sheets[0].grid.row_labels)))
+
+    labels = core.get_parsed_workbook(data).sheets[0].grid.row_labels * 50
+    start = time.perf_counter()
+    for label in labels:
+        simplifier(label)
+    print(f"     已整理的縮寫表：{(time.perf_counter() - start) / len(labels) * 1e6:.2f}µs/次（每次轉換另需一次 get_simplifier）")
+
+    print("🗑  刪除")
+    expect("刪除成功", profiles.delete_profile(code))
+    profile_cache.clear()
+    expect("刪除後沒有儲存", profiles.load_profile(code) is None)
+
+    tmp.cleanup()
+    checks.finish("縮寫設定儲存與載入正常")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+版本化規則集（rule_sets.py）驗證：
+
+    1) 規則目錄是空的時候使用內建規則，轉換結果與直接用 schedule_core 內建規則相同
+    2) 發布只改時間規則的版本：只清掉用到改動規則（時間會不同）的轉換結果與全員統計；
+       沒用到的結果改用新版本的 key 保留（與重新轉換相同），解析快取、另一組時間規則的結果都保留；
+       重新轉換後用到新的時間
+    3) 發布只改縮寫的版本：只清掉用舊預設縮寫表轉換的結果，全員統計與自訂縮寫表的結果保留
+    4) 其他行程直接寫入新版本檔案：不必重啟，RULES_RELOAD_SECONDS 之後自動載入
+    5) 格式錯誤的新版本不會生效，沿用前一個版本；發布時格式錯誤直接拒絕
+    6) 訂閱日曆快取只清掉與新版本規則 hash 不同的
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_rule_sets
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from benchmarks import Checks
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook, staff_codes
+
+
+def main():
+    tmp = tempfile.TemporaryDirectory()
+    # rule_sets 在 import 時讀取規則目錄設定
+    os.environ["SCHEDULE_RULES_DIR"] = tmp.name
+    import rule_sets
+    import schedule_core as core
+    from schedule_cache import feed_cache, parse_cache, result_cache
+
+    checks = Checks()
+    expect = checks.expect
+
+    data = make_schedule_workbook(40, 36, 2026, 3)
+    file_name = drive_file_name(2026, 3)
+    source = core.DRIVE_SOURCES[0]
+    codes = staff_codes(40)
+
+    def convert_all(simplify_map=None):
+        active = rule_sets.get_active_rule_set()
+        simplify_map = active.simplify_map if simplify_map is None else simplify_map
+        outputs = {}
+        for code in codes:
+            try:
+                df_output, _ = core.convert_schedule(
+                    code, source, data, file_name, simplify_map, time_rules=active.time_rules,
+                )
+                outputs[code] = core.export_calendar_csv(df_output)
+            except core.NoMatchingShiftsError:
+                outputs[code] = ""
+        core.workload_summary(source, data, file_name, time_rules=active.time_rules)
+        return outputs
+
+    def cached_kinds():
+        keys = result_cache.keys()
+        return {
+            "summary": sum(1 for k in keys if k[1] == "全員統計"),
+            "default": sum(1 for k in keys if k[1] != "全員統計" and k[3] == active.abbreviations_hash),
+            "custom": sum(1 for k in keys if k[1] != "全員統計" and k[3] != active.abbreviations_hash),
+        }
+
+    print("1) 內建規則")
+    active = rule_sets.get_active_rule_set(force_check=True)
+    expect("空目錄使用版本 0", active.version == 0 and active.time_rules.hash == core.BUILTIN_TIME_RULES.hash)
+    builtin = convert_all()
+    expect("與 schedule_core 內建規則相同", builtin == {
+        code: core.export_calendar_csv(core.convert_schedule(
+            code, source, data, file_name, active.simplify_map, use_cache=False)[0]) if text else ""
+        for code, text in builtin.items()
+    })
+    convert_all(simplify_map={})
+    before = cached_kinds()
+    expect("快取了預設縮寫、自訂縮寫的結果與全員統計",
+           before["default"] == len(codes) and before["custom"] == len(codes) and before["summary"] == 1)
+
+    print("2) 只改時間規則")
+    time_rules = [dict(rule) for rule in core.DEFAULT_TIME_RULES]
+    i = next(i for i, rule in enumerate(time_rules) if rule["關鍵字"] == ["中藥局調劑"])
+    time_rules[i] = {**time_rules[i], "時間": [{"起": "09:00", "迄": "12:00"}]}
+    n_parsed = len(parse_cache)
+    before_hash = active.time_rules.hash
+    other = core.compile_time_rules(core.DEFAULT_TIME_RULES[:3])
+    core.convert_schedule(codes[0], source, data, file_name, {}, time_rules=other)
+    published = rule_sets.publish_rule_set(time_rules=time_rules, note="中藥局調劑改為 09:00")
+    active = rule_sets.get_active_rule_set()
+    expect("發布後立刻生效（版本 1）", active.version == 1 and published.hash == active.hash)
+    keys = result_cache.keys()
+    unaffected = {code for code, text in builtin.items() if text and "中藥局" not in text}
+    kept = [k for k in keys if k[-1] == active.time_rules.hash]
+    expect("沒有留下舊時間規則的結果", not any(k[-1] == before_hash for k in keys))
+    expect("沒排到中藥局調劑的代號（預設與自訂縮寫）保留", unaffected and sorted(k[1] for k in kept)
+           == sorted(list(unaffected) * 2))
+    expect("有排到中藥局調劑的全員統計清掉", not any(k[1] == "全員統計" for k in keys))
+    expect("其他時間規則的結果保留", result_cache.get(core.result_cache_key(
+        codes[0], source, data, file_name, {}, other)) is not None)
+    expect("解析快取保留", len(parse_cache) == n_parsed)
+    expect("保留的結果與用新規則重新轉換相同", all(
+        core.export_calendar_csv(result_cache.get(k)[0]) == core.export_calendar_csv(core.convert_schedule(
+            k[1], source, data, file_name, active.simplify_map if k[3] == active.abbreviations_hash else {},
+            use_cache=False, time_rules=active.time_rules)[0])
+        for k in kept
+    ))
+    after = convert_all()
+    changed = [
+        line for code in codes
+        for line in set(after[code].splitlines()) - set(builtin[code].splitlines())
+    ]
+    expect("只有中藥局調劑的班改用新時間", changed and all("中藥局" in line and "09:00" in line for line in changed))
+
+    print("3) 只改縮寫")
+    convert_all(simplify_map={})
+    abbreviations = list(active.abbreviations) + [{"原始關鍵字": "調劑", "簡化後": "調"}]
+    before = cached_kinds()
+    old_abbr = active.abbreviations_hash
+    rule_sets.publish_rule_set(abbreviations=abbreviations, note="新增縮寫")
+    active = rule_sets.get_active_rule_set()
+    keys = result_cache.keys()
+    expect("時間規則 hash 不變", active.time_rules.hash == published.time_rules.hash)
+    expect("用舊預設縮寫的結果清掉", not any(k[1] != "全員統計" and k[3] == old_abbr for k in keys))
+    expect("全員統計與自訂縮寫的結果保留", sum(1 for k in keys if k[1] == "全員統計") == before["summary"]
+           and sum(1 for k in keys if k[1] != "全員統計" and k[3] != old_abbr) == before["custom"])
+
+    print("4) 不重啟自動載入")
+    rules_dir = Path(tmp.name)
+    (rules_dir / "0003.json").write_text(json.dumps(
+        {**active.to_json(), "version": 3, "note": "其他行程寫入", "時間規則": list(core.DEFAULT_TIME_RULES)},
+        ensure_ascii=False,
+    ), encoding="utf-8")
+    expect("檢查間隔內沿用原本的版本", rule_sets.get_active_rule_set().version == 2)
+    reload_seconds, rule_sets.RULES_RELOAD_SECONDS = rule_sets.RULES_RELOAD_SECONDS, 0
+    active = rule_sets.get_active_rule_set()
+    expect("之後自動載入版本 3", active.version == 3 and active.time_rules.hash == core.BUILTIN_TIME_RULES.hash)
+
+    print("5) 格式錯誤")
+    (rules_dir / "0004.json").write_text('{"縮寫": [], "時間規則": [{"關鍵字": []}]}', encoding="utf-8")
+    expect("格式錯誤的版本不生效", rule_sets.get_active_rule_set().version == 3)
+    try:
+        rule_sets.publish_rule_set(time_rules=[{"名稱": "x", "關鍵字": ["x"], "時間": [{"起": "8點"}]}])
+        rejected = False
+    except ValueError:
+        rejected = True
+    expect("發布格式錯誤的規則被拒絕、沒有寫入", rejected and len(list(rules_dir.glob("*.json"))) == 4)
+
+    print("6) 訂閱日曆")
+    feed_cache.clear()
+    feed_cache.set(("A", (), active.abbreviations_hash, active.time_rules.hash), b"current")
+    feed_cache.set(("B", (), active.abbreviations_hash, "old"), b"stale")
+    (rules_dir / "0004.json").unlink()
+    rule_sets.publish_rule_set(note="只改說明")
+    expect("內容相同的新版本不清快取", len(feed_cache) == 2)
+    rule_sets.publish_rule_set(time_rules=time_rules)
+    expect("規則 hash 不同的訂閱日曆清掉", len(feed_cache) == 0)
+    rule_sets.RULES_RELOAD_SECONDS = reload_seconds
+
+    tmp.cleanup()
+    checks.finish("規則版本與快取清除正常")
+
+
+if __name__ == "__main__":
+    main()
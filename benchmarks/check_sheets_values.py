@@ -0,0 +1,137 @@
+"""
+原生 Google 試算表的 Sheets API 讀法驗證與比較（對本機假 Drive / 假 Sheets API）：
+
+    - 同一份班表走「Sheets API 格子」與「匯出 xlsx」兩條路，解析出的格子、假日與每個代號的轉換結果都相同
+    - 比較兩者的傳輸量與解析時間
+    - download_drive_file_as_bytes 對試算表預設走 Sheets API（兩次 spreadsheets.get，不匯出）
+    - Sheets API 失敗時自動改用匯出
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_sheets_values
+    python -m benchmarks.check_sheets_values --staff 200 --tasks 120
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks import Checks
+from benchmarks.fake_drive import SPREADSHEET_MIME, FakeDriveServer
+from benchmarks.synth_schedule import TEMPLATES, drive_file_name, make_schedule_workbook, staff_codes
+
+
+SAMPLE_PATH = Path(__file__).resolve().parent.parent / "11404班表範例.xlsx"
+
+GRID_FIELDS = ["title", "date_row", "weekday_row", "row_labels", "code_table", "row_ptr", "day_idx", "code_ids"]
+
+
+def same_sheet(a, b) -> bool:
+    """兩個 ParsedSheet 的格子相同，且日期欄的假日判斷相同。"""
+    for name in GRID_FIELDS:
+        x, y = getattr(a.grid, name), getattr(b.grid, name)
+        if not (np.array_equal(x, y) if isinstance(x, np.ndarray) else x == y):
+            return False
+    first = a.grid.layout.first_day_col + 1
+    days = range(first, first + a.grid.layout.n_days)
+    return all(a.holiday_map.get(col, False) == b.holiday_map.get(col, False) for col in days)
+
+
+def timed_parse(core, data: bytes) -> tuple:
+    from schedule_cache import layout_cache, template_cache
+
+    layout_cache.clear()
+    template_cache.clear()
+    start = time.perf_counter()
+    parsed = core.parse_workbook(data, parallel=False)
+    return parsed, time.perf_counter() - start
+
+
+def convert_all(core, data: bytes, file_name: str, codes: list) -> dict:
+    outputs = {}
+    for code in codes:
+        try:
+            df_output, _ = core.convert_schedule(code, core.DRIVE_SOURCES[0], data, file_name, {}, use_cache=False)
+            outputs[code] = core.export_calendar_csv(df_output)
+        except core.NoMatchingShiftsError:
+            outputs[code] = ""
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sheets API 讀法驗證")
+    parser.add_argument("--staff", type=int, default=80)
+    parser.add_argument("--tasks", type=int, default=60)
+    args = parser.parse_args()
+
+    server = FakeDriveServer().start()
+    # drive_client 在 import 時讀取端點設定
+    os.environ["DRIVE_API_ENDPOINT"] = server.endpoint
+    os.environ["SHEETS_API_ENDPOINT"] = server.sheets_endpoint
+    import drive_client
+    import schedule_core as core
+
+    drive = server.drive
+    checks = Checks()
+    expect = checks.expect
+
+    cases = [("11404班表範例.xlsx", "11404班表", SAMPLE_PATH.read_bytes(), staff_codes(60))]
+    codes = staff_codes(args.staff)
+    for template in TEMPLATES:
+        cases.append((
+            f"synth_{args.staff}x{args.tasks} {template}",
+            drive_file_name(2026, 3),
+            make_schedule_workbook(args.staff, args.tasks, 2026, 3, template=template),
+            codes,
+        ))
+    cases.append((
+        f"synth_{args.staff}x{args.tasks} 3 張工作表",
+        drive_file_name(2026, 3),
+        make_schedule_workbook(args.staff, args.tasks, 2026, 3, n_sheets=3),
+        codes,
+    ))
+
+    for name, file_name, content, case_codes in cases:
+        print(f"📄 {name}")
+        file_id = drive.add_file(file_name, content, mime_type=SPREADSHEET_MIME)
+        exported = drive_client._download_file_content(file_id, SPREADSHEET_MIME)
+        payload = drive_client.read_spreadsheet_values(file_id)
+
+        xlsx_parsed, xlsx_sec = timed_parse(core, exported)
+        values_parsed, values_sec = timed_parse(core, payload)
+        print(f"     xlsx {len(exported) / 1024:>7.1f}KB 解析 {xlsx_sec * 1000:>6.0f}ms   "
+              f"Sheets 格子 {len(payload) / 1024:>7.1f}KB 解析 {values_sec * 1000:>6.0f}ms")
+
+        expect(
+            "格子與假日相同",
+            len(xlsx_parsed.sheets) == len(values_parsed.sheets)
+            and all(same_sheet(a, b) for a, b in zip(xlsx_parsed.sheets, values_parsed.sheets)),
+        )
+        expect(
+            "每個代號的轉換結果相同",
+            convert_all(core, exported, file_name, case_codes) == convert_all(core, payload, file_name, case_codes),
+        )
+
+    print("📥 download_drive_file_as_bytes")
+    file_id = drive.add_file(drive_file_name(2026, 4), make_schedule_workbook(30, 30, 2026, 4), mime_type=SPREADSHEET_MIME)
+    drive.reset_counts()
+    bio, _ = drive_client.download_drive_file_as_bytes(file_id)
+    expect("試算表走 Sheets API", core.is_sheets_payload(bio.getvalue()))
+    expect("兩次 spreadsheets.get、沒有匯出", drive.request_counts.get("spreadsheets.get") == 2
+           and "files.export" not in drive.request_counts)
+
+    file_id = drive.add_file(drive_file_name(2026, 5), make_schedule_workbook(30, 30, 2026, 5), mime_type=SPREADSHEET_MIME)
+    endpoint, drive_client.SHEETS_API_ENDPOINT = drive_client.SHEETS_API_ENDPOINT, server.endpoint + "broken/"
+    try:
+        bio, _ = drive_client.download_drive_file_as_bytes(file_id)
+    finally:
+        drive_client.SHEETS_API_ENDPOINT = endpoint
+    expect("Sheets API 失敗時改用匯出 xlsx", bio.getvalue()[:2] == b"PK")
+
+    server.stop()
+    checks.finish("Sheets API 讀法與匯出 xlsx 結果相同")
+
+
+if __name__ == "__main__":
+    main()
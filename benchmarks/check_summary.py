@@ -0,0 +1,83 @@
+"""
+全員統計驗證與計時：workload_summary 一次算出的每個代號統計，
+必須與逐一 convert_schedule 每個代號後由日曆事件自行加總的結果相同（班數、小夜、總時數、單週最高時數）。
+同時比較兩種做法花的時間。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.check_summary
+    python -m benchmarks.check_summary --staff 200 --tasks 120
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import schedule_core as core
+import schedule_export
+from benchmarks import Checks
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook
+
+
+SAMPLE_PATH = Path(__file__).resolve().parent.parent / "11404班表範例.xlsx"
+
+
+def per_code_summary(data: bytes, file_name: str, codes: list) -> dict:
+    """舊做法：每個代號各轉換一次，再由輸出的起訖時間加總。"""
+    totals = {}
+    for code in codes:
+        try:
+            df_output, _ = core.convert_schedule(code, core.DRIVE_SOURCES[0], data, file_name, {}, use_cache=False)
+        except core.NoMatchingShiftsError:
+            continue
+        events = schedule_export.calendar_events(df_output)
+        hours = pd.Series(np.where(events["all_day"], 0.0, (events["end"] - events["start"]) / np.timedelta64(1, "h")))
+        weeks = pd.Series(events["start"]).dt.to_period("W-SUN")
+        totals[code] = (
+            len(df_output),
+            int(df_output["Subject"].str.contains("小夜").sum()),
+            round(hours.sum(), 1),
+            round(hours.groupby(weeks).sum().max(), 1),
+        )
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全員統計驗證與計時")
+    parser.add_argument("--staff", type=int, default=80)
+    parser.add_argument("--tasks", type=int, default=60)
+    args = parser.parse_args()
+
+    cases = [
+        ("11404班表範例.xlsx", SAMPLE_PATH.read_bytes(), "11404班表"),
+        (f"synth_{args.staff}x{args.tasks}", make_schedule_workbook(args.staff, args.tasks, 2026, 3), drive_file_name(2026, 3)),
+    ]
+    checks = Checks()
+    for name, data, file_name in cases:
+        core.get_parsed_workbook(data)   # 解析結果先快取，只比較統計本身
+
+        start = time.perf_counter()
+        summary, _ = core.workload_summary(core.DRIVE_SOURCES[0], data, file_name, use_cache=False)
+        summary_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = per_code_summary(data, file_name, list(summary["代號"]))
+        per_code_sec = time.perf_counter() - start
+
+        actual = {
+            row["代號"]: (row["班數"], row["小夜"], row["總時數"], row["單週最高時數"])
+            for row in summary.to_dict("records")
+        }
+        diff = [code for code in actual if actual[code] != expected.get(code)]
+        print(f"📄 {name}：{len(summary)} 個代號，全員統計 {summary_sec * 1000:.0f}ms，"
+              f"逐一轉換 {per_code_sec * 1000:.0f}ms")
+        for code in diff[:10]:
+            print(f"     {code}：統計 {actual[code]}，逐一轉換 {expected.get(code)}")
+        checks.expect(f"{name} 每個代號的統計與逐一轉換相同", not diff)
+
+    checks.finish("全員統計與逐一轉換的結果相同")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+時間規則引擎差異比對（golden output）。
+
+repo 裡每個版本的頁面都有自己的 apply_time_rules，行為略有不同。
+這個工具把同一批班表（11404班表範例.xlsx + synth_schedule 合成班表）
+的所有代號，依序丟給每個引擎，以 schedule_core（duty_noDL_allfunction.py 使用中的版本）
+為基準，列出哪些列的結果不一樣。
+
+舊版頁面一 import 就會執行 Streamlit，所以這裡用 ast 只取出檔案裡的函式定義來執行。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.diff_engines                 # 所有引擎 vs 基準，印出摘要
+    python -m benchmarks.diff_engines -v              # 另外列出每一筆不同的列
+    python -m benchmarks.diff_engines --record        # 把基準引擎的輸出寫成 golden 檔
+    python -m benchmarks.diff_engines --check         # 基準引擎 vs golden，不同就 exit 1
+
+新的（例如較快的）引擎只要加進 ENGINES，就能用 --engine 證明輸出與基準相同：
+    python -m benchmarks.diff_engines --engine <名稱> --strict
+"""
+import argparse
+import ast
+import io
+import sys
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+import schedule_core as core
+from benchmarks.synth_schedule import make_schedule_workbook
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+GOLDEN_DIR = Path(__file__).with_name("golden")
+
+REFERENCE_ENGINE = "core"
+
+# 比對時對齊用的欄位，與會被規則改動的欄位
+KEY_COLUMNS = ["代號", "日期", "星期", "工作內容", "簡化後內容"]
+TIME_COLUMNS = ["Start Time", "End Time"]
+OUTPUT_COLUMNS = KEY_COLUMNS + TIME_COLUMNS
+
+
+# ============================================================
+# 1) 載入各版本的 apply_time_rules
+# ============================================================
+def load_script_functions(script_name: str, names: list) -> dict:
+    """
+    只執行 script 裡的 import 與指定的函式定義，不跑 Streamlit 頁面。
+    回傳 {函式名稱: function}，找不到的名稱不會出現在結果裡。
+    """
+    path = REPO_ROOT / script_name
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+
+    body = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [a.name for a in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            if any(m.split(".")[0] == "streamlit" for m in modules):
+                continue
+            body.append(node)
+        elif isinstance(node, ast.FunctionDef) and node.name in names:
+            body.append(node)
+
+    namespace = {"__name__": f"legacy_{path.stem}"}
+    exec(compile(ast.Module(body=body, type_ignores=[]), str(path), "exec"), namespace)
+    return {name: namespace[name] for name in names if name in namespace}
+
+
+@lru_cache(maxsize=None)
+def _legacy_engine(script_name: str):
+    """把舊版頁面的 apply_time_rules 包成統一介面 (df, holiday_map, column_map) -> df。"""
+    fn = load_script_functions(script_name, ["apply_time_rules"])["apply_time_rules"]
+    n_args = fn.__code__.co_argcount
+
+    def engine(df, holiday_map, column_map):
+        if n_args == 1:
+            # duty_schedule_web.py 只看星期，不看底色
+            return fn(df)
+        return fn(df, holiday_map, column_map)
+
+    return engine
+
+
+ENGINES = {
+    "core": core.apply_time_rules,
+    "web": lambda *a: _legacy_engine("duty_schedule_web.py")(*a),
+    "holiday_color": lambda *a: _legacy_engine("duty_schedule_with_holiday_color.py")(*a),
+    "holiday_editable": lambda *a: _legacy_engine("duty_schedule_holiday_editable.py")(*a),
+}
+
+
+# ============================================================
+# 2) 測試資料：範例班表 + 合成班表
+# ============================================================
+def corpus_workbooks() -> dict:
+    """回傳 {名稱: xlsx bytes}，名稱也是 golden 檔名。"""
+    workbooks = {
+        "sample_11404": (REPO_ROOT / "11404班表範例.xlsx").read_bytes(),
+        "synth_30x30_202602": make_schedule_workbook(30, 30, 2026, 2),
+        "synth_60x58_202603": make_schedule_workbook(60, 58, 2026, 3, multi_code_ratio=0.2),
+    }
+    return workbooks
+
+
+def extract_codes(grid: core.ScheduleGrid, n_days: int) -> list:
+    """從班表格子裡收集所有代號（分隔符號與頁面、全員統計相同，見 core.CODE_SEPARATOR_RE）。"""
+    used = set(grid.code_ids[grid.day_idx < n_days].tolist())
+    codes = set()
+    for code_id in used:
+        codes.update(t for t in core.CODE_SEPARATOR_RE.split(grid.code_table[code_id]) if t)
+    return sorted(codes)
+
+
+def build_engine_inputs(excel_bytes: bytes):
+    """
+    對一份班表準備規則引擎的輸入：
+    回傳 (每個代號套規則前的 df, holiday_map, col_index_map)
+    """
+    simplify_map = {r["原始關鍵字"]: r["簡化後"] for r in core.default_rules}
+
+    grid = core.read_schedule_grid(excel_bytes)
+    holiday_map = core.build_holiday_map(io.BytesIO(excel_bytes))
+    year, month, _ = core.resolve_year_month(grid, "上傳 Excel", None)
+    date_mapping, col_index_map = core.build_date_mapping(grid, year, month)
+
+    inputs = {}
+    for code in extract_codes(grid, len(date_mapping)):
+        results = core.match_code_rows(grid, code, date_mapping, simplify_map)
+        if not results:
+            continue
+        df_result = pd.DataFrame(results)
+        df_result["Start Time"] = ""
+        df_result["End Time"] = ""
+        inputs[code] = df_result
+    return inputs, holiday_map, col_index_map
+
+
+def run_engine(engine, inputs: dict, holiday_map: dict, col_index_map: dict) -> pd.DataFrame:
+    """把每個代號丟進引擎，合併成一張含「代號」欄的輸出表。"""
+    frames = []
+    for code, df_result in inputs.items():
+        out = engine(df_result.copy(), holiday_map, col_index_map)
+        out = out.copy()
+        out["代號"] = code
+        frames.append(out)
+    if not frames:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    out = pd.concat(frames, ignore_index=True)[OUTPUT_COLUMNS]
+    return out.fillna("").astype(str)
+
+
+# ============================================================
+# 3) 比對
+# ============================================================
+def _keyed_rows(df: pd.DataFrame) -> dict:
+    """以 (代號, 日期, 星期, 工作內容, 簡化後內容, 第幾次出現) 為 key，值為 (Start, End)。"""
+    seen = Counter()
+    keyed = {}
+    for row in df.itertuples(index=False):
+        values = dict(zip(OUTPUT_COLUMNS, row))
+        base = tuple(values[c] for c in KEY_COLUMNS)
+        seen[base] += 1
+        keyed[base + (seen[base],)] = tuple(values[c] for c in TIME_COLUMNS)
+    return keyed
+
+
+def diff_outputs(reference: pd.DataFrame, candidate: pd.DataFrame) -> list:
+    """
+    回傳差異清單 [(種類, key, 基準時間, 候選時間)]，
+    種類為 changed（時間不同）、missing（候選少了這列）、extra（候選多出這列）。
+    """
+    ref = _keyed_rows(reference)
+    cand = _keyed_rows(candidate)
+
+    diffs = []
+    for key, ref_times in ref.items():
+        if key not in cand:
+            diffs.append(("missing", key, ref_times, None))
+        elif cand[key] != ref_times:
+            diffs.append(("changed", key, ref_times, cand[key]))
+    for key, cand_times in cand.items():
+        if key not in ref:
+            diffs.append(("extra", key, None, cand_times))
+    return diffs
+
+
+def format_diff(diff) -> str:
+    kind, key, ref_times, cand_times = diff
+    code, date, weekday, content, simplified, nth = key
+    where = f"[{code}] {date}({weekday}) {content}"
+    if nth > 1:
+        where += f" #{nth}"
+    fmt = lambda t: "-" if t is None else f"{t[0] or '?'}~{t[1] or '?'}"
+    return f"  {kind:<8}{where}：基準 {fmt(ref_times)} / 候選 {fmt(cand_times)}"
+
+
+def golden_path(workbook_name: str) -> Path:
+    return GOLDEN_DIR / f"{workbook_name}.csv"
+
+
+def read_golden(workbook_name: str) -> pd.DataFrame:
+    return pd.read_csv(golden_path(workbook_name), dtype=str, keep_default_na=False)
+
+
+def write_golden(workbook_name: str, df: pd.DataFrame):
+    GOLDEN_DIR.mkdir(exist_ok=True)
+    df.to_csv(golden_path(workbook_name), index=False, encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="時間規則引擎差異比對")
+    parser.add_argument("--engine", action="append", choices=sorted(ENGINES), help="只比對指定引擎（可重複）")
+    parser.add_argument("--record", action="store_true", help="把基準引擎輸出寫入 benchmarks/golden/")
+    parser.add_argument("--check", action="store_true", help="基準引擎 vs golden，不同就 exit 1")
+    parser.add_argument("--strict", action="store_true", help="任何引擎與基準不同就 exit 1")
+    parser.add_argument("-v", "--verbose", action="store_true", help="列出每一筆不同的列")
+    parser.add_argument("--limit", type=int, default=20, help="-v 時每組最多列出幾筆")
+    args = parser.parse_args()
+
+    engines = args.engine or [name for name in ENGINES if name != REFERENCE_ENGINE]
+    failed = False
+
+    for wb_name, excel_bytes in corpus_workbooks().items():
+        inputs, holiday_map, col_index_map = build_engine_inputs(excel_bytes)
+        reference = run_engine(ENGINES[REFERENCE_ENGINE], inputs, holiday_map, col_index_map)
+        print(f"\n📄 {wb_name}：{len(inputs)} 個代號，基準輸出 {len(reference)} 列")
+
+        if args.record:
+            write_golden(wb_name, reference)
+            print(f"  已寫入 {golden_path(wb_name).relative_to(REPO_ROOT)}")
+
+        if args.check:
+            if not golden_path(wb_name).exists():
+                print("  ❌ 沒有 golden 檔，請先執行 --record")
+                failed = True
+            else:
+                diffs = diff_outputs(read_golden(wb_name), reference)
+                status = "✅ 與 golden 相同" if not diffs else f"❌ 與 golden 有 {len(diffs)} 列不同"
+                print(f"  {REFERENCE_ENGINE:<18}{status}")
+                for d in diffs[:args.limit] if args.verbose else []:
+                    print(format_diff(d))
+                failed = failed or bool(diffs)
+
+        for name in engines:
+            if name == REFERENCE_ENGINE:
+                continue
+            candidate = run_engine(ENGINES[name], inputs, holiday_map, col_index_map)
+            diffs = diff_outputs(reference, candidate)
+            kinds = Counter(d[0] for d in diffs)
+            summary = "相同" if not diffs else "、".join(f"{k} {n}" for k, n in sorted(kinds.items()))
+            print(f"  {name:<18}{summary}")
+            for d in diffs[:args.limit] if args.verbose else []:
+                print(format_diff(d))
+            if args.strict and diffs:
+                failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+本機假 Google Drive API（只實作本專案用到的部分），供測試與壓力測試使用。
+
+實作的端點（路徑與 Drive v3 相同）：
+    GET /drive/v3/files                     列檔（q 只支援 trashed 與 modifiedTime 篩選）
+    GET /drive/v3/files/<id>                metadata；?alt=media 下載內容
+    GET /drive/v3/files/<id>/export         試算表匯出 xlsx
+    GET /drive/v3/changes/startPageToken
+    GET /drive/v3/changes                   變更紀錄（pageToken 為變更序號）
+    GET /v4/spreadsheets/<id>               Sheets API spreadsheets.get（includeGridData、ranges，
+                                            fields 只分辨 formattedValue 與 backgroundColor）
+
+試算表的格子由存放的 xlsx 產生，回應的形狀與 Google 相同（空白格、尾端空白省略，顏色 0 的分量省略）。
+
+模擬配額：set_quota(每秒次數, 最多累積次數) 超過時回 429（rateLimitExceeded，附 Retry-After），
+inject_rate_limits(n) 讓接下來 n 個請求直接回 429；latency 為每個請求的處理時間（秒），
+peak_in_flight 記錄各端點同時處理中的最大請求數。
+
+把 drive_client 指過來：
+    export DRIVE_API_ENDPOINT=http://127.0.0.1:8765/drive/v3/
+    export SHEETS_API_ENDPOINT=http://127.0.0.1:8765/
+
+單獨啟動（預設放三個月的合成班表）：
+    python -m benchmarks.fake_drive --port 8765
+"""
+import argparse
+import io
+import json
+import re
+import threading
+import time
+from datetime import date, datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook
+
+
+SPREADSHEET_MIME = "application/vnd.google-apps.spreadsheet"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _now_rfc3339() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _formatted_value(value):
+    """openpyxl 的值 -> Google 試算表的顯示文字（formattedValue）。"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (datetime, date)):
+        return f"{value.year}/{value.month}/{value.day}"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _background_color(cell) -> dict:
+    """儲存格底色 -> Sheets API 的 Color；沒有填色為白色，值為 0 的分量省略（與 Google 相同）。"""
+    fill = cell.fill
+    rgb = fill.fgColor.rgb if fill is not None and fill.fill_type == "solid" and fill.fgColor.type == "rgb" else "FFFFFFFF"
+    channels = {name: int(rgb[i:i + 2], 16) / 255 for name, i in (("red", 2), ("green", 4), ("blue", 6))}
+    return {name: v for name, v in channels.items() if v}
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index
+
+
+def parse_a1_range(a1: str) -> tuple:
+    """"'工作表'!B2:AF2" -> (工作表, 起始列, 起始欄, 結束列, 結束欄)，皆為 1-based。"""
+    m = re.fullmatch(r"(?:'((?:[^']|'')+)'|([^!]+))(?:!([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?)?", a1)
+    title = (m.group(1) or "").replace("''", "'") or m.group(2)
+    if not m.group(3):
+        return title, None, None, None, None
+    start_col, start_row = _column_index(m.group(3)), int(m.group(4))
+    end_col = _column_index(m.group(5)) if m.group(5) else start_col
+    end_row = int(m.group(6)) if m.group(6) else start_row
+    return title, start_row, start_col, end_row, end_col
+
+
+class FakeDrive:
+    """假 Drive 的資料與變更紀錄；所有方法都是執行緒安全的。"""
+
+    def __init__(self):
+        self.files = {}
+        self.changes = []          # [(序號, file_id)]
+        self.request_counts = {}   # {端點名稱: 次數}（含回 429 的請求）
+        self.throttled_counts = {}  # {端點名稱: 回 429 的次數}
+        self.in_flight = {}
+        self.peak_in_flight = {}
+        self.latency = 0.0
+        self._quota = None         # [每秒次數, 最多累積次數, 剩餘次數, 上次補充時間]
+        self._forced_429 = 0
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    # ---------- 測試端操作 ----------
+    def add_file(self, name: str, content: bytes, mime_type: str = XLSX_MIME, file_id: str = None) -> str:
+        with self._lock:
+            file_id = file_id or f"1fake{self._next_id:028d}"   # 與真的 Drive ID 一樣 33 字元
+            self._next_id += 1
+            self.files[file_id] = {
+                "id": file_id,
+                "name": name,
+                "mimeType": mime_type,
+                "modifiedTime": _now_rfc3339(),
+                "trashed": False,
+                "content": content,
+            }
+            self._record_change(file_id)
+        return file_id
+
+    def update_file(self, file_id: str, content: bytes = None, name: str = None):
+        with self._lock:
+            f = self.files[file_id]
+            if content is not None:
+                f["content"] = content
+            if name is not None:
+                f["name"] = name
+            f["modifiedTime"] = _now_rfc3339()
+            self._record_change(file_id)
+
+    def trash_file(self, file_id: str):
+        with self._lock:
+            self.files[file_id]["trashed"] = True
+            self._record_change(file_id)
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts = {}
+            self.throttled_counts = {}
+            self.peak_in_flight = {}
+
+    def set_quota(self, rate: float = None, burst: float = None):
+        """所有端點共用的配額（每秒 rate 次、最多累積 burst 次）；rate 為 None 表示不限制。"""
+        with self._lock:
+            self._quota = None if rate is None else [rate, burst or rate, burst or rate, time.monotonic()]
+
+    def inject_rate_limits(self, n: int):
+        """接下來 n 個請求直接回 429。"""
+        with self._lock:
+            self._forced_429 += n
+
+    def _record_change(self, file_id: str):
+        self.changes.append((len(self.changes) + 1, file_id))
+
+    def admit(self, endpoint: str):
+        """記錄一個請求；超過配額時回傳 Retry-After 秒數（要回 429），否則回傳 None 並計入處理中。"""
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+            retry_after = None
+            if self._forced_429:
+                self._forced_429 -= 1
+                retry_after = 0.05
+            elif self._quota is not None:
+                rate, burst, tokens, updated = self._quota
+                now = time.monotonic()
+                tokens = min(burst, tokens + (now - updated) * rate)
+                if tokens >= 1:
+                    self._quota[2:] = [tokens - 1, now]
+                else:
+                    self._quota[2:] = [tokens, now]
+                    retry_after = round((1 - tokens) / rate, 3)
+            if retry_after is not None:
+                self.throttled_counts[endpoint] = self.throttled_counts.get(endpoint, 0) + 1
+                return retry_after
+            self.in_flight[endpoint] = self.in_flight.get(endpoint, 0) + 1
+            self.peak_in_flight[endpoint] = max(self.peak_in_flight.get(endpoint, 0), self.in_flight[endpoint])
+        if self.latency:
+            time.sleep(self.latency)
+        return None
+
+    def leave(self, endpoint: str):
+        with self._lock:
+            self.in_flight[endpoint] -= 1
+
+    # ---------- API 回應 ----------
+    @staticmethod
+    def public_meta(f: dict) -> dict:
+        meta = {k: v for k, v in f.items() if k != "content"}
+        meta["size"] = str(len(f["content"]))
+        return meta
+
+    def list_files(self, q: str, page_size: int) -> dict:
+        since = re.search(r"modifiedTime >= '([^']+)'", q or "")
+        with self._lock:
+            files = [self.public_meta(f) for f in self.files.values() if not f["trashed"]]
+        if since:
+            files = [f for f in files if f["modifiedTime"] >= since.group(1)]
+        files.sort(key=lambda f: f["modifiedTime"], reverse=True)
+        return {"files": files[:page_size]}
+
+    def spreadsheet(self, file_id: str, ranges: list, fields: str) -> dict:
+        """spreadsheets.get（includeGridData=true）：由存放的 xlsx 產生格子。"""
+        from openpyxl import load_workbook
+
+        with self._lock:
+            content = self.files[file_id]["content"]
+        wb = load_workbook(io.BytesIO(content))
+        want_values = "formattedValue" in fields
+        want_colors = "backgroundColor" in fields
+
+        def cell_data(cell) -> dict:
+            data = {}
+            value = _formatted_value(cell.value)
+            if want_values and value is not None:
+                data["formattedValue"] = value
+            if want_colors:
+                data["effectiveFormat"] = {"backgroundColor": _background_color(cell)}
+            return data
+
+        def grid(ws, start_row, start_col, end_row, end_col) -> dict:
+            row_data = []
+            for row in ws.iter_rows(min_row=start_row, max_row=end_row, min_col=start_col, max_col=end_col):
+                values = [cell_data(cell) for cell in row]
+                while values and not values[-1]:
+                    values.pop()
+                row_data.append({"values": values} if values else {})
+            data = {"rowData": row_data}
+            if start_row > 1:
+                data["startRow"] = start_row - 1
+            if start_col > 1:
+                data["startColumn"] = start_col - 1
+            return data
+
+        sheets = []
+        if ranges:
+            for a1 in ranges:
+                title, r0, c0, r1, c1 = parse_a1_range(a1)
+                ws = wb[title]
+                if r0 is None:
+                    r0, c0, r1, c1 = 1, 1, ws.max_row, ws.max_column
+                sheets.append({"properties": {"title": title}, "data": [grid(ws, r0, c0, r1, c1)]})
+        else:
+            for ws in wb.worksheets:
+                sheets.append({"properties": {"title": ws.title}, "data": [grid(ws, 1, 1, ws.max_row, ws.max_column)]})
+        wb.close()
+        return {"spreadsheetId": file_id, "sheets": sheets}
+
+    def list_changes(self, page_token: int, page_size: int) -> dict:
+        with self._lock:
+            pending = [(seq, fid) for seq, fid in self.changes if seq >= page_token]
+            page = pending[:page_size]
+            resp = {"changes": []}
+            for seq, fid in page:
+                f = self.files.get(fid)
+                change = {"fileId": fid, "removed": f is None, "time": _now_rfc3339()}
+                if f is not None:
+                    change["file"] = self.public_meta(f)
+                resp["changes"].append(change)
+            if len(pending) > page_size:
+                resp["nextPageToken"] = str(page[-1][0] + 1)
+            else:
+                resp["newStartPageToken"] = str(len(self.changes) + 1)
+        return resp
+
+
+class _Handler(BaseHTTPRequestHandler):
+    drive: FakeDrive = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_bytes(self, data: bytes, mime: str):
+        self.send_response(200)
+        self.send_header("Content-Type", mime)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _not_found(self):
+        self._send_json(404, {"error": {"code": 404, "message": "File not found"}})
+
+    def _admit(self, endpoint: str) -> bool:
+        """超過配額時回 429（與 Google 相同的錯誤內容）並回傳 False。"""
+        retry_after = self.drive.admit(endpoint)
+        if retry_after is None:
+            self._endpoint = endpoint
+            return True
+        data = json.dumps({"error": {
+            "code": 429, "message": "Rate Limit Exceeded",
+            "errors": [{"domain": "usageLimits", "reason": "rateLimitExceeded", "message": "Rate Limit Exceeded"}],
+        }}).encode("utf-8")
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+        return False
+
+    def do_GET(self):
+        self._endpoint = None
+        try:
+            self._handle_get()
+        finally:
+            if self._endpoint is not None:
+                self.drive.leave(self._endpoint)
+
+    def _handle_get(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        drive = self.drive
+
+        if path == "/drive/v3/files":
+            if not self._admit("files.list"):
+                return
+            return self._send_json(200, drive.list_files(params.get("q", ""), int(params.get("pageSize", 100))))
+
+        if path == "/drive/v3/changes/startPageToken":
+            if not self._admit("changes.getStartPageToken"):
+                return
+            return self._send_json(200, {"startPageToken": str(len(drive.changes) + 1)})
+
+        if path == "/drive/v3/changes":
+            if not self._admit("changes.list"):
+                return
+            try:
+                token = int(params.get("pageToken", ""))
+            except ValueError:
+                return self._send_json(400, {"error": {"code": 400, "message": "Invalid pageToken"}})
+            return self._send_json(200, drive.list_changes(token, int(params.get("pageSize", 100))))
+
+        m = re.fullmatch(r"/v4/spreadsheets/([^/]+)", path)
+        if m:
+            f = drive.files.get(m.group(1))
+            if f is None or f["mimeType"] != SPREADSHEET_MIME:
+                return self._not_found()
+            if not self._admit("spreadsheets.get"):
+                return
+            ranges = parse_qs(url.query).get("ranges", [])
+            return self._send_json(200, drive.spreadsheet(m.group(1), ranges, params.get("fields", "")))
+
+        m = re.fullmatch(r"/drive/v3/files/([^/]+)(/export)?", path)
+        if not m:
+            return self._not_found()
+        f = drive.files.get(m.group(1))
+        if f is None:
+            return self._not_found()
+
+        if m.group(2):
+            if not self._admit("files.export"):
+                return
+            return self._send_bytes(f["content"], XLSX_MIME)
+        if params.get("alt") == "media":
+            if not self._admit("files.get_media"):
+                return
+            return self._send_bytes(f["content"], f["mimeType"])
+        if not self._admit("files.get"):
+            return
+        return self._send_json(200, drive.public_meta(f))
+
+
+class FakeDriveServer:
+    """在背景執行緒啟動假 Drive；with 區塊結束時自動關閉。"""
+
+    def __init__(self, drive: FakeDrive = None, host: str = "127.0.0.1", port: int = 0):
+        self.drive = drive or FakeDrive()
+        handler = type("Handler", (_Handler,), {"drive": self.drive})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/drive/v3/"
+
+    @property
+    def sheets_endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def seed_schedules(
+    drive: FakeDrive, months: list, n_staff: int = 60, n_task_rows: int = 58, mime_type: str = XLSX_MIME,
+) -> dict:
+    """放入 months（[(年, 月)]）的合成班表，回傳 {Drive 檔名: file_id}；mime_type 可改為原生試算表。"""
+    ids = {}
+    for year, month in months:
+        name = drive_file_name(year, month)
+        ids[name] = drive.add_file(name, make_schedule_workbook(n_staff, n_task_rows, year, month), mime_type=mime_type)
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機假 Google Drive API")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = FakeDriveServer(port=args.port)
+    seed_schedules(server.drive, [(2026, 1), (2026, 2), (2026, 3)])
+    print(f"假 Drive 已啟動：DRIVE_API_ENDPOINT={server.endpoint} SHEETS_API_ENDPOINT={server.sheets_endpoint}")
+    server.start()
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
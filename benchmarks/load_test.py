@@ -0,0 +1,337 @@
+"""
+壓力測試：用 Streamlit 的測試 API（AppTest）模擬多位同時使用的使用者，
+對本機假 Drive（benchmarks/fake_drive.py）跑「載入班表 + 轉換」。
+
+每位使用者是一個獨立的 AppTest session，依 --mix 的比例輪流使用三種班表來源：
+    upload  上傳 Excel（file_uploader）
+    drive   現有共用班表檔案（Drive 列檔後選最新一份）
+    link    試算表連結（貼上 Drive 連結）
+
+每位使用者在自己的行程裡跑（multiprocessing，spawn）：AppTest 每次執行都會替換行程全域的
+Runtime 與 st.secrets，同一個行程裡不能真的同時跑；分開行程後所有 session 同時送出請求，
+回報的是真正並行時每個步驟的 p50 / p95 / p99 延遲。所有行程都建立好 AppTest 後才一起開始，
+啟動與 import 的時間不算在內。
+
+記憶體回報：
+    rss_total_peak   所有使用者行程（加上主行程）同一時間 RSS 合計的峰值
+    rss_worker_peak  單一使用者行程 RSS 峰值的 p50 / 最大值
+各使用者行程各有自己的快取（正式環境同一個 Streamlit 伺服器的 session 共用快取），
+快取大小為各行程合計，假 Drive 的請求數也會比共用快取時多。
+可以用來估算一台機器撐得住多少人，或比較調整前後的差異（--json 存檔後比對）。
+
+用法（在 repo 根目錄）：
+    python -m benchmarks.load_test --users 8 --iterations 3
+    python -m benchmarks.load_test --users 20 --mix upload=1,drive=3,link=1 --json load.json
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.fake_drive import FakeDriveServer, seed_schedules
+from benchmarks.synth_schedule import drive_file_name, make_schedule_workbook, staff_codes
+
+
+APP_PATH = Path(__file__).resolve().parent.parent / "duty_noDL_allfunction.py"
+
+SOURCE_LABELS = {
+    "upload": "上傳 Excel",
+    "drive": "現有共用班表檔案(3個月內)",
+    "link": "試算表連結",
+}
+
+# 留言回饋頁沒有設定試算表時固定會出現的提示，不算錯誤
+IGNORED_MESSAGES = ("尚未設定 FEEDBACK_SHEET_ID",)
+
+# 等所有使用者行程建立好 AppTest 的上限秒數
+STARTUP_TIMEOUT = 300
+
+
+def percentile(samples: list, p: float) -> float:
+    """nearest-rank 百分位數。"""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def parse_mix(text: str) -> list:
+    """"upload=1,drive=2" -> ["upload", "drive", "drive"]"""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SOURCE_LABELS:
+            raise SystemExit(f"未知的班表來源：{name}（可用：{', '.join(SOURCE_LABELS)}）")
+        mix += [name] * int(weight or 1)
+    return mix
+
+
+class RssSampler(threading.Thread):
+    """
+    每隔 interval 秒讀一次各行程 /proc/<pid>/status 的 VmRSS，記錄合計的峰值
+    （非 Linux 時只記本行程的 ru_maxrss）。pids 為 None 時只看本行程；已結束的行程不計。
+    """
+
+    def __init__(self, pids: list = None, interval: float = 0.05):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.start_rss = self.total_rss()
+        self.peak_rss = self.start_rss
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def read_rss(pid="self") -> int:
+        try:
+            with open(f"/proc/{pid}/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            if pid != "self":
+                return 0
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def total_rss(self) -> int:
+        return sum(self.read_rss(pid) for pid in (self.pids or ["self"]))
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.total_rss())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak_rss
+
+
+class SimulatedUser:
+    """一位使用者：一個 AppTest session，記錄每個步驟花的秒數與錯誤訊息。"""
+
+    def __init__(self, user_id: int, context: dict):
+        from streamlit.testing.v1 import AppTest
+
+        self.user_id = user_id
+        self.context = context
+        self.timings = {}
+        self.errors = []
+        self.rng = random.Random(user_id)
+        self.at = AppTest.from_file(str(APP_PATH), default_timeout=300)
+        self.at.secrets["FEEDBACK_SHEET_ID"] = ""
+
+    def _run(self) -> float:
+        """執行一次頁面，回傳秒數。"""
+        start = time.perf_counter()
+        self.at.run()
+        return time.perf_counter() - start
+
+    def _timed_run(self, step: str):
+        self.timings.setdefault(step, []).append(self._run())
+        problems = [e.value for e in self.at.exception] + [
+            e.value for e in self.at.error if not str(e.value).startswith(IGNORED_MESSAGES)
+        ]
+        self.errors.extend(f"user{self.user_id} {step}: {p}" for p in problems)
+
+    def _button(self, text: str):
+        return next(b for b in self.at.button if text in b.label)
+
+    def _text_input(self, text: str):
+        return next(t for t in self.at.text_input if text in t.label)
+
+    def session(self, source: str):
+        """選來源 -> 載入班表 -> 輸入代號並轉換。"""
+        at = self.at
+        self._timed_run("open")
+        at.radio[0].set_value(SOURCE_LABELS[source])
+        self._run()
+
+        if source == "upload":
+            year, month, data = self.rng.choice(self.context["workbooks"])
+            at.file_uploader[0].set_value((f"{drive_file_name(year, month)}.xlsx", data, "application/octet-stream"))
+        elif source == "link":
+            file_id = self.rng.choice(self.context["file_ids"])
+            self._text_input("連結").set_value(f"https://docs.google.com/spreadsheets/d/{file_id}/edit#gid=0")
+        self._button("載入班表").click()
+        self._timed_run(f"load:{source}")
+
+        self._text_input("班表代號").set_value(self.rng.choice(self.context["codes"]))
+        self._button("轉換 / 預覽").click()
+        self._timed_run("convert")
+
+
+def user_process(user_id: int, iterations: int, mix: list, context: dict, barrier, results):
+    """一個使用者行程：建立 AppTest，等所有行程就緒後一起開始，結果放進 results。"""
+    # 每個行程模擬一台獨立的伺服器，各自保存 Drive 變更的 page token
+    token_path = Path(os.environ["DRIVE_CHANGES_TOKEN_PATH"])
+    os.environ["DRIVE_CHANGES_TOKEN_PATH"] = str(token_path.with_name(f"token_user{user_id}.json"))
+    try:
+        user = SimulatedUser(user_id, context)
+    except Exception as e:
+        barrier.abort()
+        results.put({"user_id": user_id, "timings": {}, "errors": [f"user{user_id} 啟動失敗：{e!r}"]})
+        return
+    barrier.wait(STARTUP_TIMEOUT)
+    sampler = RssSampler()
+    sampler.start()
+    try:
+        for i in range(iterations):
+            user.session(mix[(user_id + i) % len(mix)])
+    except Exception as e:
+        user.errors.append(f"user{user_id}: {e!r}")
+    from schedule_cache import parse_cache, result_cache, workbook_store
+
+    results.put({
+        "user_id": user_id,
+        "timings": user.timings,
+        "errors": user.errors,
+        "rss_peak": sampler.stop(),
+        "caches": {
+            "workbook_store_bytes": workbook_store.total_bytes,
+            "workbook_store_entries": len(workbook_store),
+            "parse_cache_entries": len(parse_cache),
+            "result_cache_bytes": result_cache.total_bytes,
+        },
+    })
+
+
+def run_load_test(users: int, iterations: int, mix: list, workbooks: list, codes: list, file_ids: list) -> dict:
+    # spawn：每個使用者行程從乾淨的直譯器開始，不繼承主行程的執行緒（假 Drive 伺服器）
+    ctx = multiprocessing.get_context("spawn")
+    context = {"workbooks": workbooks, "codes": codes, "file_ids": file_ids}
+    barrier, results = ctx.Barrier(users + 1), ctx.Queue()
+    processes = [
+        ctx.Process(target=user_process, args=(u, iterations, mix, context, barrier, results), name=f"user{u}")
+        for u in range(users)
+    ]
+    for process in processes:
+        process.start()
+
+    reports, errors = [], []
+    try:
+        barrier.wait(STARTUP_TIMEOUT)
+    except threading.BrokenBarrierError:
+        errors.append("有使用者行程啟動失敗")
+    sampler = RssSampler(["self"] + [p.pid for p in processes])
+    sampler.start()
+    start = time.perf_counter()
+    for process in processes:
+        # 先取結果再 join：行程放進 Queue 的資料沒被讀走前不會結束
+        try:
+            reports.append(results.get(timeout=STARTUP_TIMEOUT + 3600))
+        except Exception:
+            break
+    wall = time.perf_counter() - start
+    peak = sampler.stop()
+    for process in processes:
+        process.join(timeout=30)
+        if process.exitcode != 0:
+            errors.append(f"{process.name} 結束代碼 {process.exitcode}")
+
+    timings = {}
+    for report in reports:
+        for step, samples in report["timings"].items():
+            timings.setdefault(step, []).extend(samples)
+        errors.extend(report["errors"])
+    worker_peaks = [r["rss_peak"] for r in reports if "rss_peak" in r]
+    caches = [r["caches"] for r in reports if "caches" in r]
+
+    def cache_total(name: str) -> int:
+        return sum(c[name] for c in caches)
+
+    return {
+        "users": users,
+        "iterations": iterations,
+        "wall_seconds": round(wall, 3),
+        "sessions_per_second": round(users * iterations / wall, 3),
+        "steps": {
+            step: {
+                "count": len(samples),
+                "p50": round(percentile(samples, 50), 4),
+                "p95": round(percentile(samples, 95), 4),
+                "p99": round(percentile(samples, 99), 4),
+            }
+            for step, samples in sorted(timings.items())
+        },
+        "memory": {
+            "rss_start_mb": round(sampler.start_rss / 2**20, 1),
+            "rss_total_peak_mb": round(peak / 2**20, 1),
+            "rss_worker_peak_p50_mb": round(percentile(worker_peaks, 50) / 2**20, 1),
+            "rss_worker_peak_max_mb": round(max(worker_peaks, default=float("nan")) / 2**20, 1),
+            "workbook_store_kb": round(cache_total("workbook_store_bytes") / 1024, 1),
+            "workbook_store_entries": cache_total("workbook_store_entries"),
+            "parse_cache_entries": cache_total("parse_cache_entries"),
+            "result_cache_kb": round(cache_total("result_cache_bytes") / 1024, 1),
+        },
+        "errors": errors,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{report['users']} 位使用者 x {report['iterations']} 輪，"
+          f"總時間 {report['wall_seconds']:.1f}s（{report['sessions_per_second']:.2f} 輪/秒）")
+    print(f"{'step':<14}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for step, s in report["steps"].items():
+        print(f"{step:<14}{s['count']:>7}" + "".join(f"{s[p] * 1000:>8.0f}ms" for p in ("p50", "p95", "p99")))
+    m = report["memory"]
+    print(f"RSS 合計 {m['rss_start_mb']}MB -> 同時峰值 {m['rss_total_peak_mb']}MB；"
+          f"每個使用者行程峰值 p50 {m['rss_worker_peak_p50_mb']}MB、最大 {m['rss_worker_peak_max_mb']}MB")
+    print(f"各行程快取合計：班表 {m['workbook_store_entries']} 份 {m['workbook_store_kb']}KB，"
+          f"解析快取 {m['parse_cache_entries']} 份，結果快取 {m['result_cache_kb']}KB")
+    if report["errors"]:
+        print(f"\n❌ {len(report['errors'])} 個錯誤：")
+        for e in report["errors"][:20]:
+            print(f"  {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模擬多位使用者同時載入班表並轉換")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=2, help="每位使用者跑幾輪")
+    parser.add_argument("--mix", default="upload=1,drive=2,link=1", help="班表來源比例")
+    parser.add_argument("--staff", type=int, default=60)
+    parser.add_argument("--tasks", type=int, default=58)
+    parser.add_argument("--json", default=None, help="把結果寫成 JSON 檔")
+    args = parser.parse_args()
+
+    months = [(2026, 1), (2026, 2), (2026, 3)]
+    server = FakeDriveServer().start()
+    token_dir = tempfile.TemporaryDirectory()
+    # drive_client 在 import 時讀取端點設定，必須在頁面第一次執行前設好
+    os.environ["DRIVE_API_ENDPOINT"] = server.endpoint
+    os.environ["DRIVE_CHANGES_TOKEN_PATH"] = str(Path(token_dir.name) / "token.json")
+    # 頁面的背景工作會同步鏡像：寫到暫存目錄，不動本機的鏡像
+    os.environ["SCHEDULE_MIRROR_DIR"] = str(Path(token_dir.name) / "mirror")
+
+    ids = seed_schedules(server.drive, months, n_staff=args.staff, n_task_rows=args.tasks)
+    workbooks = [(y, m, make_schedule_workbook(args.staff, args.tasks, y, m)) for y, m in months]
+    codes = staff_codes(args.staff)
+
+    report = run_load_test(args.users, args.iterations, parse_mix(args.mix), workbooks, codes, list(ids.values()))
+    report["drive_requests"] = dict(server.drive.request_counts)
+    print_report(report)
+    print(f"假 Drive 請求：{report['drive_requests']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"已寫入 {args.json}")
+
+    server.stop()
+    token_dir.cleanup()
+    if report["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+合成班表產生器。
+
+產生和 11404班表範例.xlsx 相同版面的 Excel：
+    第 1 列：標題（合併儲存格），例如「臺北榮民總醫院藥學部115年3月臨床藥師原始班表」
+    第 2 列：日期（假日灰底）
+    第 3 列：星期
+    第 4 列起：A 欄工作內容，B 欄起每天的代號（可能一格多個代號）
+    最後：「附　註」與代號對照
+
+template 可以產生其它單位常見的版面變化（見 TEMPLATES），用來驗證版面偵測；
+同樣的 seed 下各範本的排班內容完全相同，轉換結果應該一致。
+
+同樣的參數與 seed 一定產生同樣的內容，方便做基準比較。
+
+用法：
+    python -m benchmarks.synth_schedule --staff 80 --tasks 60 --year 2026 --month 3 -o out.xlsx
+"""
+import argparse
+import calendar
+import io
+import random
+import string
+from datetime import date, timedelta
+
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill
+
+
+# 與 schedule_core.build_holiday_map 判斷用的灰底一致
+HOLIDAY_GRAY = "FFD9D9D9"
+
+WEEKDAY_NAMES = ["一", "二", "三", "四", "五", "六", "日"]
+
+# 版面變化：
+#   row_offset / col_offset  班表前面多出的空白列 / 空白欄
+#   weekday                  "below"（日期下一列）、"above"（日期上一列）、None（沒有星期列）
+#   weekday_prefix           星期的寫法，例如「週二」
+#   notes_sheet              班表前面多一張說明工作表
+TEMPLATES = {
+    "standard": dict(row_offset=0, col_offset=0, weekday="below", weekday_prefix="", notes_sheet=False),
+    "offset": dict(row_offset=2, col_offset=1, weekday="above", weekday_prefix="週", notes_sheet=True),
+    "no_weekday": dict(row_offset=1, col_offset=0, weekday=None, weekday_prefix="", notes_sheet=False),
+}
+
+# 取自範例班表的工作內容，產生時依序循環並加上編號
+TASK_LABEL_TEMPLATES = [
+    "處方判讀 {n}-住院 (上午)",
+    "處方判讀 {n}-住院 (下午)",
+    "處方判讀 {n}-住院 (小夜1hr)",
+    "處方判讀 7-住院 (小夜)",
+    "化療處方判讀(上午)",
+    "化療處方判讀(下午)",
+    "藥物諮詢 (上午)",
+    "藥物諮詢 (下午)",
+    "抗凝藥師門診 {n}",
+    "移植藥師門診 (上午)",
+    "PreESRD (上午)",
+    "中藥局調劑-{n} (08:30-12:00)",
+    "門診藥局調劑-{n} (08:30-12:30)覆核 (FP班)",
+    "門診藥局調劑-{n} (09:00-13:00)發藥",
+    "門診藥局調劑-{n} (13:30-17:30)發藥",
+    "中2藥局發藥-{n} (08:00-16:00)",
+    "中正 2樓調劑複核-{n}",
+    "中正13樓調劑複核-{n}",
+    "思源樓調劑複核-{n}",
+    "長青樓調劑複核-{n}",
+    "瑞德西偉審核",
+    "假日非常班之諮詢與藥動服務 (上午)",
+    "假日非常班之諮詢與藥動服務 (下午)",
+    "假日非常班之諮詢與藥動服務 (晚上)",
+]
+
+# 範例班表的代號是單一英文字母或中文姓氏
+_SURNAMES = "張陳林黃李王吳劉蔡楊許鄭謝郭洪曾邱廖賴周徐蘇葉莊呂江何蕭羅高潘簡朱鍾彭游詹胡施沈余趙盧梁顏柯翁魏孫戴范方宋鄧杜傅侯曹薛丁卓阮馬董温唐藍石蔣古紀姚連馮歐程湯黃田康姜白汪鄒尤巫鐘黎涂龔嚴韓袁金童陸夏柳凃邵錢伍倪溫于譚駱熊任甘秦顧毛章史官萬俞雷粘饒張闕凌崔尹孔辛武辜陶段龍韋葛池孟褚殷麥賀賈莫文管關向包丘梅華利裴樊房全佘左花魯安鮑郝穆塗邢蒲成谷常閻練盛鄞耿聶符申祝繆陽解曲岳齊籃應單舒畢喬龎翟牛鄒"
+
+
+def staff_codes(n_staff: int) -> list:
+    """產生 n_staff 個不重複代號：先用英文字母，不夠再用中文姓氏，再不夠就用兩位數字。"""
+    pool = list(string.ascii_uppercase) + list(string.ascii_lowercase)
+    pool += [ch for ch in dict.fromkeys(_SURNAMES)]
+    if n_staff <= len(pool):
+        return pool[:n_staff]
+    # 轉換時是用「代號 in 儲存格」比對，兩位數字不會和前面的單字代號互相包含
+    extra = [f"{i:02d}" for i in range(100)]
+    return (pool + extra)[:n_staff]
+
+
+def task_labels(n_task_rows: int) -> list:
+    """依序循環範例工作內容，產生 n_task_rows 個標籤。"""
+    labels = []
+    for i in range(n_task_rows):
+        template = TASK_LABEL_TEMPLATES[i % len(TASK_LABEL_TEMPLATES)]
+        labels.append(template.format(n=i // len(TASK_LABEL_TEMPLATES) + 1))
+    return labels
+
+
+def make_schedule_workbook(
+    n_staff: int = 60,
+    n_task_rows: int = 58,
+    year: int = 2026,
+    month: int = 3,
+    multi_code_ratio: float = 0.05,
+    fill_ratio: float = 0.8,
+    seed: int = 0,
+    template: str = "standard",
+    n_sheets: int = 1,
+) -> bytes:
+    """
+    產生一份合成班表，回傳 xlsx bytes。
+
+    n_staff：人員（代號）數
+    n_task_rows：工作內容列數
+    multi_code_ratio：一格放兩個代號（以「、」分隔）的比例
+    fill_ratio：有排班的格子比例（其餘留空）
+    template：版面（TEMPLATES 的 key）
+    n_sheets：班表工作表數（例如不同單位各一張）；第一張與 n_sheets=1 時完全相同
+    """
+    layout = TEMPLATES[template]
+    codes = staff_codes(n_staff)
+    labels = task_labels(n_task_rows)
+
+    wb = Workbook()
+    ws = wb.active
+    if layout["notes_sheet"]:
+        ws.title = "說明"
+        ws.cell(row=1, column=1, value="班表說明：灰底為假日")
+        ws = wb.create_sheet()
+
+    for k in range(n_sheets):
+        if k > 0:
+            ws = wb.create_sheet()
+        ws.title = "原始" if k == 0 else f"原始{k + 1}"
+        rng_seed = f"{seed}-{n_staff}-{n_task_rows}-{year}-{month}" + (f"-sheet{k}" if k else "")
+        _fill_schedule_sheet(
+            ws, random.Random(rng_seed), codes, labels, year, month, layout, multi_code_ratio, fill_ratio,
+        )
+
+    bio = io.BytesIO()
+    wb.save(bio)
+    return bio.getvalue()
+
+
+def _fill_schedule_sheet(ws, rng, codes, labels, year, month, layout, multi_code_ratio, fill_ratio):
+    """在工作表 ws 填入一個月的班表。"""
+    n_days = calendar.monthrange(year, month)[1]
+    roc_year = year - 1911
+
+    # 依範本位移後的列 / 欄；第一個日期欄為 col(2)
+    row0, col0 = layout["row_offset"], layout["col_offset"]
+    header_rows = 3 if layout["weekday"] else 2
+    date_row = 2 + (1 if layout["weekday"] == "above" else 0)
+    weekday_row = 2 if layout["weekday"] == "above" else 3
+
+    def cell(r, c, value=None):
+        return ws.cell(row=r + row0, column=c + col0, value=value)
+
+    # 第 1 列：標題
+    cell(1, 1, f"臺北榮民總醫院藥學部{roc_year}年{month}月臨床藥師原始班表")
+    ws.merge_cells(start_row=1 + row0, start_column=1 + col0, end_row=1 + row0, end_column=n_days + 1 + col0)
+
+    # 第 2、3 列：日期（週末灰底）與星期
+    gray = PatternFill(fill_type="solid", fgColor=HOLIDAY_GRAY)
+    cell(2, 1, "        項目                                              日期          ")
+    for day in range(1, n_days + 1):
+        weekday = calendar.weekday(year, month, day)
+        date_cell = cell(date_row, day + 1, day)
+        if weekday >= 5:
+            date_cell.fill = gray
+        if layout["weekday"]:
+            cell(weekday_row, day + 1, layout["weekday_prefix"] + WEEKDAY_NAMES[weekday])
+    ws.merge_cells(start_row=2 + row0, start_column=1 + col0, end_row=header_rows + row0, end_column=1 + col0)
+
+    # 表頭下一列起：工作內容與代號
+    for r, label in enumerate(labels, start=header_rows + 1):
+        cell(r, 1, label)
+        holiday_only = label.startswith("假日")
+        for day in range(1, n_days + 1):
+            is_weekend = calendar.weekday(year, month, day) >= 5
+            if holiday_only != is_weekend:
+                continue
+            if rng.random() > fill_ratio:
+                continue
+            value = rng.choice(codes)
+            if rng.random() < multi_code_ratio:
+                value = f"{value}、{rng.choice(codes)}"
+            cell(r, day + 1, value)
+
+    # 附註：代號對照（B 欄起，A 欄只有一格「附　註」）
+    footer_row = len(labels) + header_rows + 1
+    for i, code in enumerate(codes):
+        r = footer_row + i // 2
+        c = 2 if i % 2 == 0 else 5
+        cell(r, c, f"({code}): 藥師{i + 1}")
+    cell(footer_row + len(codes) // 4, 1, "附　註")
+    cell(footer_row + (len(codes) + 1) // 2, 2, " 1. 處方判讀：上午8:00-12:00、下午 13:30-17:30")
+
+
+def make_week_workbook(start: date, title_month: int = None, weekday: bool = True, n_days: int = 7) -> tuple:
+    """
+    一週的班表（可能跨月，例如 3/29 ~ 4/4），回傳 (xlsx bytes, {代號: [日期 "YYYY-MM-DD"]})。
+    標題的年月預設為第一天的月份，title_month 可以改成另一個月（例如這一週結束的月份）；
+    每個工作列每天排一個代號，第二個工作列週末不排。
+    """
+    title_month = title_month or start.month
+    days = [start + timedelta(days=k) for k in range(n_days)]
+    labels = ["處方判讀 1-住院 (上午)", "藥物諮詢 (下午)"]
+    codes = staff_codes(len(labels) * n_days)
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "週班表"
+    ws.cell(row=1, column=1, value=f"臺北榮民總醫院藥學部{start.year - 1911}年{title_month}月第1週班表")
+    ws.cell(row=2, column=1, value="項目")
+    expected = {}
+    for c, day in enumerate(days, start=2):
+        ws.cell(row=2, column=c, value=day.day)
+        if weekday:
+            ws.cell(row=3, column=c, value=WEEKDAY_NAMES[day.weekday()])
+    for r, label in enumerate(labels, start=4 if weekday else 3):
+        ws.cell(row=r, column=1, value=label)
+        for c, day in enumerate(days, start=2):
+            if label.startswith("藥物") and day.weekday() >= 5:
+                continue
+            code = codes[len(expected)]
+            ws.cell(row=r, column=c, value=code)
+            expected[code] = [day.isoformat()]
+
+    bio = io.BytesIO()
+    wb.save(bio)
+    return bio.getvalue(), expected
+
+
+def drive_file_name(year: int, month: int) -> str:
+    """對應的 Drive 檔名，例如 2026/3 -> 11503班表。"""
+    return f"{year - 1911:03d}{month:02d}班表"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生合成班表 Excel")
+    parser.add_argument("--staff", type=int, default=60)
+    parser.add_argument("--tasks", type=int, default=58)
+    parser.add_argument("--year", type=int, default=2026)
+    parser.add_argument("--month", type=int, default=3)
+    parser.add_argument("--multi", type=float, default=0.05, help="一格多代號的比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--template", choices=sorted(TEMPLATES), default="standard", help="版面變化")
+    parser.add_argument("--sheets", type=int, default=1, help="班表工作表數")
+    parser.add_argument("-o", "--output", default=None, help="輸出檔名（預設為 Drive 檔名格式）")
+    args = parser.parse_args()
+
+    data = make_schedule_workbook(
+        n_staff=args.staff,
+        n_task_rows=args.tasks,
+        year=args.year,
+        month=args.month,
+        multi_code_ratio=args.multi,
+        seed=args.seed,
+        template=args.template,
+        n_sheets=args.sheets,
+    )
+    output = args.output or f"{drive_file_name(args.year, args.month)}.xlsx"
+    with open(output, "wb") as f:
+        f.write(data)
+    print(f"已產生 {output}（{len(data):,} bytes）")
+
+
+if __name__ == "__main__":
+    main()
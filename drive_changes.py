@@ -0,0 +1,208 @@
+"""
+Drive 變更追蹤：用 changes feed 精準清除快取。
+
+list_recent_drive_files 原本只能靠 listing_cache 的存活時間定期重新列檔，
+下載也只能每次查 metadata 比對 modifiedTime。這裡改成低頻率輪詢 Drive 的 changes feed：
+    - page token 存在檔案裡，伺服器重啟後從上次的位置接著讀
+    - 只有真的變更的檔案，才清掉它的列檔 / 下載 / 解析快取
+    - 沒有變更時什麼都不做，列檔快取可以放心延長存活時間
+    - 頁面與獨立執行的 API 各自用一個 page token 檔（依角色加後綴），不會互相覆寫
+    - 只有班表的變更（在列檔結果裡、或檔名看得出年月）才重新列檔並通知 on_change；
+      留言回饋試算表每次留言都會變更，一律略過
+
+測試時把 DRIVE_API_ENDPOINT 指向 benchmarks/fake_drive.py 即可。
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from drive_client import SCHEDULE_MIMES, build_drive_service, load_feedback_sheet_id
+from google_limits import google_call
+from schedule_cache import invalidate_drive_files, listing_cache
+from schedule_core import parse_year_month_from_drive_filename
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_PATH = Path(os.environ.get(
+    "DRIVE_CHANGES_TOKEN_PATH",
+    Path(__file__).resolve().parent / ".cache" / "drive_changes_token.json",
+))
+
+CHANGES_POLL_SECONDS = 60
+
+
+def token_path_for(role: str) -> Path:
+    """
+    每個行程角色（"page"、"api"）各自的 page token 檔。
+    兩個行程共用同一個檔案時，一方讀過的變更另一方就再也讀不到，快取會漏清。
+    """
+    return DEFAULT_TOKEN_PATH.with_name(f"{DEFAULT_TOKEN_PATH.stem}.{role}{DEFAULT_TOKEN_PATH.suffix}")
+
+
+# 有變更追蹤時，列檔結果改成最多一小時重新確認一次（平常由變更追蹤負責清除）
+WATCHED_LISTING_TTL = 60 * 60
+
+CHANGE_FIELDS = "nextPageToken,newStartPageToken,changes(fileId,removed,file(name,mimeType,modifiedTime,trashed))"
+
+
+class ChangeTracker:
+    """
+    讀取 Drive changes feed，並依變更清除對應快取。
+    ignore_file_ids：不當成班表變更的檔案（例如留言回饋試算表），它們的變更完全略過。
+    """
+
+    def __init__(self, token_path: Path = DEFAULT_TOKEN_PATH, service_factory=build_drive_service,
+                 ignore_file_ids=()):
+        self.token_path = Path(token_path)
+        self.service_factory = service_factory
+        self.ignore_file_ids = set(ignore_file_ids)
+        self.page_token = self._load_token()
+
+    # ---------- page token ----------
+    def _load_token(self):
+        try:
+            with open(self.token_path, encoding="utf-8") as f:
+                return json.load(f).get("page_token")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_token(self, token: str):
+        self.page_token = token
+        self.token_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.token_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"page_token": token}, f)
+        os.replace(tmp, self.token_path)
+
+    def reset(self, service=None):
+        """重新取得起始 token；之前的變更無從得知，所以把所有 Drive 快取都視為過期。"""
+        service = service or self.service_factory()
+        token = google_call("changes.getStartPageToken", service.changes().getStartPageToken().execute)["startPageToken"]
+        self._save_token(token)
+        invalidate_drive_files([], refresh_listing=True)
+        return token
+
+    # ---------- 輪詢 ----------
+    def fetch_changes(self, service) -> list:
+        """從目前的 page token 讀到最新，回傳變更清單並保存新的 token。"""
+        changes = []
+        token = self.page_token
+        while token:
+            resp = google_call("changes.list", service.changes().list(
+                pageToken=token,
+                fields=CHANGE_FIELDS,
+                pageSize=100,
+                spaces="drive",
+            ).execute)
+            changes.extend(resp.get("changes", []))
+            if "newStartPageToken" in resp:
+                self._save_token(resp["newStartPageToken"])
+                break
+            token = resp.get("nextPageToken")
+        return changes
+
+    def poll(self) -> dict:
+        """
+        讀一次 changes feed 並清除受影響的快取。
+        回傳 {"changed": [file_id...], "invalidated": {...}}；changed 只列出班表的變更
+        （見 is_schedule_change），沒有時為空，呼叫端不必重新預載。
+        """
+        service = self.service_factory()
+        if not self.page_token:
+            self.reset(service)
+            return {"changed": [], "invalidated": {}}
+
+        try:
+            changes = self.fetch_changes(service)
+        except Exception as e:
+            # token 過期或無效（HTTP 400/404）：重新開始追蹤
+            status = getattr(getattr(e, "resp", None), "status", None)
+            if status in (400, 404):
+                logger.warning("Drive changes page token 失效，重新開始追蹤")
+                self.reset(service)
+                return {"changed": [], "invalidated": {}}
+            raise
+
+        changes = [c for c in changes if c.get("fileId") and c["fileId"] not in self.ignore_file_ids]
+        listed = {f.get("id") for _, files in listing_cache.items() for f in files}
+        schedules = list(dict.fromkeys(c["fileId"] for c in changes if is_schedule_change(c, listed)))
+        if not schedules:
+            # 其他檔案：只清掉它們自己的快取（例如貼連結載入過），不重列、不通知
+            others = list(dict.fromkeys(c["fileId"] for c in changes))
+            return {"changed": [], "invalidated": invalidate_drive_files(others) if others else {}}
+
+        # 有班表新增、刪除或改名時列檔結果都要重新查詢
+        changed = list(dict.fromkeys(c["fileId"] for c in changes))
+        invalidated = invalidate_drive_files(changed, refresh_listing=True)
+        logger.info("Drive 班表變更 %s，清除快取 %s", schedules, invalidated)
+        return {"changed": schedules, "invalidated": invalidated}
+
+
+def is_schedule_change(change: dict, listed_ids: set) -> bool:
+    """
+    這筆變更會不會影響班表清單或內容：檔案在目前的列檔結果裡（更新、改名、刪除），
+    或是檔名看得出年月的班表檔案（新增、改名成班表）。
+    """
+    if change["fileId"] in listed_ids:
+        return True
+    file = change.get("file") or {}
+    return (
+        not change.get("removed")
+        and file.get("mimeType") in SCHEDULE_MIMES
+        and parse_year_month_from_drive_filename(file.get("name")) is not None
+    )
+
+
+class ChangeWatcher(threading.Thread):
+    """
+    每隔 interval 秒呼叫一次 ChangeTracker.poll 的背景執行緒。
+    每次成功讀完變更，就把目前的列檔快取延長到寫入後 listing_ttl 秒；
+    輪詢失敗或停止追蹤後不再延長，新的列檔結果照 listing_cache 原本的短存活時間過期。
+    """
+
+    def __init__(self, tracker: ChangeTracker = None, interval: float = CHANGES_POLL_SECONDS,
+                 on_change=None, listing_ttl: float = WATCHED_LISTING_TTL):
+        super().__init__(name="drive-changes", daemon=True)
+        self.tracker = tracker or ChangeTracker()
+        self.interval = interval
+        self.on_change = on_change
+        self.listing_ttl = listing_ttl
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                result = self.tracker.poll()
+                if result["changed"] and self.on_change:
+                    self.on_change(result)
+                # 變更已經清過快取，剩下的列檔結果都還是最新的
+                listing_cache.extend_ttl(self.listing_ttl)
+            except Exception:
+                logger.exception("讀取 Drive 變更失敗")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_change_watcher(role: str, interval: float = CHANGES_POLL_SECONDS, on_change=None,
+                         listing_ttl: float = WATCHED_LISTING_TTL) -> ChangeWatcher:
+    """
+    role 決定 page token 檔（見 token_path_for），同一台機器上的每個行程要用不同的 role。
+    留言回饋試算表（FEEDBACK_SHEET_ID）的變更略過。
+    """
+    feedback_sheet_id = load_feedback_sheet_id()
+    watcher = ChangeWatcher(
+        tracker=ChangeTracker(
+            token_path=token_path_for(role),
+            ignore_file_ids=[feedback_sheet_id] if feedback_sheet_id else (),
+        ),
+        interval=interval,
+        on_change=on_change,
+        listing_ttl=listing_ttl,
+    )
+    watcher.start()
+    return watcher
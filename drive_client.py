@@ -0,0 +1,424 @@
+"""
+Google Drive / Google Sheets API 工具（Service Account）。
+
+頁面與背景預載（prefetch.py）共用，所以這裡不直接操作 Streamlit 頁面元件；
+設定錯誤一律拋出 DriveConfigError，由呼叫端決定怎麼顯示。
+
+google-api-python-client / google-auth 載入很慢，只有真的要連線時才在函式內 import，
+讓「上傳 Excel」的使用者在冷啟動時不必付這段成本。
+
+每個 API 呼叫都經過 google_limits.google_call（速率、同時呼叫上限、合併相同的呼叫、限流時重試）。
+"""
+import io
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+from google_limits import coalesce, google_call
+from schedule_cache import download_cache, listing_cache, metadata_cache, remember_drive_file_content
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# 1) Google Drive / Google Sheets API 共用設定
+# ============================================================
+SCOPES = [
+    "https://www.googleapis.com/auth/drive.readonly",
+    "https://www.googleapis.com/auth/spreadsheets",
+]
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+
+SPREADSHEET_MIME = "application/vnd.google-apps.spreadsheet"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+SCHEDULE_MIMES = (SPREADSHEET_MIME, XLSX_MIME)
+
+METADATA_FIELDS = "id,name,mimeType,modifiedTime,size"
+
+# 測試用：指向本機假 Drive / 假 Sheets API（例如 benchmarks/fake_drive.py），設定後不需要 Service Account
+DRIVE_API_ENDPOINT = os.environ.get("DRIVE_API_ENDPOINT", "")
+SHEETS_API_ENDPOINT = os.environ.get("SHEETS_API_ENDPOINT", "")
+
+# 原生 Google 試算表的讀法：
+#   values  以 Sheets API 只讀格子文字與日期列底色（預設；失敗時自動改用 export）
+#   export  由 Drive 匯出成 xlsx 再解析
+SHEETS_READ_MODE = os.environ.get("SHEETS_READ_MODE", "values")
+
+# spreadsheets.get 只取需要的欄位：格子的顯示文字；日期列另外只取底色
+SHEETS_VALUES_FIELDS = "sheets(properties(title),data(rowData(values(formattedValue))))"
+SHEETS_COLORS_FIELDS = "sheets(properties(title),data(startRow,startColumn,rowData(values(effectiveFormat(backgroundColor)))))"
+
+
+class DriveConfigError(RuntimeError):
+    """找不到 Service Account 設定。訊息可直接顯示給使用者。"""
+
+
+class DriveLinkError(ValueError):
+    """貼上的連結解析不出檔案 ID，或指到的不是班表檔案。訊息可直接顯示給使用者。"""
+
+
+def load_service_account_info():
+    """
+    讀取 Streamlit secrets 內的 [gcp_service_account] 區塊。
+    你必須先在 Streamlit Cloud 的 Secrets 或 .streamlit/secrets.toml 放入
+    [gcp_service_account] 區塊（type/project_id/private_key/client_email/token_uri...）。
+    """
+    import streamlit as st
+
+    if "gcp_service_account" not in st.secrets:
+        raise DriveConfigError("❌ 找不到 st.secrets['gcp_service_account']，請先設定 Streamlit Secrets。")
+    return st.secrets["gcp_service_account"]
+
+
+def load_feedback_sheet_id() -> str:
+    """留言回饋試算表的 ID（st.secrets["FEEDBACK_SHEET_ID"]）；沒有設定時回傳空字串。"""
+    import streamlit as st
+
+    try:
+        return str(st.secrets.get("FEEDBACK_SHEET_ID", "")).strip()
+    except Exception:
+        # 沒有 secrets.toml（例如測試或獨立執行的 API）
+        return ""
+
+
+def has_service_account() -> bool:
+    """是否已設定 Service Account 或測試用 Drive 端點（背景工作用來決定要不要啟動）。"""
+    if DRIVE_API_ENDPOINT:
+        return True
+    try:
+        load_service_account_info()
+    except Exception:
+        return False
+    return True
+
+
+def build_credentials(scopes=SCOPES):
+    """
+    從 Streamlit secrets 建立 Service Account 憑證。
+    """
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_info(
+        load_service_account_info(),
+        scopes=scopes
+    )
+
+
+def build_drive_service():
+    """建立 Google Drive API client（唯讀）。"""
+    from googleapiclient.discovery import build
+
+    if DRIVE_API_ENDPOINT:
+        import httplib2
+
+        return build(
+            "drive", "v3",
+            http=httplib2.Http(),
+            client_options={"api_endpoint": DRIVE_API_ENDPOINT},
+            static_discovery=True,
+        )
+
+    creds = build_credentials(DRIVE_SCOPES)
+    return build("drive", "v3", credentials=creds)
+
+
+def build_sheets_service():
+    """建立 Google Sheets API client。"""
+    from googleapiclient.discovery import build
+
+    if SHEETS_API_ENDPOINT:
+        import httplib2
+
+        return build(
+            "sheets", "v4",
+            http=httplib2.Http(),
+            client_options={"api_endpoint": SHEETS_API_ENDPOINT},
+            static_discovery=True,
+        )
+
+    creds = build_credentials(SCOPES)
+    return build("sheets", "v4", credentials=creds)
+
+
+# ============================================================
+# 2) Google Drive 下載/列檔工具
+# ============================================================
+# 一次比對所有支援的格式：.../d/<ID>/...、file/d/<ID>、open?id=<ID>、...?id=<ID> / &id=<ID>
+_DRIVE_LINK_RE = re.compile(r"(?:/d/|[?&]id=)([A-Za-z0-9_-]+)")
+
+# Drive / 試算表的檔案 ID：英數字與 - _，舊檔 28 字元、新檔 33 字元、試算表 44 字元
+_DRIVE_ID_RE = re.compile(r"[A-Za-z0-9_-]{20,128}")
+
+
+def extract_drive_file_id(url: str):
+    """
+    從使用者貼上的 Google Drive / Google Sheet 連結中抽出 file_id。
+    支援常見格式：
+    - https://docs.google.com/spreadsheets/d/<ID>/edit...
+    - https://drive.google.com/file/d/<ID>/view...
+    - https://drive.google.com/open?id=<ID>
+    - ...?id=<ID>
+    - 直接貼上檔案 ID
+    抽不出來或 ID 格式明顯不對（長度、字元）時回傳 None，不必打 API 就能擋下來。
+    """
+    if not url:
+        return None
+    url = url.strip()
+
+    m = _DRIVE_LINK_RE.search(url)
+    file_id = m.group(1) if m else url
+    if not is_valid_drive_file_id(file_id):
+        return None
+    return file_id
+
+
+def is_valid_drive_file_id(file_id: str) -> bool:
+    return bool(file_id) and _DRIVE_ID_RE.fullmatch(file_id) is not None
+
+
+def get_drive_file_metadata(file_id: str, use_cache: bool = True) -> dict:
+    """
+    查詢檔案 metadata（id / name / mimeType / modifiedTime / size），結果存在 metadata_cache；
+    重複貼同一個連結、或檔案剛出現在列檔結果中時，不必再打一次 API。
+    """
+    if use_cache:
+        cached = metadata_cache.get(file_id)
+        if cached is not None:
+            return dict(cached)
+
+    # 多個 session 同時查同一個檔案時只送一次
+    meta = google_call(
+        "files.get",
+        lambda: build_drive_service().files().get(fileId=file_id, fields=METADATA_FIELDS).execute(),
+        key=file_id,
+    )
+    metadata_cache.set(file_id, meta)
+    return dict(meta)
+
+
+def resolve_drive_link(url: str) -> dict:
+    """
+    連結 -> 檔案 metadata，並確認是 Google 試算表或 .xlsx。
+    格式不對的連結直接拋出 DriveLinkError，不會連線；metadata 有快取時也不會連線。
+    """
+    file_id = extract_drive_file_id(url)
+    if not file_id:
+        raise DriveLinkError("❌ 無法從連結解析檔案 ID，請確認貼的是 Drive/Sheet 分享連結。")
+
+    from googleapiclient.errors import HttpError
+
+    try:
+        meta = get_drive_file_metadata(file_id)
+    except HttpError as e:
+        if e.resp.status in (403, 404):
+            raise DriveLinkError("❌ 找不到這個檔案，或檔案尚未共用給服務帳號。") from e
+        raise
+    if meta.get("mimeType") not in SCHEDULE_MIMES:
+        raise DriveLinkError(f"❌ 「{meta.get('name', file_id)}」不是 Google 試算表或 Excel（.xlsx）檔案。")
+    return meta
+
+
+def schedule_sort_key(file_name: str) -> int:
+    """
+    由檔名（例如：11503班表）取出可排序的年月，民國年 * 100 + 月；
+    不是班表檔名回 -1。最新的班表就是這個值最大的檔案。
+    """
+    m = re.search(r"(\d{3})(\d{2})\s*班表", file_name or "")
+    if not m:
+        return -1
+    return int(m.group(1)) * 100 + int(m.group(2))
+
+
+def download_drive_file_as_bytes(file_id: str, meta: dict = None):
+    """
+    下載 Google Drive 檔案成 BytesIO（記憶體檔案），供 pandas/openpyxl 讀取。
+    同時支援：
+    A) Google 試算表（原生） -> export 成 xlsx
+    B) 真正 .xlsx 檔 -> get_media 直接下載
+    原生試算表預設改用 Sheets API 只讀格子與日期列底色（read_spreadsheet_values），
+    這時內容是 schedule_core 的 Sheets 格子 JSON，而不是 xlsx；兩者都可直接交給 get_parsed_workbook。
+
+    meta：列檔結果或 resolve_drive_link 的結果（含 name/mimeType/modifiedTime），
+          有給就不必再查 metadata；沒給時經由 metadata_cache 查詢。
+    下載結果以 (file_id, modifiedTime) 快取，檔案在 Drive 上更新後自然會重新下載；
+    同一個版本正在下載中時（其他 session 或背景預載），等那一次下載完成一起用。
+
+    回傳：(bio, file_name)
+    """
+    if meta is None or "modifiedTime" not in meta:
+        meta = get_drive_file_metadata(file_id)
+
+    file_name = meta.get("name", "")
+    mime = meta.get("mimeType", "")
+    cache_key = (file_id, meta.get("modifiedTime"))
+
+    cached = download_cache.get(cache_key)
+    if cached is not None:
+        data, file_name = cached
+        return io.BytesIO(data), file_name
+
+    def download() -> bytes:
+        data = None
+        if mime == SPREADSHEET_MIME and use_sheets_values():
+            try:
+                data = read_spreadsheet_values(file_id)
+            except Exception as e:
+                logger.warning("Sheets API 讀取 %s 失敗，改用匯出 xlsx：%s", file_id, e)
+
+        if data is None:
+            data = _download_file_content(file_id, mime)
+
+        download_cache.set(cache_key, (data, file_name))
+        remember_drive_file_content(file_id, data)
+        return data
+
+    data = coalesce(("download",) + cache_key, download)
+    return io.BytesIO(data), file_name
+
+
+def _download_file_content(file_id: str, mime: str) -> bytes:
+    """試算表匯出成 xlsx、.xlsx 直接下載。"""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    service = build_drive_service()
+    bio = io.BytesIO()
+
+    if mime == SPREADSHEET_MIME:
+        endpoint = "files.export"
+        request = service.files().export_media(
+            fileId=file_id,
+            mimeType=XLSX_MIME
+        )
+    else:
+        endpoint = "files.get_media"
+        request = service.files().get_media(fileId=file_id)
+
+    downloader = MediaIoBaseDownload(bio, request)
+    done = False
+    while not done:
+        # next_chunk 失敗時進度不變，重試會從同一段繼續
+        _, done = google_call(endpoint, downloader.next_chunk)
+    return bio.getvalue()
+
+
+def list_recent_drive_files(months_approx_days: int = 92, page_size: int = 100, use_cache: bool = True):
+    """
+    列出近三個月（約 92 天）內有更新的：
+    - Google 試算表
+    - Excel .xlsx
+
+    注意：Service Account 只看得到「自己建立」或「別人共享給它」的檔案。
+    結果會在 listing_cache 保留數分鐘，頁面每次 rerun 不必重打 Drive API。
+    """
+    cache_key = ("recent", months_approx_days, page_size)
+    if use_cache:
+        cached = listing_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+    service = build_drive_service()
+
+    since_dt = datetime.now(timezone.utc) - timedelta(days=months_approx_days)
+    since_str = since_dt.isoformat().replace("+00:00", "Z")
+
+    q = (
+        "("
+        f"mimeType='{SPREADSHEET_MIME}' OR "
+        f"mimeType='{XLSX_MIME}'"
+        ") "
+        f"AND modifiedTime >= '{since_str}' "
+        "AND trashed=false"
+    )
+
+    resp = google_call("files.list", service.files().list(
+        q=q,
+        fields=f"files({METADATA_FIELDS})",
+        orderBy="modifiedTime desc",
+        pageSize=page_size
+    ).execute, key=cache_key)
+
+    files = resp.get("files", [])
+    listing_cache.set(cache_key, files)
+    # 列出來的檔案之後被選取或貼連結時，不必再查 metadata
+    for f in files:
+        metadata_cache.set(f["id"], f)
+    return list(files)
+
+
+# ============================================================
+# 3) Google 試算表：以 Sheets API 直接讀格子
+# ============================================================
+def use_sheets_values() -> bool:
+    """原生試算表是否走 Sheets API；指向假 Drive 卻沒有假 Sheets API 時只能用匯出。"""
+    return SHEETS_READ_MODE == "values" and (SHEETS_API_ENDPOINT or not DRIVE_API_ENDPOINT)
+
+
+def _column_letter(col: int) -> str:
+    """0-based 欄位序號 -> A1 表示法的欄名（0 -> A、26 -> AA）。"""
+    letters = ""
+    col += 1
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def _argb(color: dict) -> str:
+    """Sheets API 的 Color（0~1 的 red/green/blue，值為 0 時省略）-> openpyxl 的 ARGB 字串。"""
+    return "FF" + "".join(f"{round(color.get(c, 0) * 255):02X}" for c in ("red", "green", "blue"))
+
+
+def read_spreadsheet_values(file_id: str) -> bytes:
+    """
+    以兩次 spreadsheets.get 讀取原生 Google 試算表，不經過 xlsx 匯出：
+    1) 所有工作表格子的顯示文字（formattedValue）
+    2) 偵測版面後，只讀各張班表日期列的底色（effectiveFormat.backgroundColor）
+    回傳 schedule_core.encode_sheets_payload 的 bytes，後續與 xlsx 一樣交給 get_parsed_workbook。
+    """
+    from schedule_core import encode_sheets_payload, sheet_values_layout
+
+    spreadsheets = build_sheets_service().spreadsheets()
+    resp = google_call(
+        "spreadsheets.get",
+        spreadsheets.get(spreadsheetId=file_id, includeGridData=True, fields=SHEETS_VALUES_FIELDS).execute,
+    )
+
+    sheets, ranges = [], []
+    for sheet in resp.get("sheets", []):
+        title = sheet["properties"]["title"]
+        row_data = (sheet.get("data") or [{}])[0].get("rowData", [])
+        values = [[cell.get("formattedValue") for cell in row.get("values", [])] for row in row_data]
+        sheets.append({"title": title, "values": values})
+
+        layout = sheet_values_layout(values, title)
+        if layout is not None:
+            row = layout.date_row + 1
+            first, last = _column_letter(layout.first_day_col), _column_letter(layout.first_day_col + layout.n_days - 1)
+            quoted = title.replace("'", "''")
+            ranges.append((sheets[-1], layout, f"'{quoted}'!{first}{row}:{last}{row}"))
+
+    if ranges:
+        resp = google_call("spreadsheets.get", spreadsheets.get(
+            spreadsheetId=file_id,
+            ranges=[a1 for _, _, a1 in ranges],
+            includeGridData=True,
+            fields=SHEETS_COLORS_FIELDS,
+        ).execute)
+        # 回應依工作表分組，同一張工作表只會有一個範圍
+        colors_by_title = {}
+        for sheet in resp.get("sheets", []):
+            data = (sheet.get("data") or [{}])[0]
+            cells = (data.get("rowData") or [{}])[0].get("values", [])
+            colors_by_title[sheet["properties"]["title"]] = [
+                _argb(cell.get("effectiveFormat", {}).get("backgroundColor", {})) for cell in cells
+            ]
+        for sheet, layout, _ in ranges:
+            sheet.update(
+                date_row=layout.date_row,
+                date_col=layout.first_day_col,
+                colors=colors_by_title.get(sheet["title"], []),
+            )
+
+    return encode_sheets_payload(sheets)
@@ -2,140 +2,60 @@ import streamlit as st
 import pandas as pd
 import re
 import io
-from datetime import datetime, timedelta, timezone
-from openpyxl import load_workbook
-
-# ====== Google Drive API（Service Account）套件 ======
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-
-
-# ============================================================
-# 0) 使用者可編輯簡化對照表（預設值）
-# ============================================================
-default_rules = [
-    {"原始關鍵字": "調劑複核", "簡化後": "C"},
-    {"原始關鍵字": "處方判讀", "簡化後": "判讀"},
-    {"原始關鍵字": "藥物諮詢", "簡化後": "諮詢"},
-    {"原始關鍵字": "門診藥局調劑", "簡化後": "門診"},
-    {"原始關鍵字": "中正 2樓", "簡化後": "中2"},
-    {"原始關鍵字": "中正13樓", "簡化後": "中13"},
-    {"原始關鍵字": "思源樓", "簡化後": "思源"},
-    {"原始關鍵字": "長青樓", "簡化後": "長青"},
-    {"原始關鍵字": "抗凝藥師門診", "簡化後": "抗凝門診"},
-    {"原始關鍵字": "移植藥師門診", "簡化後": "移植門診"},
-    {"原始關鍵字": "中藥局調劑", "簡化後": "中藥局"},
-    {"原始關鍵字": "假日非常班之諮詢與藥動服務", "簡化後": "假日oncall"},
-    ]
-
-
-# ============================================================
-# 1) Google Drive / Google Sheets API 共用設定
-# ============================================================
-SCOPES = [
-    "https://www.googleapis.com/auth/drive.readonly",
-    "https://www.googleapis.com/auth/spreadsheets",
-]
-
-
-def build_credentials():
-    """
-    從 Streamlit secrets 建立 Service Account 憑證。
-    """
-    if "gcp_service_account" not in st.secrets:
-        st.error("❌ 找不到 st.secrets['gcp_service_account']，請先設定 Streamlit Secrets。")
-        st.stop()
-
-    creds = service_account.Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"],
-        scopes=SCOPES
-    )
-    return creds
-
-
-def build_drive_service():
-    """建立 Google Drive API client。"""
-    creds = build_credentials()
-    return build("drive", "v3", credentials=creds)
-
-
-def build_sheets_service():
-    """建立 Google Sheets API client。"""
-    creds = build_credentials()
-    return build("sheets", "v4", credentials=creds)
+import json
+import os
+from datetime import datetime
+from urllib.parse import quote
+
+# ====== 轉換核心（灰底假日判斷、時間規則等，見 schedule_core.py） ======
+from schedule_core import (
+    CODE_SEPARATOR_RE,
+    calendar_columns,
+    convert_schedule,
+    diagnostics_json,
+    get_parsed_workbook,
+    rule_diagnostics,
+    simplify_map_hash,
+    unmatched_labels,
+    workload_summary,
+    ScheduleConvertError,
+    NoMatchingShiftsError,
+)
+
+# ====== Google Drive API（Service Account）工具、背景預載與本機鏡像，見 drive_client.py / prefetch.py / schedule_mirror.py ======
+from drive_client import (
+    DriveConfigError,
+    DriveLinkError,
+    build_sheets_service,
+    download_drive_file_as_bytes,
+    has_service_account,
+    load_feedback_sheet_id,
+    resolve_drive_link,
+    schedule_sort_key,
+)
+from drive_changes import start_change_watcher
+from google_limits import google_call
+from schedule_export import (
+    CALENDAR_TIMEZONE,
+    csv_export,
+    download_reader,
+    ics_export,
+    table_csv_export,
+    write_calendar_csv,
+    write_calendar_ics,
+    zip_export,
+)
+from profiles import delete_profile, load_profile, save_profile
+from rule_sets import get_active_rule_set
+from schedule_cache import workbook_store
+from jobs import CANCELLED, DONE, get_job_queue
+from prefetch import refresh_after_change, start_prefetch_worker
+from schedule_mirror import list_schedule_files, load_schedule_file, mirror_is_stale, start_mirror_sync_worker
 
 
 # ============================================================
-# 2) Google Drive 下載/列檔工具（Service Account）
+# 1) 共用班表載入工具
 # ============================================================
-DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
-
-
-def build_drive_service():
-    """
-    用 Streamlit secrets 內的 service account 建立 Drive API client。
-    你必須先在 Streamlit Cloud 的 Secrets 或 .streamlit/secrets.toml 放入
-    [gcp_service_account] 區塊（type/project_id/private_key/client_email/token_uri...）。
-    """
-    if "gcp_service_account" not in st.secrets:
-        st.error("❌ 找不到 st.secrets['gcp_service_account']，請先設定 Streamlit Secrets。")
-        st.stop()
-
-    creds = service_account.Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"],
-        scopes=DRIVE_SCOPES
-    )
-    return build("drive", "v3", credentials=creds)
-
-
-def extract_drive_file_id(url: str):
-    """
-    從使用者貼上的 Google Drive / Google Sheet 連結中抽出 file_id。
-    支援常見格式：
-    - https://docs.google.com/spreadsheets/d/<ID>/edit...
-    - https://drive.google.com/file/d/<ID>/view...
-    - https://drive.google.com/open?id=<ID>
-    - ...?id=<ID>
-    """
-    if not url:
-        return None
-
-    patterns = [
-        r"/d/([a-zA-Z0-9-_]+)",      # .../d/<id>/...
-        r"[?&]id=([a-zA-Z0-9-_]+)",  # ...?id=<id> 或 &id=<id>
-        r"open\?id=([a-zA-Z0-9-_]+)",
-        r"file/d/([a-zA-Z0-9-_]+)",
-    ]
-    for p in patterns:
-        m = re.search(p, url)
-        if m:
-            return m.group(1)
-    return None
-
-
-def parse_year_month_from_drive_filename(file_name: str):
-    """
-    解析 Drive 檔名格式：11503班表（民國年3碼 + 月2碼）
-    回傳 (year_ad, month, year_month_str) 例如 (2026, 3, "202603")
-    抓不到就回 None
-    """
-    if not file_name:
-        return None
-
-    # 支援：11503班表、11503 班表、11503班表.xlsx（若是xlsx也可能有副檔名）
-    m = re.search(r"(\d{3})(\d{2})\s*班表", file_name)
-    if not m:
-        return None
-
-    roc_year = int(m.group(1))        # 例如 115
-    month = int(m.group(2))           # 例如 03
-    year = roc_year + 1911            # 民國->西元
-    year_month = f"{year}{month:02d}" # 例如 202603
-
-    return year, month, year_month
-
-
 def format_loaded_schedule_name(drive_file_name: str):
     """
     由 Drive 檔名（例如：11503班表）轉成顯示用名稱：115年3月班表
@@ -153,72 +73,6 @@ def format_loaded_schedule_name(drive_file_name: str):
     return f"{roc_year}年{month}月班表"
 
 
-def download_drive_file_as_bytes(file_id: str):
-    """
-    下載 Google Drive 檔案成 BytesIO（記憶體檔案），供 pandas/openpyxl 讀取。
-    同時支援：
-    A) Google 試算表（原生） -> export 成 xlsx
-    B) 真正 .xlsx 檔 -> get_media 直接下載
-
-    回傳：(bio, file_name)
-    """
-    service = build_drive_service()
-    meta = service.files().get(fileId=file_id, fields="name,mimeType").execute()
-
-    file_name = meta.get("name", "")
-    mime = meta.get("mimeType", "")
-
-    bio = io.BytesIO()
-
-    if mime == "application/vnd.google-apps.spreadsheet":
-        request = service.files().export_media(
-            fileId=file_id,
-            mimeType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    else:
-        request = service.files().get_media(fileId=file_id)
-
-    downloader = MediaIoBaseDownload(bio, request)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
-
-    bio.seek(0)
-    return bio, file_name
-
-
-def list_recent_drive_files(months_approx_days: int = 92, page_size: int = 100):
-    """
-    列出近三個月（約 92 天）內有更新的：
-    - Google 試算表
-    - Excel .xlsx
-
-    注意：Service Account 只看得到「自己建立」或「別人共享給它」的檔案。
-    """
-    service = build_drive_service()
-
-    since_dt = datetime.now(timezone.utc) - timedelta(days=months_approx_days)
-    since_str = since_dt.isoformat().replace("+00:00", "Z")
-
-    q = (
-        "("
-        "mimeType='application/vnd.google-apps.spreadsheet' OR "
-        "mimeType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'"
-        ") "
-        f"AND modifiedTime >= '{since_str}' "
-        "AND trashed=false"
-    )
-
-    resp = service.files().list(
-        q=q,
-        fields="files(id,name,mimeType,modifiedTime)",
-        orderBy="modifiedTime desc",
-        pageSize=page_size
-    ).execute()
-
-    return resp.get("files", [])
-
-
 def get_excel_bio(source_choice: str, uploaded_file, selected_drive_file, drive_url_backup: str):
     """
     統一回傳 (BytesIO, drive_file_name)
@@ -236,162 +90,30 @@ def get_excel_bio(source_choice: str, uploaded_file, selected_drive_file, drive_
     if source_choice == "現有共用班表檔案(3個月內)":
         if not selected_drive_file:
             return None, None
-        return download_drive_file_as_bytes(selected_drive_file["id"])
+        # 鏡像裡有同一個版本時直接讀磁碟，不連線
+        return load_schedule_file(selected_drive_file)
 
     # 貼連結備援（source_choice == "試算表連結"）
     if not drive_url_backup:
         return None, None
 
-    file_id = extract_drive_file_id(drive_url_backup)
-    if not file_id:
-        st.error("❌ 無法從連結解析檔案 ID，請確認貼的是 Drive/Sheet 分享連結。")
-        st.stop()
-
     try:
-        return download_drive_file_as_bytes(file_id)
+        meta = resolve_drive_link(drive_url_backup)
+        return download_drive_file_as_bytes(meta["id"], meta=meta)
+    except (DriveConfigError, DriveLinkError) as e:
+        st.error(str(e))
+        st.stop()
     except Exception as e:
         st.error(f"❌ 從 Google Drive 下載失敗：{e}")
         st.stop()
 
 
 # ============================================================
-# 3) 灰底假日判斷：第二列日期底色（灰色=假日）
+# 2) 回饋留言板：Google Sheet 作為後端
 # ============================================================
-def build_holiday_map(excel_bio: io.BytesIO) -> dict[int, bool]:
-    """
-    用 openpyxl 讀取 Excel：
-    - 第二列（row=2）日期列的底色（灰底代表假日）
-    回傳 holiday_map：{ openpyxl_column_index(1-based): is_holiday }
-    """
-    excel_bio.seek(0)
-    wb = load_workbook(excel_bio, data_only=True)
-    ws = wb.active
-
-    # 你目前使用的灰底 RGB（如你的班表底色不同，請改這裡）
-    gray_rgb = "FFD9D9D9"
-
-    holiday_map = {}
-    for col in range(2, ws.max_column + 1):  # B欄開始（A欄是工作內容）
-        cell = ws.cell(row=2, column=col)
-        fg = cell.fill.fgColor
-        is_gray = (fg.type == "rgb" and fg.rgb == gray_rgb)
-        holiday_map[col] = is_gray
+FEEDBACK_CACHE_SECONDS = 60
 
-    return holiday_map
 
-
-# ============================================================
-# 4) 套用時間規則（含你新增的中2藥局發藥括號時間）
-# ============================================================
-def apply_time_rules(df, holiday_map, column_map):
-    """
-    df 欄位應含：日期、星期、工作內容、簡化後內容、Start Time、End Time
-    holiday_map：欄位底色假日判定
-    column_map： (日期, 星期) -> Excel 欄位 index（B=2 起）
-    """
-    prescription_time_map = {
-        "上午": ("08:00", "12:00"),
-        "下午": ("13:30", "17:30"),
-        "小夜1hr": ("17:30", "18:30"),
-        "小夜": ("17:30", "21:30")
-    }
-
-    extra_rows = []
-
-    for idx, row in df.iterrows():
-        content = row["工作內容"]
-        weekday = str(row["星期"]).strip()
-
-        key = (row["日期"], weekday)
-        col_idx = column_map.get(key, None)
-        is_holiday = holiday_map.get(col_idx, False)
-
-        # 1) 調劑複核（平日 vs 假日）
-        if "調劑複核" in content:
-            if is_holiday:
-                df.at[idx, "Start Time"] = "11:00"
-                df.at[idx, "End Time"] = "15:00"
-            else:
-                df.at[idx, "Start Time"] = "13:30"
-                df.at[idx, "End Time"] = "15:00"
-
-        # 2) 門診藥局調劑（括號時間）
-        elif "門診藥局調劑" in content:
-            match = re.search(r"\((\d{1,2}:\d{2})-(\d{1,2}:\d{2})\)", content)
-            if match:
-                df.at[idx, "Start Time"] = match.group(1)
-                df.at[idx, "End Time"] = match.group(2)
-
-        # 2.5) 中2藥局發藥（括號時間）
-        elif "中2藥局" in content:
-            match = re.search(r"\((\d{1,2}:\d{2})-(\d{1,2}:\d{2})\)", content)
-            if match:
-                df.at[idx, "Start Time"] = match.group(1)
-                df.at[idx, "End Time"] = match.group(2)
-
-        # 3) 處方判讀 / 化療處方判讀 / 藥物諮詢 / PreESRD（依上午/下午/小夜）
-        elif any(k in content for k in ["處方判讀", "化療處方判讀", "藥物諮詢", "PreESRD"]):
-            for key_word, (start, end) in prescription_time_map.items():
-                if key_word in content:
-                    df.at[idx, "Start Time"] = start
-                    df.at[idx, "End Time"] = end
-                    break
-
-        # 4) 抗凝藥師門診：週二上午 / 週三下午
-        elif "抗凝藥師門診" in content:
-            if weekday == "二":
-                df.at[idx, "Start Time"] = "08:30"
-                df.at[idx, "End Time"] = "12:00"
-            elif weekday == "三":
-                df.at[idx, "Start Time"] = "13:30"
-                df.at[idx, "End Time"] = "17:00"
-
-        # 5) 移植藥師門診：目前只有上午（未來可在此新增下午規則）
-        elif "移植藥師門診" in content and "上午" in content:
-            df.at[idx, "Start Time"] = "08:30"
-            df.at[idx, "End Time"] = "12:00"
-
-        # 6) 中藥局調劑：目前固定 08:30-12:00（若要限制週三可再加條件）
-        elif "中藥局調劑" in content:
-            df.at[idx, "Start Time"] = "08:30"
-            df.at[idx, "End Time"] = "12:00"
-
-        # 7) 瑞德西偉審核：08:00-20:00
-        elif "瑞德西偉審核" in content:
-            df.at[idx, "Start Time"] = "08:00"
-            df.at[idx, "End Time"] = "20:00"
-
-        # 8) 平日：若工作為「處方判讀 7-住院」，額外新增「非常班之諮詢與藥動服務」17:30-21:30
-        #if "處方判讀 7-住院" in content and not is_holiday:
-        #    extra_rows.append({
-        #        "日期": row["日期"],
-        #        "星期": row["星期"],
-        #        "工作內容": "非常班之諮詢與藥動服務",
-        #        "簡化後內容": "小夜oncall",  # 後面仍會做簡化 replace
-        #        "Start Time": "17:30",
-        #        "End Time": "21:30"
-        #    })
-
-        # 9) 假日：「非常班之諮詢與藥動服務」三班
-        if "假日非常班之諮詢與藥動服務" in content and is_holiday:
-            if "上午" in content:
-                df.at[idx, "Start Time"] = "08:00"
-                df.at[idx, "End Time"] = "12:30"
-            elif "下午" in content:
-                df.at[idx, "Start Time"] = "12:30"
-                df.at[idx, "End Time"] = "17:00"
-            elif "晚上" in content:
-                df.at[idx, "Start Time"] = "17:00"
-                df.at[idx, "End Time"] = "21:00"
-
-    if extra_rows:
-        df = pd.concat([df, pd.DataFrame(extra_rows)], ignore_index=True)
-
-    return df
-
-# ============================================================
-# 5) 回饋留言板：Google Sheet 作為後端
-# ============================================================
 def append_feedback_to_sheet(spreadsheet_id: str, values: list):
     """
     新增一列留言到回饋試算表。
@@ -405,26 +127,31 @@ def append_feedback_to_sheet(spreadsheet_id: str, values: list):
     """
     service = build_sheets_service()
     body = {"values": [values]}
-    service.spreadsheets().values().append(
+    # 新增一列不是冪等的：只在被限流（確定沒寫入）時重試
+    google_call("spreadsheets.values.append", service.spreadsheets().values().append(
         spreadsheetId=spreadsheet_id,
         range="A1",
         valueInputOption="RAW",
         insertDataOption="INSERT_ROWS",
         body=body
-    ).execute()
+    ).execute, idempotent=False)
+    # 下一次 rerun 讀到剛送出的留言
+    read_feedback_from_sheet.clear()
 
 
+@st.cache_data(ttl=FEEDBACK_CACHE_SECONDS, show_spinner=False)
 def read_feedback_from_sheet(spreadsheet_id: str):
     """
     讀取回饋試算表內容並轉成 DataFrame。
     預設第一列為標題列：
     time, name, message, source, file_name, code
+    每個 session 每次 rerun 都會畫留言板，讀取結果保留 FEEDBACK_CACHE_SECONDS 秒；送出留言或按重新整理時清掉。
     """
     service = build_sheets_service()
-    resp = service.spreadsheets().values().get(
+    resp = google_call("spreadsheets.values.get", service.spreadsheets().values().get(
         spreadsheetId=spreadsheet_id,
         range="A:F"
-    ).execute()
+    ).execute, key=spreadsheet_id)
 
     values = resp.get("values", [])
 
@@ -451,104 +178,140 @@ def read_feedback_from_sheet(spreadsheet_id: str):
 
 
 # ============================================================
-# 6) 轉換核心邏輯：主程式 tab 共用
+# 3) 轉換核心邏輯：主程式 tab 共用
 # ============================================================
 def run_convert(code: str, source: str, excel_bytes: bytes, drive_file_name: str, simplify_map: dict):
     """
     將已載入的班表 bytes + 班表代號 + 縮寫表
-    轉為 Google Calendar 可匯入的 CSV DataFrame。
+    轉為該代號的班，回傳 (df_output, year_month)；時間規則使用目前生效的規則版本。
+    實際流程在 schedule_core.convert_schedule，這裡只負責把錯誤顯示在頁面上。
+    """
+    try:
+        return convert_schedule(
+            code, source, excel_bytes, drive_file_name, simplify_map,
+            time_rules=get_active_rule_set().time_rules,
+        )
+    except NoMatchingShiftsError as e:
+        st.warning(str(e))
+    except ScheduleConvertError as e:
+        st.error(str(e))
+    return None, None
+
+
+def split_codes(text: str) -> list:
+    """把「A、B, C D」拆成 ["A", "B", "C", "D"]（去除重複、保留順序）。"""
+    return list(dict.fromkeys(c for c in CODE_SEPARATOR_RE.split(text or "") if c))
+
+
+def bulk_export_job(progress, codes: list, fmt: str, source: str, excel_bytes: bytes, drive_file_name: str, simplify_map: dict, time_rules):
     """
-    excel_bio = io.BytesIO(excel_bytes)
+    背景工作：多個代號逐一轉換並打包成 ZIP（逐一寫入，不會同時保留所有代號的內容）。
+    time_rules 為送出工作時的規則版本（整份 ZIP 用同一個版本）。
+    回傳 {"export": ExportFile, "found", "missing"}；所有代號都找不到班時拋出 NoMatchingShiftsError。
+    """
+    found, missing = [], []
+
+    def entries():
+        for i, code in enumerate(codes):
+            progress.check_cancelled()
+            progress.update(i, len(codes), f"轉換 {code}（{i + 1}/{len(codes)}）")
+            try:
+                df_output, year_month = convert_schedule(
+                    code, source, excel_bytes, drive_file_name, simplify_map, time_rules=time_rules,
+                )
+            except NoMatchingShiftsError:
+                missing.append(code)
+                continue
+            found.append(code)
+            stem = f"{year_month}個人班表({code})"
+            if fmt == "ics":
+                yield f"{stem}.ics", lambda member, df=df_output, name=stem: write_calendar_ics(member, df, name)
+            else:
+                yield f"{stem}.csv", lambda member, df=df_output: write_calendar_csv(member, df)
 
-    excel_bio.seek(0)
-    df = pd.read_excel(excel_bio, header=None)
+    export = zip_export(entries())
+    if not found:
+        export.close()
+        raise NoMatchingShiftsError("輸入的代號都找不到班表內容。請確認代號是否正確。")
+    return {"export": export, "found": found, "missing": missing}
 
-    holiday_map = build_holiday_map(io.BytesIO(excel_bytes))
 
-    if source in ["現有共用班表檔案(3個月內)", "試算表連結"]:
-        parsed = parse_year_month_from_drive_filename(drive_file_name)
-        if parsed:
-            year, month, year_month = parsed
-        else:
-            st.error(f"❌ 無法從 Drive 檔名解析年月：{drive_file_name}\n請確認檔名格式為 11503班表")
-            return None, None, None
-    else:
-        title = str(df.iat[0, 0])
-        m = re.search(r"(\d{2,3})年(\d{1,2})月", title)
-        if not m:
-            st.error("❌ 無法從首列標題解析年月，請確認格式如『113年4月班表』")
-            return None, None, None
-        year = int(m.group(1)) + 1911
-        month = int(m.group(2))
-        year_month = f"{year}{month:02d}"
-
-    dates = df.iloc[1, 1:].tolist()
-    weekdays = df.iloc[2, 1:].tolist()
-
-    date_mapping = [
-        {"日期": f"{year}-{month:02d}-{int(d):02d}", "星期": weekdays[i]}
-        for i, d in enumerate(dates)
-        if str(d).strip().isdigit()
-    ]
-
-    col_index_map = {
-        (entry["日期"], entry["星期"]): i + 2
-        for i, entry in enumerate(date_mapping)
-    }
-
-    results = []
-    for row_idx in range(3, df.shape[0]):
-        raw = df.iat[row_idx, 0]
-        if pd.isna(raw):
-            continue
-
-        content = str(raw).strip()
-        if not content:
-            continue
-        if content.lower() == "nan":
-            continue
-        if "附　註" in content:
-            continue
-
-        for col_idx in range(1, len(date_mapping) + 1):
-            cell = df.iat[row_idx, col_idx]
-            cell_str = "" if pd.isna(cell) else str(cell)
-
-            if code in cell_str:
-                simplified = re.sub(r"\((\d{1,2}:\d{2})-(\d{1,2}:\d{2})\)", "", content)
-
-                for k, v in simplify_map.items():
-                    if pd.notna(k) and pd.notna(v):
-                        simplified = simplified.replace(str(k), str(v))
-
-                results.append({
-                    "日期": date_mapping[col_idx - 1]["日期"],
-                    "星期": date_mapping[col_idx - 1]["星期"],
-                    "工作內容": content,
-                    "簡化後內容": simplified,
-                })
-
-    df_result = pd.DataFrame(results)
-    if df_result.empty:
-        st.warning("找不到符合此代號的班表內容。請確認代號是否正確，或該月未排班。")
-        return None, None, None
-
-    df_result["Start Time"] = ""
-    df_result["End Time"] = ""
-    df_result = apply_time_rules(df_result, holiday_map, col_index_map)
-
-    df_output = df_result.rename(columns={"簡化後內容": "Subject", "日期": "Start Date"})
-    df_output["End Date"] = df_output["Start Date"]
-    df_output = df_output[["Subject", "Start Date", "Start Time", "End Date", "End Time"]]
-
-    csv_text = df_output.to_csv(index=False, encoding="utf-8-sig")
-    return df_output, csv_text, year_month
+def summary_job(progress, source: str, excel_bytes: bytes, drive_file_name: str, time_rules):
+    """背景工作：全員統計，回傳 (df_summary, year_month)。"""
+    progress.update(0, 1, "計算全員統計")
+    return workload_summary(source, excel_bytes, drive_file_name, time_rules=time_rules)
+
+
+def diagnostics_job(progress, source: str, excel_bytes: bytes, drive_file_name: str, time_rules):
+    """背景工作：時間規則診斷，回傳 (df_rule_stats, df_untimed, year_month, time_rules)。"""
+    progress.update(0, 1, "檢查時間規則")
+    return (*rule_diagnostics(source, excel_bytes, drive_file_name, time_rules=time_rules), time_rules)
 
 
 # ============================================================
-# 7) 更新日誌：純文字但較美觀
+# 4) 更新日誌：純文字但較美觀
 # ============================================================
 CHANGELOG_ITEMS = [
+    {
+        "date": "2026-10-19",
+        "version": "v3.13",
+        "title": "共用班表本機備份",
+        "content": "伺服器定期把近三個月的共用班表備份在本機，「現有共用班表檔案」的清單與載入直接讀備份，Google Drive 很慢或連不上時也能照常使用。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.12",
+        "title": "時間規則診斷",
+        "content": "「時間規則診斷」列出整份班表（所有代號）每條時間規則的命中數、從未用到的規則，以及會變成全天事件的班與原因，可下載成 JSON。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.11",
+        "title": "工作內容比對不受空白與全形 / 半形影響",
+        "content": "時間規則比對前會忽略多餘空白、全形 / 半形字元與不同的連字號（例如「中正　2樓」「（08:30－12:00）」）；新增「沒有對應時間規則的工作內容」清單，一次列出整份班表會變成全天事件的工作項目。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.10",
+        "title": "依代號儲存縮寫設定",
+        "content": "調整好的縮寫可以儲存為該代號的設定，之後輸入同一個代號時自動載入，不必每個月重新輸入；訂閱日曆也會使用這份縮寫。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.9",
+        "title": "縮寫與時間規則即時更新",
+        "content": "預設縮寫與時間規則改為集中管理的版本，發布新版本後不必重新部署，幾秒內生效；自己修改過縮寫的話會保留你的版本。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.8",
+        "title": "修正跨夜班的結束日期",
+        "content": "結束時間早於開始時間的班（例如 22:00-02:00）在 CSV、ICS 與訂閱日曆中的結束日期改為隔天；時間一律以兩位數表示（例如 08:00）。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.7",
+        "title": "新增訂閱日曆網址",
+        "content": "轉換結果下方提供該代號的日曆訂閱網址，訂閱一次即可，共用班表更新時日曆會自動同步，不必每月重新下載匯入。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.6",
+        "title": "多代號 ZIP、全員統計改在背景執行",
+        "content": "多個代號一次下載與全員統計改在背景計算並顯示進度，操作其他欄位不會中斷或重算；算好的結果會保留一段時間。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.5",
+        "title": "新增全員統計",
+        "content": "載入班表後可查看每個代號的班數、小夜、假日班與每週時數，點欄位標題即可排序，也可下載成 CSV。"
+    },
+    {
+        "date": "2026-10-19",
+        "version": "v3.4",
+        "title": "新增 ICS 下載與多代號 ZIP",
+        "content": "轉換結果可另外下載 .ics（iPhone / Outlook 行事曆可直接開啟）；也可一次輸入多個代號，打包成 ZIP 下載。"
+    },
     {
         "date": "2026-03-06",
         "version": "v3.3",
@@ -595,30 +358,197 @@ CHANGELOG_ITEMS = [
 
 
 # ============================================================
-# 8) 頁面設定與 Session State 初始化
+# 5) 頁面設定與 Session State 初始化
 # ============================================================
 st.set_page_config(page_title="班表轉換工具", page_icon="📆", layout="centered")
 
-if "loaded_excel_bytes" not in st.session_state:
-    st.session_state.loaded_excel_bytes = None
+# 班表 bytes 與轉換結果都放在行程共用的存放區 / 快取（schedule_cache.py），
+# session 只保存班表的 WorkbookRef（內容 hash）與轉換時用的代號、縮寫表
+if "loaded_workbook" not in st.session_state:
+    st.session_state.loaded_workbook = None
 if "loaded_drive_file_name" not in st.session_state:
     st.session_state.loaded_drive_file_name = None
 if "last_source" not in st.session_state:
     st.session_state.last_source = None
 if "last_code" not in st.session_state:
     st.session_state.last_code = None
-if "df_output" not in st.session_state:
-    st.session_state.df_output = None
-if "csv_text" not in st.session_state:
-    st.session_state.csv_text = None
+if "converted" not in st.session_state:
+    st.session_state.converted = None
+# 背景工作（jobs.py）只保存 job id；結果在行程共用的工作表裡，rerun 不會重算
+if "bulk_job" not in st.session_state:
+    st.session_state.bulk_job = None
+if "summary_job" not in st.session_state:
+    st.session_state.summary_job = None
+if "diagnostics_job" not in st.session_state:
+    st.session_state.diagnostics_job = None
 if "year_month" not in st.session_state:
     st.session_state.year_month = None
+# 縮寫表編輯器的版本：程式換掉縮寫表時加一，讓 data_editor 以新內容重新開始
+if "rules_revision" not in st.session_state:
+    st.session_state.rules_revision = 0
+# 目前縮寫表是哪個代號的縮寫設定（profiles.py）；None 表示預設縮寫
+if "profile_code" not in st.session_state:
+    st.session_state.profile_code = None
+if "last_code_input" not in st.session_state:
+    st.session_state.last_code_input = None
+
+
+def replace_rules_table(rows):
+    st.session_state.edited_rules = pd.DataFrame(list(rows), columns=["原始關鍵字", "簡化後"])
+    st.session_state.rules_revision += 1
+
+
+# 預設縮寫來自目前生效的規則版本（rule_sets.py）；發布新版本時，
+# 沒有自行修改過縮寫的 session 換成新版本，改過的保留自己的縮寫表
+active_rules = get_active_rule_set()
 if "edited_rules" not in st.session_state:
-    st.session_state.edited_rules = pd.DataFrame(default_rules)
+    st.session_state.edited_rules = pd.DataFrame(list(active_rules.abbreviations))
+    st.session_state.rules_base_hash = active_rules.abbreviations_hash
+elif st.session_state.rules_base_hash != active_rules.abbreviations_hash:
+    df_rules_now = st.session_state.edited_rules
+    if simplify_map_hash(dict(zip(df_rules_now["原始關鍵字"], df_rules_now["簡化後"]))) == st.session_state.rules_base_hash:
+        replace_rules_table(active_rules.abbreviations)
+    st.session_state.rules_base_hash = active_rules.abbreviations_hash
+
+
+def loaded_excel_bytes():
+    """目前 session 載入的班表 bytes（共用存放區裡的那一份）；尚未載入回傳 None。"""
+    ref = st.session_state.loaded_workbook
+    return workbook_store.get(ref.key) if ref is not None else None
+
+
+JOB_POLL_SECONDS = 1.0
+
+# 對外的 API 網址（api.py）；有設定時，轉換結果下方提供該代號的訂閱日曆網址
+FEED_BASE_URL = os.environ.get("SCHEDULE_API_PUBLIC_URL", "").rstrip("/")
+
+
+def show_job(job_id: str, render_result):
+    """
+    顯示背景工作的進度；完成後呼叫 render_result(job.result)。
+    工作還在跑時用 fragment 每秒只重跑進度這一塊，結束時整頁重跑一次（停止輪詢）。
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.info("這個工作的結果已過期，請重新執行。")
+    elif job.status == DONE:
+        render_result(job.result)
+    elif job.status == CANCELLED:
+        st.info("已取消。")
+    elif job.finished:
+        st.error(job.error)
+    else:
+        st.fragment(job_progress, run_every=JOB_POLL_SECONDS)(job_id)
+
+
+def job_progress(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.progress(job.progress, text=job.message or "排隊中…")
+    if st.button("✖ 取消", key=f"cancel_{job_id}"):
+        get_job_queue().cancel(job_id)
+
+
+def show_bulk_result(result: dict):
+    if result["missing"]:
+        st.warning(f"以下代號找不到班表內容，沒有放進 ZIP：{'、'.join(result['missing'])}")
+    n = len(result["found"])
+    st.download_button(
+        label=f"📥 下載 {n} 個代號的班表（ZIP）",
+        data=lambda: result["export"].reader(),
+        file_name=f"個人班表({n}個代號).zip",
+        mime="application/zip"
+    )
+
+
+def show_summary_result(result: tuple):
+    df_summary, summary_year_month = result
+    st.caption("時數依轉換時的時間規則計算；點欄位標題可排序。「未定時間班數」為沒有對應時間規則、不計入時數的班。")
+    st.dataframe(df_summary, use_container_width=True, hide_index=True)
+    st.download_button(
+        label=f"📥 下載 {summary_year_month}全員統計.csv",
+        data=lambda: download_reader(table_csv_export, df_summary),
+        file_name=f"{summary_year_month}全員統計.csv",
+        mime="text/csv"
+    )
+
+
+def show_diagnostics_result(result: tuple):
+    df_rule_stats, df_untimed, diag_year_month, time_rules = result
+    report = diagnostics_json(df_rule_stats, df_untimed, diag_year_month, time_rules)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("有時間的班", report["timed_shifts"])
+    col2.metric("全天事件（沒有時間）", report["untimed_shifts"])
+    col3.metric("未使用的規則", len(report["dead_rules"]))
+
+    st.markdown("**各條規則的命中數**（所有代號；依符合班數排序）")
+    st.dataframe(
+        df_rule_stats.sort_values("符合班數", ascending=False, kind="stable"),
+        use_container_width=True, hide_index=True,
+    )
+    if df_untimed.empty:
+        st.success("✅ 所有班都有時間。")
+    else:
+        st.markdown("**沒有時間的班**（會匯出成全天事件）")
+        st.dataframe(df_untimed, use_container_width=True, hide_index=True)
+    st.download_button(
+        label=f"📥 下載 {diag_year_month}時間規則診斷.json",
+        data=lambda: json.dumps(report, ensure_ascii=False, indent=2),
+        file_name=f"{diag_year_month}時間規則診斷.json",
+        mime="application/json"
+    )
+
+
+def converted_output():
+    """
+    目前 session 最後一次轉換的結果（df_output）。
+    不存在 session 裡，每次 rerun 依同樣的輸入向結果快取取回（沒命中就重新轉換）。
+    """
+    converted = st.session_state.converted
+    excel_bytes = loaded_excel_bytes()
+    if not converted or excel_bytes is None:
+        return None
+    try:
+        df_output, _ = convert_schedule(
+            converted["code"],
+            st.session_state.last_source,
+            excel_bytes,
+            st.session_state.loaded_drive_file_name,
+            converted["simplify_map"],
+            time_rules=get_active_rule_set().time_rules,
+        )
+    except ScheduleConvertError:
+        return None
+    return df_output
+
+
+@st.cache_resource
+def ensure_background_workers():
+    """
+    整個伺服器行程只啟動一次：背景預載最新班表、同步本機鏡像、Drive 變更追蹤，
+    以及有設定 SCHEDULE_API_PORT 時的 HTTP API（api.py，與頁面共用快取）。
+    有班表變更時立刻重新預載、同步鏡像；沒有設定 Service Account 就不啟動（已同步的鏡像照常可以用）。
+    """
+    if not has_service_account():
+        return None
+    prefetch_worker = start_prefetch_worker()
+    mirror_worker = start_mirror_sync_worker()
+    change_watcher = start_change_watcher("page", on_change=refresh_after_change)
+    api_server = None
+    if os.environ.get("SCHEDULE_API_PORT"):
+        # Starlette / uvicorn 只有要開 API 時才載入
+        from api import start_api_server
+
+        api_server = start_api_server()
+    return prefetch_worker, mirror_worker, change_watcher, api_server
+
+
+ensure_background_workers()
 
 
 # ============================================================
-# 9) 頁面主體：三個頁籤
+# 6) 頁面主體：三個頁籤
 # ============================================================
 st.title("📆 班表轉換工具")
 
@@ -654,10 +584,12 @@ with tab_main:
         uploaded_file = st.file_uploader("請上傳 Excel 班表（.xlsx）")
 
     elif source == "現有共用班表檔案(3個月內)":
+        mirror_synced_at = None
         try:
-            files = list_recent_drive_files(months_approx_days=92, page_size=100)
+            # 本機鏡像有同步過就直接用（不連線），否則向 Drive 列檔
+            files, mirror_synced_at = list_schedule_files(months_approx_days=92, page_size=100)
         # 排除留言回饋試算表
-            feedback_sheet_id = st.secrets.get("FEEDBACK_SHEET_ID", "").strip()
+            feedback_sheet_id = load_feedback_sheet_id()
             if feedback_sheet_id:
                 files = [f for f in files if f["id"] != feedback_sheet_id]
 
@@ -676,13 +608,7 @@ with tab_main:
             options = {pretty_label(f): f for f in files}
             labels = list(options.keys())
 
-            def ym_key_from_label(label: str):
-                m = re.search(r"(\d{3})(\d{2})\s*班表", label)
-                if not m:
-                    return -1
-                return int(m.group(1)) * 100 + int(m.group(2))
-
-            best_label = max(labels, key=ym_key_from_label)
+            best_label = max(labels, key=schedule_sort_key)
             default_index = labels.index(best_label)
 
             chosen = st.selectbox(
@@ -691,13 +617,20 @@ with tab_main:
                 index=default_index
             )
             selected_drive_file = options[chosen]
+            if mirror_synced_at:
+                synced = pd.Timestamp(mirror_synced_at).tz_convert(CALENDAR_TIMEZONE).strftime("%m/%d %H:%M")
+                if mirror_is_stale(mirror_synced_at):
+                    st.warning(f"⚠️ 目前無法連線 Google Drive，清單與班表來自伺服器的本機備份，"
+                               f"最後同步在 {synced}，可能不是最新的班表。")
+                else:
+                    st.caption(f"清單與班表來自伺服器的本機備份（最後與 Google Drive 同步：{synced}）")
 
     else:
         drive_url_backup = st.text_input("請貼上 Google Drive / Google 試算表連結（備援）")
 
     load_clicked = st.button("📥 載入班表", type="primary")
 
-    if not st.session_state.loaded_excel_bytes:
+    if st.session_state.loaded_workbook is None:
         status_box.warning("請先選擇班表來源，並按「📥 載入班表」。")
 
     if load_clicked:
@@ -715,13 +648,14 @@ with tab_main:
 
         excel_bio, drive_file_name = get_excel_bio(source, uploaded_file, selected_drive_file, drive_url_backup)
 
-        st.session_state.loaded_excel_bytes = excel_bio.getvalue()
+        # 換成新的 WorkbookRef 後，舊的參照被回收時會自動歸還引用計數
+        st.session_state.loaded_workbook = workbook_store.acquire(excel_bio.getvalue())
         st.session_state.loaded_drive_file_name = drive_file_name
         st.session_state.last_source = source
 
-        st.session_state.df_output = None
-        st.session_state.csv_text = None
+        st.session_state.converted = None
         st.session_state.year_month = None
+        st.session_state.bulk_job = None
 
         pretty_name = format_loaded_schedule_name(st.session_state.loaded_drive_file_name)
         if pretty_name:
@@ -732,11 +666,25 @@ with tab_main:
     st.subheader("② 再輸入班表代號")
     code = st.text_input("班表代號：", value=(st.session_state.last_code or ""))
 
+    # 換了代號時：有儲存縮寫設定就直接換上（第一次轉換就用自己的縮寫）；
+    # 原本是別的代號的縮寫設定、新代號沒有的話改回預設縮寫
+    if code.strip() and code.strip() != st.session_state.last_code_input:
+        st.session_state.last_code_input = code.strip()
+        profile = load_profile(code.strip())
+        if profile is not None:
+            replace_rules_table(profile)
+            st.session_state.profile_code = code.strip()
+        elif st.session_state.profile_code is not None:
+            replace_rules_table(active_rules.abbreviations)
+            st.session_state.profile_code = None
+    if st.session_state.profile_code and st.session_state.profile_code == code.strip():
+        st.caption(f"💾 已載入 {st.session_state.profile_code} 儲存的縮寫設定（可在轉換結果下方調整）")
+
     st.subheader("③ 轉換並預覽")
     convert_clicked = st.button("🚀 轉換 / 預覽")
 
     if convert_clicked:
-        if not st.session_state.loaded_excel_bytes:
+        if loaded_excel_bytes() is None:
             st.error("❌ 請先在步驟①按「載入班表」")
         elif not code.strip():
             st.error("❌ 請先輸入班表代號")
@@ -746,23 +694,23 @@ with tab_main:
             df_rules_now = st.session_state.edited_rules
             simplify_map_now = dict(zip(df_rules_now["原始關鍵字"], df_rules_now["簡化後"]))
 
-            df_output, csv_text, year_month = run_convert(
+            df_output, year_month = run_convert(
                 code=code.strip(),
                 source=st.session_state.last_source,
-                excel_bytes=st.session_state.loaded_excel_bytes,
+                excel_bytes=loaded_excel_bytes(),
                 drive_file_name=st.session_state.loaded_drive_file_name,
                 simplify_map=simplify_map_now
             )
 
             if df_output is not None:
-                st.session_state.df_output = df_output
-                st.session_state.csv_text = csv_text
+                st.session_state.converted = {"code": code.strip(), "simplify_map": simplify_map_now}
                 st.session_state.year_month = year_month
                 status_box.info("✅ 已完成轉換：請先確認下方預覽，若需要可調整縮寫後重新轉換。")
 
-    if st.session_state.df_output is not None:
+    df_output = converted_output()
+    if df_output is not None:
         st.subheader("📋 內容預覽")
-        st.dataframe(st.session_state.df_output, use_container_width=True)
+        st.dataframe(calendar_columns(df_output), use_container_width=True)
 
         st.markdown(
             "<p style='color:red; font-size:18px; font-weight:bold;'>⚠ CSV 檔案直接開啟內容可能為亂碼，但不影響匯入，請先確認上方資料無誤後再下載。</p>",
@@ -779,17 +727,150 @@ with tab_main:
                 st.session_state.edited_rules,
                 use_container_width=True,
                 num_rows="dynamic",
-                key="rules_editor"
+                key=f"rules_editor_{st.session_state.rules_revision}"
             )
             st.session_state.edited_rules = edited
             st.info("✏️ 修改縮寫後，請重新按上方「🚀 轉換 / 預覽」更新結果。")
 
+            # 縮寫設定依代號儲存，下次輸入同一個代號時自動載入
+            profile_owner = st.session_state.last_code
+            col_save, col_reset = st.columns(2)
+            with col_save:
+                if st.button(f"💾 儲存為 {profile_owner} 的縮寫設定"):
+                    try:
+                        save_profile(profile_owner, edited)
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        st.session_state.profile_code = profile_owner
+                        st.success(f"已儲存，下次輸入 {profile_owner} 會自動載入這份縮寫。")
+            with col_reset:
+                if load_profile(profile_owner) is not None and st.button("↩ 刪除縮寫設定、改回預設"):
+                    try:
+                        delete_profile(profile_owner)
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        replace_rules_table(active_rules.abbreviations)
+                        st.session_state.profile_code = None
+                        st.rerun()
+            if active_rules.version:
+                st.caption(f"預設縮寫與時間規則：版本 {active_rules.version}（{active_rules.published_at}）{active_rules.note}")
+
+        # 下載內容在按下按鈕時才產生（寫入暫存檔，Streamlit 讀到結尾時 reader 隨即關閉刪除），不在 session 裡另存一份 CSV 字串
+        file_stem = f"{st.session_state.year_month}個人班表({st.session_state.last_code})"
         st.download_button(
-            label=f"📥 下載 {st.session_state.year_month}個人班表({st.session_state.last_code}).csv",
-            data=st.session_state.csv_text,
-            file_name=f"{st.session_state.year_month}個人班表({st.session_state.last_code}).csv",
+            label=f"📥 下載 {file_stem}.csv",
+            data=lambda: download_reader(csv_export, df_output),
+            file_name=f"{file_stem}.csv",
             mime="text/csv"
         )
+        st.download_button(
+            label=f"📅 下載 {file_stem}.ics（iPhone / Outlook 行事曆）",
+            data=lambda: download_reader(ics_export, df_output, file_stem),
+            file_name=f"{file_stem}.ics",
+            mime="text/calendar"
+        )
+        if FEED_BASE_URL:
+            st.markdown("🔔 **訂閱日曆**（Google 日曆「從網址新增」、iPhone「加入訂閱行事曆」）：")
+            st.code(f"{FEED_BASE_URL}/feeds/{quote(st.session_state.last_code, safe='')}.ics", language=None)
+            st.caption("訂閱後不必每個月下載匯入；共用班表（Drive）更新時，日曆會在下次同步時自動更新。")
+
+    if loaded_excel_bytes() is not None:
+        with st.expander("📦 多個代號一次下載（ZIP）", expanded=False):
+            bulk_text = st.text_input("班表代號（以逗號、頓號或空白分隔）：", key="bulk_codes_text")
+            bulk_fmt = st.radio("檔案格式", ["csv", "ics"], horizontal=True, key="bulk_fmt")
+
+            if st.button("📦 轉換多個代號"):
+                bulk_codes = split_codes(bulk_text)
+                if not bulk_codes:
+                    st.error("❌ 請先輸入班表代號")
+                else:
+                    df_rules_now = st.session_state.edited_rules
+                    simplify_map_now = dict(zip(df_rules_now["原始關鍵字"], df_rules_now["簡化後"]))
+                    bulk_args = (
+                        st.session_state.last_source,
+                        loaded_excel_bytes(),
+                        st.session_state.loaded_drive_file_name,
+                        simplify_map_now,
+                        active_rules.time_rules,
+                    )
+                    # 相同內容的工作（例如重按一次）不會重複執行
+                    st.session_state.bulk_job = get_job_queue().submit(
+                        "bulk_export", bulk_export_job, bulk_codes, bulk_fmt, *bulk_args,
+                        label=f"{len(bulk_codes)} 個代號的 ZIP",
+                        key=(
+                            "bulk_export",
+                            st.session_state.loaded_workbook.key,
+                            st.session_state.last_source,
+                            st.session_state.loaded_drive_file_name,
+                            tuple(bulk_codes),
+                            bulk_fmt,
+                            simplify_map_hash(simplify_map_now),
+                            active_rules.time_rules.hash,
+                        ),
+                    )
+
+            if st.session_state.bulk_job:
+                show_job(st.session_state.bulk_job, show_bulk_result)
+
+        with st.expander("📊 全員統計（每個代號的班數與時數）", expanded=False):
+            if st.checkbox("顯示全員統計", key="show_summary"):
+                summary_key = (
+                    "summary",
+                    st.session_state.loaded_workbook.key,
+                    st.session_state.last_source,
+                    st.session_state.loaded_drive_file_name,
+                    active_rules.time_rules.hash,
+                )
+                # 換了班表（或時間規則發布新版本）才重新送出；失敗的工作不會在每次 rerun 自動重試
+                if not st.session_state.summary_job or st.session_state.summary_job[0] != summary_key:
+                    job_id = get_job_queue().submit(
+                        "summary", summary_job,
+                        st.session_state.last_source,
+                        loaded_excel_bytes(),
+                        st.session_state.loaded_drive_file_name,
+                        active_rules.time_rules,
+                        label="全員統計",
+                        key=summary_key,
+                    )
+                    st.session_state.summary_job = (summary_key, job_id)
+                show_job(st.session_state.summary_job[1], show_summary_result)
+
+        with st.expander("🔎 時間規則診斷（沒有對應規則的工作內容、各規則命中數）", expanded=False):
+            # 只比對不重複的工作內容（結果依工作內容記住），不必轉換任何代號
+            try:
+                df_unmatched = unmatched_labels(get_parsed_workbook(loaded_excel_bytes()), active_rules.time_rules)
+            except ScheduleConvertError as e:
+                st.error(str(e))
+            else:
+                if df_unmatched.empty:
+                    st.success("✅ 這份班表所有有排班的工作內容都有對應的時間規則。")
+                else:
+                    st.caption("這些工作內容的班會匯出成全天事件（比對時已忽略空白、全形 / 半形與連字號的差異）。"
+                               "若是新的工作項目，請通知管理者新增時間規則。")
+                    st.dataframe(df_unmatched, use_container_width=True, hide_index=True)
+
+            if st.checkbox("顯示各規則命中數與沒有時間的班", key="show_diagnostics"):
+                diagnostics_key = (
+                    "diagnostics",
+                    st.session_state.loaded_workbook.key,
+                    st.session_state.last_source,
+                    st.session_state.loaded_drive_file_name,
+                    active_rules.time_rules.hash,
+                )
+                if not st.session_state.diagnostics_job or st.session_state.diagnostics_job[0] != diagnostics_key:
+                    job_id = get_job_queue().submit(
+                        "diagnostics", diagnostics_job,
+                        st.session_state.last_source,
+                        loaded_excel_bytes(),
+                        st.session_state.loaded_drive_file_name,
+                        active_rules.time_rules,
+                        label="時間規則診斷",
+                        key=diagnostics_key,
+                    )
+                    st.session_state.diagnostics_job = (diagnostics_key, job_id)
+                show_job(st.session_state.diagnostics_job[1], show_diagnostics_result)
 
 
 # ============================================================
@@ -799,7 +880,7 @@ with tab_feedback:
     st.subheader("💬 留言回饋")
     st.caption("這裡可留下問題回報、使用心得或功能建議。")
 
-    feedback_sheet_id = st.secrets.get("FEEDBACK_SHEET_ID", "").strip()
+    feedback_sheet_id = load_feedback_sheet_id()
 
     if not feedback_sheet_id:
         st.warning("尚未設定 FEEDBACK_SHEET_ID，請先於 Streamlit Secrets 設定回饋試算表 ID。")
@@ -811,6 +892,8 @@ with tab_feedback:
             st.write("")
             st.write("")
             refresh = st.button("🔄 重新整理留言")
+        if refresh:
+            read_feedback_from_sheet.clear()
 
         try:
             df_fb = read_feedback_from_sheet(feedback_sheet_id)
@@ -0,0 +1,264 @@
+"""
+Google Drive / Sheets API 呼叫節流（行程內所有 session、背景預載、HTTP API 共用）。
+
+尖峰時多個 session 同時列檔、查 metadata、下載班表，各自呼叫會一起撞上配額（429）。
+drive_client.py、drive_changes.py 與頁面留言板（回饋試算表的 values.get / values.append）的每個 API 呼叫都經過這裡：
+
+    google_call(endpoint, fn, key=None, idempotent=True)
+        - 每個 API（drive / sheets）共用一個 token bucket，超過速率時排隊而不是直接送出
+        - 每種端點（files.list、files.get、spreadsheets.get ...）各有同時呼叫上限
+        - 有給 key 時，同一個 key 正在呼叫中就不再送出，等那一次的結果（或例外）一起用
+        - 遇到 429 / 403 rateLimitExceeded 時整個 API 暫停 Retry-After（沒有就用指數退避）後重試；
+          5xx 也會重試（idempotent=False 的寫入只在限流時重試，避免重複寫入），最多 GOOGLE_API_MAX_RETRIES 次
+    coalesce(key, fn)           只做合併（例如整個下載流程，裡面的每個呼叫再各自經過 google_call）
+    google_api_metrics()        各端點的呼叫數、合併數、排隊秒數、重試與被限流次數
+
+設定（環境變數）：
+    GOOGLE_API_RATES        各 API 的 每秒次數/最多累積次數，預設 "drive=10/20,sheets=1/10"；每秒次數 0 表示不限制
+                            （Sheets API 讀取配額為每位使用者每分鐘 60 次）
+    GOOGLE_API_CONCURRENCY  各端點同時呼叫上限，預設見 DEFAULT_CONCURRENCY；沒列出的端點用 "*" 的值
+    GOOGLE_API_MAX_RETRIES  限流或 5xx 時最多重試幾次（預設 5）
+
+不 import googleapiclient（判斷 HttpError 只看 resp.status 與內容），冷啟動不必多付載入成本。
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+
+DEFAULT_RATES = "drive=10/20,sheets=1/10"
+DEFAULT_CONCURRENCY = (
+    "*=4,files.list=2,files.get=8,files.get_media=4,files.export=2,"
+    "spreadsheets.get=2,spreadsheets.values.get=2,spreadsheets.values.append=1,"
+    "changes.getStartPageToken=1,changes.list=1"
+)
+
+RETRY_STATUSES = (500, 502, 503, 504)
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 32.0
+
+
+def _parse_pairs(text: str) -> dict:
+    """"a=1,b=2" -> {"a": "1", "b": "2"}；格式不對的項目略過。"""
+    pairs = {}
+    for item in (text or "").split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip() and value.strip():
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+def api_of(endpoint: str) -> str:
+    """端點 -> 所屬的 API（決定用哪一個 token bucket）。"""
+    return "sheets" if endpoint.startswith("spreadsheets.") else "drive"
+
+
+# ============================================================
+# 1) Token bucket
+# ============================================================
+class TokenBucket:
+    """
+    執行緒安全的 token bucket：每秒補 rate 個、最多累積 burst 個；rate <= 0 表示不限制。
+    取 token 時先預訂（可以欠），在鎖外睡到輪到自己，排隊的呼叫依到達順序送出。
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """預訂一個 token，回傳要等待的秒數。"""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self._paused_until - now, 0.0)
+            if self.rate <= 0:
+                return delay
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                delay = max(delay, -self._tokens / self.rate)
+            return delay
+
+    def acquire(self) -> float:
+        """取得一個 token（必要時等待），回傳等待的秒數。"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def pause(self, seconds: float):
+        """被限流時整個 API 暫停 seconds 秒，已累積的 token 作廢（恢復後依速率慢慢送出）。"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+
+# ============================================================
+# 2) 限制器
+# ============================================================
+def _metric_row(limit: int) -> dict:
+    return {
+        "limit": limit, "calls": 0, "coalesced": 0, "retries": 0, "throttled": 0, "errors": 0,
+        "wait_seconds": 0.0, "in_flight": 0, "peak_in_flight": 0,
+    }
+
+
+class GoogleApiLimiter:
+    def __init__(self, rates: dict, concurrency: dict, max_retries: int = 5):
+        """rates：{API: (每秒次數, 最多累積次數)}；concurrency：{端點: 同時呼叫上限}，"*" 為其他端點。"""
+        self.buckets = {api: TokenBucket(rate, burst) for api, (rate, burst) in rates.items()}
+        self.concurrency = dict(concurrency)
+        self.max_retries = max_retries
+        self._semaphores = {}
+        self._flights = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        rates = {}
+        for api, spec in _parse_pairs(os.environ.get("GOOGLE_API_RATES", DEFAULT_RATES)).items():
+            rate, _, burst = spec.partition("/")
+            rates[api] = (float(rate), float(burst or rate or 1))
+        concurrency = {
+            endpoint: max(int(limit), 1)
+            for endpoint, limit in _parse_pairs(DEFAULT_CONCURRENCY + "," + os.environ.get("GOOGLE_API_CONCURRENCY", "")).items()
+        }
+        return cls(rates, concurrency, int(os.environ.get("GOOGLE_API_MAX_RETRIES", "5")))
+
+    def _endpoint(self, endpoint: str) -> tuple:
+        """端點的 (semaphore, 指標)；第一次用到時建立。"""
+        with self._lock:
+            if endpoint not in self._semaphores:
+                limit = self.concurrency.get(endpoint, self.concurrency.get("*", 4))
+                self._semaphores[endpoint] = threading.BoundedSemaphore(limit)
+                self._metrics[endpoint] = _metric_row(limit)
+            return self._semaphores[endpoint], self._metrics[endpoint]
+
+    def _count(self, row: dict, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                row[name] += delta
+            row["peak_in_flight"] = max(row["peak_in_flight"], row["in_flight"])
+
+    def coalesce(self, key, fn, endpoint: str = None):
+        """同一個 key 正在執行中時等待並共用那一次的結果；否則執行 fn()。"""
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+        if not leader:
+            if endpoint is not None:
+                self._count(self._endpoint(endpoint)[1], coalesced=1)
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def call(self, endpoint: str, fn, key=None, idempotent: bool = True):
+        """
+        在速率與同時呼叫上限內執行 fn()（一次 API 呼叫），限流或 5xx 時重試。
+        idempotent=False（例如新增一列）時 5xx 不重試：伺服器可能已經寫入，重送會重複。
+        有給 key 時合併相同的呼叫；寫入每一次都必須真的送出，不能合併，同時給 key 拋出 ValueError。
+        """
+        if key is not None:
+            if not idempotent:
+                raise ValueError(f"{endpoint}：idempotent=False 的呼叫不能合併（不要給 key）")
+            return self.coalesce(
+                (endpoint, key), lambda: self.call(endpoint, fn, idempotent=idempotent), endpoint=endpoint,
+            )
+        semaphore, row = self._endpoint(endpoint)
+        bucket = self.buckets.get(api_of(endpoint))
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            with semaphore:
+                if bucket is not None:
+                    bucket.acquire()
+                self._count(row, calls=1, in_flight=1, wait_seconds=time.monotonic() - start)
+                try:
+                    return fn()
+                except Exception as e:
+                    retry = retry_delay(e, attempt)
+                    if retry is not None and not retry[1] and not idempotent:
+                        retry = None
+                    if retry is None or attempt == self.max_retries:
+                        self._count(row, errors=1, throttled=int(retry is not None and retry[1]))
+                        raise
+                    delay, rate_limited = retry
+                    self._count(row, retries=1, throttled=int(rate_limited))
+                    if rate_limited and bucket is not None:
+                        bucket.pause(delay)
+                finally:
+                    self._count(row, in_flight=-1)
+            # 5xx 只有自己退避；限流時 bucket 已暫停，下一輪 acquire 會等
+            if not rate_limited or bucket is None:
+                time.sleep(delay)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            endpoints = {name: dict(row) for name, row in self._metrics.items()}
+        for row in endpoints.values():
+            row["wait_seconds"] = round(row["wait_seconds"], 3)
+        return {
+            "rates": {api: {"rate": b.rate, "burst": b.burst} for api, b in self.buckets.items()},
+            "endpoints": endpoints,
+        }
+
+    def reset_metrics(self):
+        with self._lock:
+            for row in self._metrics.values():
+                row.update({k: v for k, v in _metric_row(row["limit"]).items() if k not in ("in_flight", "limit")})
+
+
+def retry_delay(error: Exception, attempt: int):
+    """
+    API 錯誤 -> (等待秒數, 是否為限流)；不該重試的錯誤回傳 None。
+    googleapiclient 的 HttpError 有 resp（httplib2.Response，header 為小寫）與 content。
+    """
+    resp = getattr(error, "resp", None)
+    status = getattr(resp, "status", None)
+    if status is None:
+        return None
+    content = getattr(error, "content", b"") or b""
+    rate_limited = status == 429 or (status == 403 and b"ateLimitExceeded" in content)
+    if not rate_limited and status not in RETRY_STATUSES:
+        return None
+    try:
+        delay = float(resp.get("retry-after"))
+    except (TypeError, ValueError):
+        delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt) * (0.5 + random.random() / 2)
+    return delay, rate_limited
+
+
+# ============================================================
+# 3) 行程共用的限制器
+# ============================================================
+limiter = GoogleApiLimiter.from_env()
+
+
+def google_call(endpoint: str, fn, key=None, idempotent: bool = True):
+    return limiter.call(endpoint, fn, key=key, idempotent=idempotent)
+
+
+def coalesce(key, fn):
+    return limiter.coalesce(key, fn)
+
+
+def google_api_metrics() -> dict:
+    return limiter.metrics()
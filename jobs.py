@@ -0,0 +1,207 @@
+"""
+背景工作佇列：耗時的轉換（多代號 ZIP、全員統計）交給工作執行緒，不在 Streamlit 腳本裡執行。
+
+Streamlit 每次操作元件都會從頭重跑腳本；工作直接寫在腳本裡的話，
+跑到一半被 rerun 打斷就白做，或是每次 rerun 都重算一次。這裡改成：
+    - submit 回傳 job id，session 只保存 id；工作表（job table）在行程內共用
+    - 工作以 progress.update 回報進度，頁面輪詢 get(job_id) 顯示
+    - 結果保留到 JOB_TTL_SECONDS 之後，rerun、甚至重新整理頁面都拿得到；
+      結果裡的暫存檔（ExportFile）由工作表持有一個參照，過期移除時歸還；下載按鈕每次按下各拿一個 reader()，
+      讀完就歸還，最後一個歸還時暫存檔關閉刪除。過期後再按舊的按鈕會拿到 ExportClosedError
+    - 給 key 的工作會合併：相同 key 的工作還在排隊、執行中或已完成時，直接回傳原本的 job id
+
+用執行緒而不是行程：工作要用到行程內的解析 / 結果快取（schedule_cache.py），
+真正吃 CPU 的 Excel 解析本身已經會在 schedule_core 的行程池裡平行處理。
+
+不依賴 Streamlit。
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = 2
+
+# 完成的工作（與結果）保留多久、最多保留幾個
+JOB_TTL_SECONDS = 30 * 60
+MAX_FINISHED_JOBS = 64
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    """工作被取消（由工作本身在檢查 progress.cancelled 時拋出）。"""
+
+
+@dataclass(eq=False)
+class Job:
+    """
+    工作表中的一筆：status 為 queued / running / done / failed / cancelled，
+    progress 為 0~1，message 為目前進度的說明；完成後 result 為工作的回傳值，失敗時 error 為錯誤訊息。
+    """
+    id: str
+    kind: str
+    label: str = ""
+    key: object = None
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    result: object = None
+    error: str = ""
+    created_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+
+class JobProgress:
+    """交給工作函式的進度回報介面。"""
+
+    def __init__(self, job: Job):
+        self._job = job
+
+    def update(self, done: int, total: int, message: str = ""):
+        self._job.progress = min(done / total, 1.0) if total else 1.0
+        if message:
+            self._job.message = message
+
+    @property
+    def cancelled(self) -> bool:
+        return self._job._cancel.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+
+class JobQueue:
+    """工作執行緒 + 工作表。所有方法都是執行緒安全的。"""
+
+    def __init__(self, workers: int = JOB_WORKERS, ttl: float = JOB_TTL_SECONDS, max_finished: int = MAX_FINISHED_JOBS):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="schedule-job")
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn, *args, label: str = "", key=None, **kwargs) -> str:
+        """
+        排入 fn(progress, *args, **kwargs)，回傳 job id。
+        key 相同、且還沒失敗或被取消的工作已存在時，不重複排入，直接回傳那個工作的 id。
+        """
+        with self._lock:
+            self._prune()
+            if key is not None:
+                existing = self._jobs.get(self._by_key.get(key))
+                if existing is not None and existing.status not in (FAILED, CANCELLED):
+                    return existing.id
+
+            job = Job(id=uuid.uuid4().hex[:12], kind=kind, label=label, key=key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job.id
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def get(self, job_id: str):
+        """job id -> Job；不存在（或已過期清除）回傳 None。"""
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """要求取消；還在排隊的工作不會執行，執行中的工作在下一次檢查進度時停止。"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        return True
+
+    def wait(self, job_id: str, timeout: float = None) -> Job:
+        """等到工作結束（測試與命令列工具用；頁面請用輪詢）。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and not job.finished:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(0.02)
+        return job
+
+    def jobs(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, job: Job, fn, args, kwargs):
+        if job._cancel.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        try:
+            result = fn(JobProgress(job), *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except ValueError as e:
+            # 本專案可直接顯示給使用者的錯誤（ScheduleConvertError、DriveLinkError）都是 ValueError
+            job.error = str(e)
+            self._finish(job, FAILED)
+        except Exception as e:
+            logger.exception("背景工作 %s（%s）失敗", job.id, job.kind)
+            job.error = f"❌ 背景工作失敗：{e}"
+            self._finish(job, FAILED)
+        else:
+            job.result = result
+            job.progress = 1.0
+            self._finish(job, DONE)
+
+    def _finish(self, job: Job, status: str):
+        job.finished_at = time.time()
+        job.status = status
+
+    def _prune(self):
+        """
+        清掉過期、或超過數量上限的已完成工作（呼叫時須持有 self._lock）。
+        結果裡的暫存檔在這裡歸還工作表持有的參照（見模組說明）。
+        """
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished]
+        expired = [job for job in finished if now - job.finished_at > self.ttl]
+        remaining = [job for job in finished if now - job.finished_at <= self.ttl]
+        expired += remaining[:max(len(remaining) - self.max_finished, 0)]
+        for job in expired:
+            self._jobs.pop(job.id, None)
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+            _release_result(job.result)
+
+
+def _release_result(result):
+    """歸還結果裡 ExportFile（有 release 的物件）的參照；結果可以是單一物件或 dict。"""
+    values = result.values() if isinstance(result, dict) else [result]
+    for value in values:
+        release = getattr(value, "release", None)
+        if callable(release):
+            release()
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """整個伺服器行程共用的工作佇列（第一次需要時才建立）。"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
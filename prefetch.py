@@ -0,0 +1,87 @@
+"""
+伺服器啟動時預載最新班表。
+
+最新一期的「xxxxx班表」可以由檔名年月判斷（drive_client.schedule_sort_key），
+所以在使用者進來之前，先在背景：
+    1) 列出 Drive 檔案（填 listing_cache）
+    2) 下載最新一到兩份班表（填 download_cache）
+    3) 解析（填 parse_cache）
+第一個使用者就不必等 Drive 匯出與 openpyxl 解析。之後每隔一段時間重跑一次，
+主管上傳新班表後也會在下一輪被預載。
+Drive 變更追蹤發現班表變更時呼叫 refresh_after_change：只列檔一次，預載與同步鏡像共用同一份清單。
+"""
+import logging
+import threading
+
+from drive_client import download_drive_file_as_bytes, list_recent_drive_files, schedule_sort_key
+from schedule_core import get_parsed_workbook
+from schedule_mirror import sync_mirror
+
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_COUNT = 2
+PREFETCH_INTERVAL_SECONDS = 10 * 60
+
+
+def latest_schedule_files(files: list, count: int = PREFETCH_COUNT) -> list:
+    """依檔名年月由新到舊排序，取前 count 份班表（不是班表檔名的略過）。"""
+    schedules = [f for f in files if schedule_sort_key(f.get("name")) >= 0]
+    schedules.sort(key=lambda f: schedule_sort_key(f["name"]), reverse=True)
+    return schedules[:count]
+
+
+def prefetch_latest_schedules(count: int = PREFETCH_COUNT, files: list = None) -> list:
+    """
+    列檔、下載並解析最新 count 份班表，回傳已預載的檔名。
+    files 為已經列好的清單（見 refresh_after_change）；沒給時重新列檔（順便更新 listing_cache），
+    下載與解析則會沿用既有快取。
+    """
+    if files is None:
+        files = list_recent_drive_files(use_cache=False)
+    loaded = []
+    for f in latest_schedule_files(files, count):
+        bio, file_name = download_drive_file_as_bytes(f["id"], meta=f)
+        get_parsed_workbook(bio.getvalue())
+        loaded.append(file_name)
+    return loaded
+
+
+def refresh_after_change(_changed=None):
+    """
+    Drive 上的班表有變更（drive_changes.ChangeWatcher 的 on_change，在變更追蹤的執行緒執行）：
+    重新列檔一次，預載最新班表並同步本機鏡像。
+    """
+    files = list_recent_drive_files(use_cache=False)
+    prefetch_latest_schedules(files=files)
+    sync_mirror(files=files)
+
+
+class PrefetchWorker(threading.Thread):
+    """每隔 interval 秒執行一次 prefetch_latest_schedules 的背景執行緒。"""
+
+    def __init__(self, interval: float = PREFETCH_INTERVAL_SECONDS, count: int = PREFETCH_COUNT):
+        super().__init__(name="schedule-prefetch", daemon=True)
+        self.interval = interval
+        self.count = count
+        self.last_loaded = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.last_loaded = prefetch_latest_schedules(self.count)
+                logger.info("預載班表：%s", self.last_loaded)
+            except Exception:
+                # 預載失敗不影響頁面，使用者操作時會照原本流程下載
+                logger.exception("預載班表失敗")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_prefetch_worker(interval: float = PREFETCH_INTERVAL_SECONDS, count: int = PREFETCH_COUNT) -> PrefetchWorker:
+    worker = PrefetchWorker(interval=interval, count=count)
+    worker.start()
+    return worker
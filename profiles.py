@@ -0,0 +1,169 @@
+"""
+各代號的縮寫設定：使用者調整好的縮寫表存在本機 SQLite，下次輸入同一個代號時自動載入。
+
+    load_profile(code)           -> 縮寫設定（[{原始關鍵字, 簡化後}]）；沒有儲存回傳 None
+    save_profile(code, rows)     儲存（空白列會去掉）；回傳實際存入的縮寫設定
+    delete_profile(code)         刪除，回到預設縮寫
+    profile_simplify_map(code)   縮寫設定 -> simplify_map；沒有儲存回傳 None
+    profile_updated_at(code)     最後一次儲存或刪除的時間（ISO 8601，UTC）；從來沒有儲存過回傳 None
+                                 （訂閱日曆的 Last-Modified 用；刪除時留一列 rules 為 null 的紀錄，時間不會倒退）
+
+讀取結果放在 profile_cache（schedule_cache.py），儲存時一併整理好縮寫表（get_simplifier），
+所以 session 的第一次轉換就直接用該代號的縮寫，不必先用預設縮寫轉一次再調整。
+
+資料庫位置：SCHEDULE_PROFILES_PATH，預設為 .cache/profiles.sqlite3。
+不依賴 Streamlit。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from schedule_cache import profile_cache
+from schedule_core import get_simplifier
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILES_PATH = Path(os.environ.get(
+    "SCHEDULE_PROFILES_PATH",
+    Path(__file__).resolve().parent / ".cache" / "profiles.sqlite3",
+))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    code       TEXT PRIMARY KEY,
+    rules      TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+)
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def _connect() -> sqlite3.Connection:
+    """每次操作開一個連線（不同執行緒不共用連線）；第一次連線時建立資料表。"""
+    path = DEFAULT_PROFILES_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    with _schema_lock:
+        if path not in _schema_ready:
+            with conn:
+                conn.execute(SCHEMA)
+            _schema_ready.add(path)
+    return conn
+
+
+def clean_abbreviations(rows) -> list:
+    """
+    縮寫表（data_editor 的 DataFrame 或 list of dict）-> [{原始關鍵字, 簡化後}]。
+    原始關鍵字空白的列去掉；簡化後空白視為刪除該字詞（""）。
+    """
+    if isinstance(rows, pd.DataFrame):
+        rows = rows.to_dict("records")
+    cleaned = []
+    for row in rows:
+        original, simplified = row.get("原始關鍵字"), row.get("簡化後")
+        if pd.isna(original) or not str(original):
+            continue
+        cleaned.append({"原始關鍵字": str(original), "簡化後": "" if pd.isna(simplified) else str(simplified)})
+    return cleaned
+
+
+def _load(code: str) -> tuple:
+    """(縮寫設定或 None, 最後儲存 / 刪除時間或 None)；結果快取在 profile_cache。"""
+    code = code.strip()
+    if not code:
+        return None, None
+    cached = profile_cache.get(code, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute("SELECT rules, updated_at FROM profiles WHERE code = ?", (code,)).fetchone()
+    except (OSError, sqlite3.Error) as e:
+        # 讀不到設定時照常用預設縮寫轉換，不讓頁面中斷
+        logger.warning("無法讀取 %s 的縮寫設定：%s", code, e)
+        return None, None
+    # 刪除過的代號 rules 為 "null"
+    loaded = (json.loads(row[0]), row[1]) if row else (None, None)
+    if loaded[0] is not None:
+        get_simplifier(_simplify_map(loaded[0]))
+    profile_cache.set(code, loaded)
+    return loaded
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def load_profile(code: str):
+    """代號的縮寫設定；沒有儲存（或資料庫無法讀取）回傳 None。"""
+    return _load(code)[0]
+
+
+def profile_updated_at(code: str):
+    """代號的縮寫設定最後一次儲存或刪除的時間；從來沒有儲存過（或資料庫無法讀取）回傳 None。"""
+    return _load(code)[1]
+
+
+def save_profile(code: str, rows) -> list:
+    """儲存代號的縮寫設定（覆寫原本的），回傳實際存入的內容；無法儲存時拋出 ValueError（訊息可直接顯示）。"""
+    code = code.strip()
+    if not code:
+        raise ValueError("❌ 請先輸入班表代號")
+    profile = clean_abbreviations(rows)
+    updated_at = _now()
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO profiles (code, rules, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(code) DO UPDATE SET rules = excluded.rules, updated_at = excluded.updated_at",
+                (code, json.dumps(profile, ensure_ascii=False), updated_at),
+            )
+    except (OSError, sqlite3.Error) as e:
+        raise ValueError(f"❌ 無法儲存縮寫設定：{e}") from e
+    profile_cache.set(code, (profile, updated_at))
+    # 先整理好縮寫表，下一次轉換直接使用
+    get_simplifier(_simplify_map(profile))
+    return profile
+
+
+def delete_profile(code: str) -> bool:
+    """
+    刪除代號的縮寫設定；原本有儲存時回傳 True。無法刪除時拋出 ValueError。
+    留下 rules 為 null 的一列記錄刪除時間（profile_updated_at），讀取時與沒有儲存相同。
+    """
+    code = code.strip()
+    updated_at = _now()
+    try:
+        with closing(_connect()) as conn, conn:
+            deleted = conn.execute(
+                "UPDATE profiles SET rules = 'null', updated_at = ? WHERE code = ? AND rules != 'null'",
+                (updated_at, code),
+            ).rowcount
+    except (OSError, sqlite3.Error) as e:
+        raise ValueError(f"❌ 無法刪除縮寫設定：{e}") from e
+    if deleted:
+        profile_cache.set(code, (None, updated_at))
+    return bool(deleted)
+
+
+def _simplify_map(profile: list) -> dict:
+    return {rule["原始關鍵字"]: rule["簡化後"] for rule in profile}
+
+
+def profile_simplify_map(code: str):
+    """代號的縮寫設定轉成 simplify_map；沒有儲存回傳 None。"""
+    profile = load_profile(code)
+    return None if profile is None else _simplify_map(profile)
+
+
+_MISSING = object()
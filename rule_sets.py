@@ -0,0 +1,350 @@
+"""
+版本化的規則集：縮寫表與時間規則集中存放，發布新版本不必重新部署，執行中的行程自動載入。
+
+每個版本是 RULES_DIR 底下的一個 JSON 檔（0001.json、0002.json…，編號最大的為目前版本）：
+    {"version": 3, "published_at": "...", "note": "...",
+     "縮寫": [{"原始關鍵字": ..., "簡化後": ...}, ...],
+     "時間規則": [...]}                      # 格式見 schedule_core.DEFAULT_TIME_RULES
+目錄裡沒有任何版本時使用程式內建的規則（版本 0）。
+
+每個版本有內容 hash（縮寫表 hash、時間規則 hash），它們是轉換結果、全員統計、訂閱日曆快取 key 的一部分。
+發布新版本後（get_active_rule_set 最多 RULES_RELOAD_SECONDS 秒內會發現）只清掉用到舊版本、
+而且起訖時間真的會因改動的規則而不同的結果（逐一比對結果用到的工作內容組合）；
+解析、版面快取與時間沒變的結果都保留（改用新版本的 key）。
+
+命令列（在 repo 根目錄）：
+    python -m rule_sets list                 列出所有版本
+    python -m rule_sets export [版本]         輸出某個版本（預設目前版本）的 JSON，可修改後再發布
+    python -m rule_sets publish FILE [--note 說明]
+                                             發布新版本；FILE 只有「縮寫」或「時間規則」其中一個時，另一個沿用目前版本
+    python -m rule_sets check 班表.xlsx [--rules FILE]
+                                             列出班表裡沒有任何時間規則符合的工作內容（預設用目前版本，
+                                             --rules 可先檢查還沒發布的規則）
+
+不依賴 Streamlit。
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from schedule_cache import content_hash, feed_cache, result_cache, rule_inputs_cache
+from schedule_core import (
+    DEFAULT_TIME_RULES,
+    TimeRules,
+    compile_time_rules,
+    default_rules,
+    get_parsed_workbook,
+    resolve_times,
+    WORKBOOK_RESULT_KINDS,
+    simplify_map_hash,
+    unmatched_labels,
+)
+
+
+logger = logging.getLogger(__name__)
+
+RULES_DIR = Path(os.environ.get(
+    "SCHEDULE_RULES_DIR",
+    Path(__file__).resolve().parent / "rules",
+))
+
+# 最多每隔幾秒檢查一次規則目錄（只看檔名、修改時間與大小，不讀內容）
+RULES_RELOAD_SECONDS = 5
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """一個版本的規則；version 0 為程式內建的規則。"""
+    version: int
+    abbreviations: tuple
+    time_rules: TimeRules
+    published_at: str = ""
+    note: str = ""
+
+    @property
+    def simplify_map(self) -> dict:
+        return {rule["原始關鍵字"]: rule["簡化後"] for rule in self.abbreviations}
+
+    @property
+    def abbreviations_hash(self) -> str:
+        return simplify_map_hash(self.simplify_map)
+
+    @property
+    def hash(self) -> str:
+        return content_hash(f"{self.abbreviations_hash}|{self.time_rules.hash}".encode("utf-8"))
+
+    def to_json(self) -> dict:
+        return {
+            "version": self.version,
+            "published_at": self.published_at,
+            "note": self.note,
+            "縮寫": list(self.abbreviations),
+            "時間規則": list(self.time_rules.rules),
+        }
+
+
+def _check_abbreviations(abbreviations) -> tuple:
+    if not isinstance(abbreviations, list):
+        raise ValueError("縮寫必須是清單")
+    for i, rule in enumerate(abbreviations):
+        if (
+            not isinstance(rule, dict) or set(rule) != {"原始關鍵字", "簡化後"}
+            or not all(isinstance(v, str) for v in rule.values()) or not rule["原始關鍵字"]
+        ):
+            raise ValueError(f"縮寫第 {i + 1} 筆必須是 {{\"原始關鍵字\": 文字, \"簡化後\": 文字}}")
+    return tuple(abbreviations)
+
+
+def make_rule_set(data: dict, version: int = None) -> RuleSet:
+    """JSON 內容 -> RuleSet；格式不對拋出 ValueError。"""
+    return RuleSet(
+        version=data.get("version", 0) if version is None else version,
+        abbreviations=_check_abbreviations(data.get("縮寫")),
+        time_rules=compile_time_rules(data.get("時間規則")),
+        published_at=data.get("published_at", ""),
+        note=data.get("note", ""),
+    )
+
+
+BUILTIN_RULE_SET = make_rule_set({"縮寫": default_rules, "時間規則": DEFAULT_TIME_RULES, "note": "程式內建"})
+
+
+# ============================================================
+# 1) 讀取版本
+# ============================================================
+def _version_files(rules_dir: Path) -> list:
+    """[(版本, 路徑)]，依版本排序；檔名不是數字的 JSON 略過。"""
+    files = []
+    for path in Path(rules_dir).glob("*.json"):
+        if path.stem.isdigit():
+            files.append((int(path.stem), path))
+    return sorted(files)
+
+
+def load_rule_set(path: Path) -> RuleSet:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return make_rule_set(data, version=int(Path(path).stem))
+
+
+def list_rule_sets(rules_dir: Path = None) -> list:
+    """所有可用的版本（含內建的版本 0），舊的在前；無法讀取的版本略過。"""
+    rule_sets = [BUILTIN_RULE_SET]
+    for version, path in _version_files(rules_dir or RULES_DIR):
+        try:
+            rule_sets.append(load_rule_set(path))
+        except (OSError, ValueError) as e:
+            logger.warning("規則版本 %s 無法讀取，略過：%s", path.name, e)
+    return rule_sets
+
+
+def _latest_rule_set(rules_dir: Path) -> RuleSet:
+    """編號最大、而且可以讀取的版本；格式有誤的新版本不會讓服務中斷，會沿用前一個版本。"""
+    for version, path in reversed(_version_files(rules_dir)):
+        try:
+            return load_rule_set(path)
+        except (OSError, ValueError) as e:
+            logger.error("規則版本 %s 無法讀取，改用前一個版本：%s", path.name, e)
+    return BUILTIN_RULE_SET
+
+
+# ============================================================
+# 2) 目前版本與自動重新載入
+# ============================================================
+_active = None
+_active_signature = None
+_checked_at = 0.0
+_active_lock = threading.Lock()
+
+
+def _dir_signature(rules_dir: Path) -> tuple:
+    signature = []
+    for version, path in _version_files(rules_dir):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        signature.append((path.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def get_active_rule_set(force_check: bool = False) -> RuleSet:
+    """
+    目前生效的規則版本。最多每 RULES_RELOAD_SECONDS 秒看一次規則目錄有沒有變動，
+    有新版本時載入並清掉受影響的快取（invalidate_rule_results）。
+    """
+    global _active, _active_signature, _checked_at
+    now = time.monotonic()
+    with _active_lock:
+        if _active is not None and not force_check and now - _checked_at < RULES_RELOAD_SECONDS:
+            return _active
+        _checked_at = now
+        signature = _dir_signature(RULES_DIR)
+        if _active is not None and signature == _active_signature:
+            return _active
+
+        latest = _latest_rule_set(RULES_DIR)
+        if _active is not None and latest.hash != _active.hash:
+            removed = invalidate_rule_results(_active, latest)
+            logger.info("規則更新為版本 %s（清除 %s 筆轉換結果、保留 %s 筆、清除 %s 份訂閱日曆）",
+                        latest.version, removed["results"], removed["kept"], removed["feeds"])
+        _active, _active_signature = latest, signature
+        return _active
+
+
+def invalidate_rule_results(old: RuleSet, new: RuleSet) -> dict:
+    """
+    清掉依賴已變更規則的快取：
+        - 時間規則改了：用舊時間規則算的轉換結果與全員統計，以它們套用過規則的每個
+          (工作內容, 星期, 假日) 組合（rule_inputs_cache）比對新舊規則算出的起訖時間；
+          都沒變的改用新版本的 key 保留，有任何一個變了（或沒有紀錄）才清掉。
+          規則診斷列出每一條規則的命中數，規則改了一律清掉
+        - 縮寫表改了：用舊預設縮寫表轉換的結果（全員統計、規則診斷與縮寫無關，保留）
+        - 訂閱日曆：時間規則與新版本不同的，以及用舊預設縮寫表產生的（代號自己的縮寫設定不受影響）
+    解析與版面快取都不動。回傳 {"results": 清除數, "kept": 改用新 key 保留的數量, "feeds": 清除數}。
+    """
+    old_time, new_time = old.time_rules.hash, new.time_rules.hash
+    old_abbr, new_abbr = old.abbreviations_hash, new.abbreviations_hash
+    same_times = {}
+
+    def times_unchanged(inputs) -> bool:
+        for item in inputs:
+            if item not in same_times:
+                same_times[item] = (
+                    resolve_times(old.time_rules, *item)[:2] == resolve_times(new.time_rules, *item)[:2]
+                )
+            if not same_times[item]:
+                return False
+        return True
+
+    removed = kept = 0
+    for key, value in result_cache.items():
+        # 轉換結果的 key 見 schedule_core.result_cache_key；整份班表的結果 key 第二個元素見 WORKBOOK_RESULT_KINDS
+        abbr_stale = old_abbr != new_abbr and key[1] not in WORKBOOK_RESULT_KINDS and key[3] == old_abbr
+        rules_changed = old_time != new_time and key[-1] == old_time
+        if not abbr_stale and not rules_changed:
+            continue
+        result_cache.pop(key)
+        inputs = rule_inputs_cache.pop(key)
+        if not abbr_stale and key[1] != "規則診斷" and inputs is not None and times_unchanged(inputs):
+            new_key = (*key[:-1], new_time)
+            result_cache.set(new_key, value)
+            rule_inputs_cache.set(new_key, inputs)
+            kept += 1
+        else:
+            removed += 1
+
+    feeds = feed_cache.invalidate(lambda key: key[3] != new_time or (old_abbr != new_abbr and key[2] == old_abbr))
+    return {"results": removed, "kept": kept, "feeds": feeds}
+
+
+# ============================================================
+# 3) 發布新版本
+# ============================================================
+def publish_rule_set(abbreviations: list = None, time_rules: list = None, note: str = "") -> RuleSet:
+    """
+    寫入新版本（編號為目前最大的加一），並立刻生效；省略的部分沿用目前版本。
+    格式不對拋出 ValueError，不會寫入任何檔案。
+    """
+    current = get_active_rule_set(force_check=True)
+    data = {
+        "published_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "note": note,
+        "縮寫": list(current.abbreviations) if abbreviations is None else abbreviations,
+        "時間規則": list(current.time_rules.rules) if time_rules is None else time_rules,
+    }
+    files = _version_files(RULES_DIR)
+    version = (files[-1][0] if files else 0) + 1
+    rule_set = make_rule_set(data, version=version)
+
+    path = RULES_DIR / f"{version:04d}.json"
+    RULES_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(rule_set.to_json(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+    get_active_rule_set(force_check=True)
+    return rule_set
+
+
+# ============================================================
+# 4) 命令列
+# ============================================================
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m rule_sets", description="版本化的縮寫與時間規則")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出所有版本")
+    export = sub.add_parser("export", help="輸出某個版本的 JSON")
+    export.add_argument("version", type=int, nargs="?")
+    publish = sub.add_parser("publish", help="發布新版本")
+    publish.add_argument("file", type=Path)
+    publish.add_argument("--note", default="")
+    check = sub.add_parser("check", help="列出班表裡沒有對應時間規則的工作內容")
+    check.add_argument("workbook", type=Path)
+    check.add_argument("--rules", type=Path, help="要檢查的規則 JSON（預設為目前版本）")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        active = get_active_rule_set(force_check=True)
+        for rule_set in list_rule_sets():
+            mark = "*" if rule_set.version == active.version else " "
+            print(f"{mark} {rule_set.version:>4}  {rule_set.hash[:12]}  {rule_set.published_at or '-':<25}  "
+                  f"縮寫 {len(rule_set.abbreviations)} 筆、時間規則 {len(rule_set.time_rules.rules)} 條  {rule_set.note}")
+        return 0
+
+    if args.command == "export":
+        if args.version is None:
+            rule_set = get_active_rule_set(force_check=True)
+        else:
+            rule_set = next((r for r in list_rule_sets() if r.version == args.version), None)
+            if rule_set is None:
+                print(f"找不到版本 {args.version}", file=sys.stderr)
+                return 1
+        print(json.dumps(rule_set.to_json(), ensure_ascii=False, indent=2))
+        return 0
+
+    if args.command == "check":
+        try:
+            if args.rules:
+                with open(args.rules, encoding="utf-8") as f:
+                    data = json.load(f)
+                # export 的整份 JSON，或只有時間規則的清單
+                time_rules = compile_time_rules(data.get("時間規則") if isinstance(data, dict) else data)
+            else:
+                time_rules = get_active_rule_set(force_check=True).time_rules
+            df_unmatched = unmatched_labels(get_parsed_workbook(args.workbook.read_bytes()), time_rules)
+        except (OSError, ValueError) as e:
+            print(f"❌ 檢查失敗：{e}", file=sys.stderr)
+            return 1
+        if df_unmatched.empty:
+            print("✅ 所有有排班的工作內容都有對應的時間規則")
+            return 0
+        print(f"⚠ {len(df_unmatched)} 種工作內容沒有對應的時間規則（會匯出成全天事件）：")
+        for label, normalized, n in df_unmatched.itertuples(index=False):
+            print(f"  {n:>4} 班  {label}    （比對用：{normalized}）")
+        return 0
+
+    try:
+        with open(args.file, encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or not ({"縮寫", "時間規則"} & set(data)):
+            raise ValueError("檔案必須是含「縮寫」或「時間規則」的 JSON 物件")
+        rule_set = publish_rule_set(data.get("縮寫"), data.get("時間規則"), note=args.note or data.get("note", ""))
+    except (OSError, ValueError) as e:
+        print(f"❌ 發布失敗：{e}", file=sys.stderr)
+        return 1
+    print(f"✅ 已發布版本 {rule_set.version}（{rule_set.hash[:12]}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+行程內共用快取（所有 Streamlit session、背景預載執行緒共用）。
+
+Streamlit 每個使用者、每次 rerun 都會重跑整個頁面，
+這裡放的是「同一份班表不需要再做第二次」的結果：
+
+    listing_cache   Drive 列檔結果
+    metadata_cache  Drive 檔案 metadata（file_id -> name / mimeType / modifiedTime / size）
+    download_cache  Drive 下載的班表 bytes（key 含 modifiedTime，檔案更新就自然失效）
+    parse_cache     解析後的班表（key 為內容 hash）
+    layout_cache    偵測到的班表版面（key 為內容 hash；比解析結果小得多，保留較多份）
+    template_cache  同一種範本（工作表名稱相同）上一次的版面，下個月的新檔案先套用、不必逐張偵測
+    result_cache    轉換結果（key 含內容 hash、代號、縮寫表與時間規則的 hash；依占用記憶體淘汰）
+    rule_inputs_cache  各轉換結果套用過時間規則的工作內容組合（規則改版時判斷結果是否受影響）
+    simplifier_cache  整理好的縮寫表（schedule_core.Simplifier，key 為縮寫表 hash）
+    profile_cache   各代號儲存的縮寫設定（profiles.py，SQLite 的讀取結果）
+    workbook_store  各 session 載入的班表 bytes（依內容去重、引用計數；session 只保存 WorkbookRef）
+
+Drive 檔案有變更時（drive_changes.py），用 invalidate_drive_files 只清掉相關的項目。
+"""
+import hashlib
+import logging
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    執行緒安全的 LRU 快取，可選擇設定存活時間（秒）。
+    超過 max_entries 時淘汰最久沒用到的項目；
+    有給 max_bytes 與 sizeof(value) 時，總大小超過 max_bytes 也會淘汰（單一項目超過上限則不快取）。
+    """
+
+    def __init__(self, max_entries: int = 32, ttl: float = None, max_bytes: int = None, sizeof=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at, _, _ = item
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        stored_at = time.monotonic()
+        expires_at = stored_at + self.ttl if self.ttl else None
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, expires_at, size, stored_at)
+            self.total_bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self.total_bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        """呼叫端必須持有 self._lock。"""
+        _, _, size, _ = self._data.pop(key)
+        self.total_bytes -= size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data[key][0]
+            self._remove(key)
+        return value
+
+    def extend_ttl(self, ttl: float) -> int:
+        """
+        把目前項目的到期時間延到寫入後 ttl 秒（只延長、不縮短），回傳延長的數量。
+        存活時間由呼叫端決定，不會改動 self.ttl，其他使用同一個快取的地方不受影響。
+        """
+        extended = 0
+        with self._lock:
+            for key, (value, expires_at, size, stored_at) in self._data.items():
+                new_expires_at = stored_at + ttl
+                if expires_at is not None and expires_at < new_expires_at:
+                    self._data[key] = (value, new_expires_at, size, stored_at)
+                    extended += 1
+        return extended
+
+    def invalidate(self, predicate) -> int:
+        """移除 predicate(key) 為 True 的項目，回傳移除數量。"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                self._remove(k)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._data)
+
+    def items(self) -> list:
+        """目前所有 (key, value) 的快照（不檢查過期）。"""
+        with self._lock:
+            return [(k, v) for k, (v, _, _, _) in self._data.items()]
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+_MISSING = object()
+
+
+def content_hash(data: bytes) -> str:
+    """班表內容 hash，作為解析結果等快取的 key。"""
+    return hashlib.sha256(data).hexdigest()
+
+
+# 列檔 5 分鐘內重用；每次 rerun 都會呼叫，不快取的話每點一次按鈕就打一次 Drive API
+LISTING_TTL_SECONDS = 300
+listing_cache = TTLCache(max_entries=8, ttl=LISTING_TTL_SECONDS)
+
+# key：file_id，value：{id, name, mimeType, modifiedTime, size}
+# 重複貼同一個連結時不必再查 metadata；檔案更新時由變更追蹤清掉，TTL 只是保險
+METADATA_TTL_SECONDS = 120
+metadata_cache = TTLCache(max_entries=256, ttl=METADATA_TTL_SECONDS)
+
+# key：(file_id, modifiedTime)，value：(bytes, file_name)
+download_cache = TTLCache(max_entries=12)
+
+# key：content_hash(bytes)，value：schedule_core.ParsedWorkbook
+parse_cache = TTLCache(max_entries=12)
+
+# key：content_hash(bytes)，value：schedule_core.ScheduleLayout
+layout_cache = TTLCache(max_entries=64)
+
+# key：(格式, 工作表名稱 tuple)，value：schedule_core.ScheduleLayout 的 tuple
+# 檔案更新時不清：新版本正是要沿用的對象，套用前由 schedule_core.fit_layout 確認仍然適用
+template_cache = TTLCache(max_entries=32)
+
+def result_nbytes(value) -> int:
+    """轉換結果 (df_shifts, year_month)、全員統計或規則診斷（DataFrame 與年月的 tuple）大約占用的記憶體。"""
+    return sum(
+        int(item.memory_usage(deep=True).sum()) if hasattr(item, "memory_usage") else sys.getsizeof(item)
+        for item in value
+    )
+
+
+# key：(content_hash(bytes), 代號, 年月判斷依據, 縮寫表 hash, 時間規則 hash)，value：(df_shifts, year_month)
+# 全員統計另以 (content_hash(bytes), "全員統計", 年月判斷依據, 時間規則 hash) 存放 (df_summary, year_month)，
+# 時間規則診斷以 (content_hash(bytes), "規則診斷", 年月判斷依據, 時間規則 hash) 存放 (df_rule_stats, df_untimed, year_month)
+# 規則發布新版本時，rule_sets.invalidate_rule_results 只清掉受影響的項目（見 rule_inputs_cache）
+# 同一份班表、同一個代號（例如共用的值班代號）不論誰轉換、轉換幾次，都直接回傳
+RESULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+result_cache = TTLCache(max_entries=4096, max_bytes=RESULT_CACHE_MAX_BYTES, sizeof=result_nbytes)
+
+# key：與 result_cache 相同（轉換結果與全員統計），value：算這份結果時套用時間規則的
+# 所有 (工作內容, 星期, 是否假日) 組合（frozenset）。時間規則改版時逐一比對新舊規則算出的起訖時間，
+# 都沒變的結果改用新版本的 key 保留；這裡沒有紀錄（已被淘汰）的結果直接清掉
+rule_inputs_cache = TTLCache(max_entries=4096)
+
+# key：縮寫表 hash，value：schedule_core.Simplifier（含已簡化過的工作內容）
+# 同一份縮寫設定（預設縮寫、某個代號的縮寫設定）只整理一次，所有 session 與代號共用
+simplifier_cache = TTLCache(max_entries=256)
+
+# key：代號，value：縮寫設定（list）或 None（沒有儲存）；儲存時由 profiles.py 更新，
+# TTL 讓另一個行程（獨立執行的 API）存的設定也會在一分鐘內看到
+PROFILE_TTL_SECONDS = 60
+profile_cache = TTLCache(max_entries=1024, ttl=PROFILE_TTL_SECONDS)
+
+# key：(代號, ((file_id, modifiedTime), ...), 縮寫表 hash, 時間規則 hash)，value：訂閱用 ICS 的 bytes（api.py）
+# key 已含各班表的 modifiedTime，班表更新後自然換成新的 key，舊的由 LRU 淘汰
+FEED_CACHE_MAX_BYTES = 16 * 1024 * 1024
+feed_cache = TTLCache(max_entries=1024, max_bytes=FEED_CACHE_MAX_BYTES, sizeof=len)
+
+class WorkbookRef:
+    """
+    session 持有的班表參照：只有內容 hash（key）與大小。
+    物件被回收（session 結束、session_state 換成別的班表）或呼叫 release() 時，自動歸還引用計數。
+    """
+
+    def __init__(self, store: "SharedWorkbookStore", key: str, size: int):
+        self.key = key
+        self.size = size
+        self._finalizer = weakref.finalize(self, store._release, key)
+
+    def release(self):
+        self._finalizer()
+
+    def __repr__(self):
+        return f"WorkbookRef({self.key[:12]}…, {self.size} bytes)"
+
+
+class SharedWorkbookStore:
+    """
+    行程內共用、依內容去重的班表 bytes 存放區。
+    80 個人開同一個月的班表，伺服器只存一份；記憶體隨「不同班表的數量」增加，而不是使用者人數。
+
+    - acquire(data) 回傳 WorkbookRef，引用計數 +1；同樣的內容只保留第一次存入的那份 bytes
+    - 引用計數歸零的項目不會立刻刪除（很可能有人馬上又載入同一份），
+      總大小超過 max_bytes 時才從最久沒用到的開始淘汰；仍被引用的項目不會被淘汰
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._data = OrderedDict()    # key -> bytes
+        self._refs = {}               # key -> 引用計數
+        self._lock = threading.Lock()
+
+    def acquire(self, data: bytes) -> WorkbookRef:
+        key = content_hash(data)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            else:
+                self._data[key] = data
+                self.total_bytes += len(data)
+            self._refs[key] = self._refs.get(key, 0) + 1
+            self._evict()
+        return WorkbookRef(self, key, len(data))
+
+    def get(self, key: str):
+        """取回 bytes；已被淘汰（理論上只有沒人引用時才會）回傳 None。"""
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+            return data
+
+    def refcount(self, key: str) -> int:
+        with self._lock:
+            return self._refs.get(key, 0)
+
+    def _release(self, key: str):
+        with self._lock:
+            count = self._refs.get(key, 0) - 1
+            if count > 0:
+                self._refs[key] = count
+            else:
+                self._refs.pop(key, None)
+            self._evict()
+
+    def _evict(self):
+        """呼叫端必須持有 self._lock。"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in [k for k in self._data if k not in self._refs]:
+            self.total_bytes -= len(self._data.pop(key))
+            if self.total_bytes <= self.max_bytes:
+                return
+        logger.warning("班表存放區超過上限（%d bytes），但所有班表都仍在使用中", self.total_bytes)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+WORKBOOK_STORE_MAX_BYTES = 64 * 1024 * 1024
+workbook_store = SharedWorkbookStore(max_bytes=WORKBOOK_STORE_MAX_BYTES)
+
+# Drive file_id -> 下載過的內容 hash，用來在檔案變更時找到對應的 parse_cache 項目
+_drive_file_hashes = {}
+_drive_file_hashes_lock = threading.Lock()
+
+
+def remember_drive_file_content(file_id: str, data: bytes):
+    with _drive_file_hashes_lock:
+        _drive_file_hashes.setdefault(file_id, set()).add(content_hash(data))
+
+
+def invalidate_drive_files(file_ids, refresh_listing: bool = False) -> dict:
+    """
+    清掉指定 Drive 檔案的 metadata、下載與解析快取；
+    若這些檔案出現在快取的列檔結果中，或 refresh_listing=True（例如有新班表），也清掉列檔快取。
+    回傳各快取清掉的數量。
+    """
+    file_ids = set(file_ids)
+    with _drive_file_hashes_lock:
+        hashes = set()
+        for file_id in file_ids:
+            hashes |= _drive_file_hashes.pop(file_id, set())
+
+    listing_keys = [
+        key for key, files in listing_cache.items()
+        if refresh_listing or any(f.get("id") in file_ids for f in files)
+    ]
+    for key in listing_keys:
+        listing_cache.pop(key)
+
+    return {
+        "listing": len(listing_keys),
+        "metadata": metadata_cache.invalidate(lambda key: key in file_ids),
+        "download": download_cache.invalidate(lambda key: key[0] in file_ids),
+        "parse": parse_cache.invalidate(lambda key: key in hashes),
+        "layout": layout_cache.invalidate(lambda key: key in hashes),
+        "result": result_cache.invalidate(lambda key: key[0] in hashes),
+        "rule_inputs": rule_inputs_cache.invalidate(lambda key: key[0] in hashes),
+    }
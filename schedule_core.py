@@ -0,0 +1,1607 @@
+"""
+班表轉換核心邏輯（不依賴 Streamlit）。
+
+duty_noDL_allfunction.py 的頁面、benchmarks/ 的效能測試都共用這裡的函式，
+所以這個檔案不可以 import streamlit，錯誤一律以例外拋出，由呼叫端決定怎麼顯示。
+
+轉換流程分成幾個可以單獨計時的階段：
+    read_schedule_grid   讀取班表格子（pandas），偵測版面（detect_layout）後轉成精簡的 ScheduleGrid
+    build_holiday_map    日期列灰底假日判斷（openpyxl）
+                         （以上兩步由 parse_workbook 對每張班表工作表各做一次，
+                          檔案大時以行程池平行處理；get_parsed_workbook 依內容 hash 快取）
+    build_date_mapping   日期 / 星期對照
+    match_code_rows      找出代號所在的工作內容並套用縮寫
+    apply_time_rules     套用時間規則（DEFAULT_TIME_RULES 格式的資料，規則本身以 "HH:MM" 文字表示時間）
+    shift_frame          轉成型別化的結果（datetime64 起訖時間，跨夜的班結束在隔天）
+    export_calendar_csv  輸出 Google 日曆 CSV（calendar_columns 只在匯出、顯示時轉成文字）
+    workload_summary     全員統計（所有代號一次計算，與單一代號的轉換無關）
+"""
+import io
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import unicodedata
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from schedule_cache import (
+    content_hash,
+    layout_cache,
+    parse_cache,
+    result_cache,
+    rule_inputs_cache,
+    simplifier_cache,
+    template_cache,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# 0) 使用者可編輯簡化對照表（預設值）
+# ============================================================
+default_rules = [
+    {"原始關鍵字": "調劑複核", "簡化後": "C"},
+    {"原始關鍵字": "處方判讀", "簡化後": "判讀"},
+    {"原始關鍵字": "藥物諮詢", "簡化後": "諮詢"},
+    {"原始關鍵字": "門診藥局調劑", "簡化後": "門診"},
+    {"原始關鍵字": "中正 2樓", "簡化後": "中2"},
+    {"原始關鍵字": "中正13樓", "簡化後": "中13"},
+    {"原始關鍵字": "思源樓", "簡化後": "思源"},
+    {"原始關鍵字": "長青樓", "簡化後": "長青"},
+    {"原始關鍵字": "抗凝藥師門診", "簡化後": "抗凝門診"},
+    {"原始關鍵字": "移植藥師門診", "簡化後": "移植門診"},
+    {"原始關鍵字": "中藥局調劑", "簡化後": "中藥局"},
+    {"原始關鍵字": "假日非常班之諮詢與藥動服務", "簡化後": "假日oncall"},
+    ]
+
+# 由 Drive 載入的班表改用檔名判斷年月（上傳 Excel 則看首列標題）
+DRIVE_SOURCES = ["現有共用班表檔案(3個月內)", "試算表連結"]
+
+CSV_COLUMNS = ["Subject", "Start Date", "Start Time", "End Date", "End Time"]
+
+# 轉換結果（convert_schedule 回傳的 df_shifts）的欄位：
+#   Subject 簡化後的工作內容；Date 日期（datetime64，當天 00:00）
+#   Start / End 起訖時間（datetime64）；沒有時間的班為 NaT，跨夜的班 End 在隔天
+# 文字的 CSV 欄位（CSV_COLUMNS）只在匯出、顯示時由 calendar_columns 產生
+SHIFT_COLUMNS = ["Subject", "Date", "Start", "End"]
+
+# 規則引擎（apply_time_rules）或輸出格式有改動時加一，讓快取的舊轉換結果失效
+# （規則內容本身的改動由 TimeRules.hash 反映，不必改這裡）
+# 2：結果改為型別化欄位，跨夜的班結束日期改為隔天
+# 3：比對時間規則前先正規化工作內容（normalize_label）
+RULES_VERSION = 3
+
+
+class ScheduleConvertError(ValueError):
+    """班表無法轉換（例如解析不到年月）。訊息可直接顯示給使用者。"""
+
+
+class NoMatchingShiftsError(ScheduleConvertError):
+    """班表可以解析，但找不到符合此代號的班。"""
+
+
+# ============================================================
+# 1) 年月解析
+# ============================================================
+def parse_year_month_from_drive_filename(file_name: str):
+    """
+    解析 Drive 檔名格式：11503班表（民國年3碼 + 月2碼）
+    回傳 (year_ad, month, year_month_str) 例如 (2026, 3, "202603")
+    抓不到就回 None
+    """
+    if not file_name:
+        return None
+
+    # 支援：11503班表、11503 班表、11503班表.xlsx（若是xlsx也可能有副檔名）
+    m = re.search(r"(\d{3})(\d{2})\s*班表", file_name)
+    if not m:
+        return None
+
+    roc_year = int(m.group(1))        # 例如 115
+    month = int(m.group(2))           # 例如 03
+    year = roc_year + 1911            # 民國->西元
+    year_month = f"{year}{month:02d}" # 例如 202603
+
+    return year, month, year_month
+
+
+def parse_year_month_from_title(title: str):
+    """
+    解析首列標題，例如「114年4月臨床藥師原始班表」。
+    回傳 (year_ad, month, year_month_str)，抓不到就回 None
+    """
+    m = re.search(r"(\d{2,3})年(\d{1,2})月", str(title))
+    if not m:
+        return None
+    year = int(m.group(1)) + 1911
+    month = int(m.group(2))
+    return year, month, f"{year}{month:02d}"
+
+
+def resolve_year_month(grid, source: str, drive_file_name: str):
+    """
+    依班表來源決定年月：Drive 來源看檔名，上傳 Excel 看首列標題。
+    解析不到時拋出 ScheduleConvertError。
+    """
+    if source in DRIVE_SOURCES:
+        parsed = parse_year_month_from_drive_filename(drive_file_name)
+        if not parsed:
+            raise ScheduleConvertError(
+                f"❌ 無法從 Drive 檔名解析年月：{drive_file_name}\n請確認檔名格式為 11503班表"
+            )
+        return parsed
+
+    parsed = parse_year_month_from_title(grid.title)
+    if not parsed:
+        raise ScheduleConvertError("❌ 無法從首列標題解析年月，請確認格式如『113年4月班表』")
+    return parsed
+
+
+# ============================================================
+# 2) 版面偵測
+# ============================================================
+# 日期列、星期列只會出現在前幾列
+HEADER_SCAN_ROWS = 15
+
+# 一個月（或一週）至少要有這麼多個連續日期，才算是日期列
+MIN_DATE_RUN = 5
+
+WEEKDAY_NAMES = "一二三四五六日"
+_WEEKDAY_RE = re.compile(r"^[（(]?(?:星期|週|周|礼拜|禮拜)?([一二三四五六日天])[)）]?$")
+
+# 「附　註」那一列是代號對照與說明的開頭，不是工作列：與原本相同只略過這一列，後面的列照常讀取
+# （對照與說明寫在 B 欄起，工作內容欄空白，本來就會略過）。「附」「註」之間的空白（含全形空白）不拘
+_FOOTER_LABEL_RE = re.compile(r"^附\s*註")
+
+# Google 試算表讀出的是顯示文字，日期格式的儲存格會是「2026/3/1」「2026-03-01」
+_DATE_TEXT_RE = re.compile(r"^\d{4}[-/.]\d{1,2}[-/.](\d{1,2})$")
+
+
+@dataclass(frozen=True)
+class ScheduleLayout:
+    """
+    偵測到的班表版面（所有 index 都是 0-based、以 pd.read_excel(header=None) 的列/欄為準）：
+    - sheet_name：班表所在的工作表
+    - title_row / title_col：年月標題儲存格
+    - date_row / weekday_row：日期列、星期列（沒有星期列時為 None，轉換時由日期推算）
+    - label_col：工作內容欄
+    - first_day_col / n_days：日期欄的起點與天數
+    - first_task_row / footer_row：工作列的起點，與「附　註」列（只略過這一列；沒有附註時為 None）
+    """
+    sheet_name: object
+    title_row: int
+    title_col: int
+    date_row: int
+    weekday_row: object
+    label_col: int
+    first_day_col: int
+    n_days: int
+    first_task_row: int
+    footer_row: object
+
+
+def _day_number(value):
+    """儲存格若是日期（1~31 的整數、數字字串、「2026/3/1」這類日期文字或日期物件）回傳日，否則回 None。"""
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.day
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        day = int(value)
+    elif isinstance(value, (float, np.floating)) and float(value).is_integer():
+        day = int(value)
+    elif isinstance(value, str) and value.strip().isdigit():
+        day = int(value.strip())
+    elif isinstance(value, str) and _DATE_TEXT_RE.match(value.strip()):
+        day = int(_DATE_TEXT_RE.match(value.strip()).group(1))
+    else:
+        return None
+    return day if 1 <= day <= 31 else None
+
+
+def _weekday_name(value):
+    """「二」「週二」「星期二」「(二)」都回傳「二」；「天」視為「日」。不是星期回 None。"""
+    if not isinstance(value, str):
+        return None
+    m = _WEEKDAY_RE.match(value.strip())
+    if not m:
+        return None
+    return "日" if m.group(1) == "天" else m.group(1)
+
+
+def _is_blank(value) -> bool:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return True
+    text = str(value).strip()
+    return not text or text.lower() == "nan"
+
+
+def _is_footer(value) -> bool:
+    return not _is_blank(value) and _FOOTER_LABEL_RE.match(str(value).strip()) is not None
+
+
+def _longest_date_run(row) -> tuple:
+    """
+    回傳此列最長的連續日期 (起始欄, 長度)；日期必須逐欄加一。
+    跨月的週班表（29, 30, 31, 1, 2 ...）：不是從 1 日開始的一段日期，在月底（28 日以後）之後回到 1 也算連續，
+    每段最多跨一次月（從 1 日開始的整月班表在月底就結束，後面的欄位不算）。
+    """
+    best = (0, 0)
+    start, length, prev, first_day, wrapped = 0, 0, None, None, False
+    for col, value in enumerate(row):
+        day = _day_number(value)
+        if day is not None and prev is not None and day == prev + 1:
+            length += 1
+        elif day == 1 and prev is not None and prev >= 28 and first_day > 1 and not wrapped:
+            length += 1
+            wrapped = True
+        elif day is not None:
+            start, length, first_day, wrapped = col, 1, day, False
+        else:
+            length = 0
+        prev = day
+        if length > best[1]:
+            best = (start, length)
+    return best
+
+
+def detect_layout(values: np.ndarray, sheet_name=0) -> ScheduleLayout:
+    """
+    在一張工作表（pd.read_excel(header=None) 的值）中找出：
+    日期列（前幾列中連續日期最長的一列）、星期列（日期列附近、日期欄大多是星期的一列）、
+    工作內容欄（日期欄左邊非空白最多的一欄）、附註列，以及含「年」「月」的標題。
+    找不到日期列時拋出 ScheduleConvertError。
+    """
+    n_rows, n_cols = values.shape
+    scan = min(n_rows, HEADER_SCAN_ROWS)
+
+    date_row, first_day_col, n_days = None, 0, 0
+    for r in range(scan):
+        col, length = _longest_date_run(values[r])
+        if length > n_days:
+            date_row, first_day_col, n_days = r, col, length
+    if date_row is None or n_days < MIN_DATE_RUN or first_day_col == 0:
+        raise ScheduleConvertError("❌ 班表格式不符：找不到日期列（需要一列連續的日期，且左側有工作內容欄）")
+
+    weekday_row = None
+    for r in (date_row + 1, date_row - 1, date_row + 2, date_row - 2):
+        if 0 <= r < n_rows and _is_weekday_row(values, r, first_day_col, n_days):
+            weekday_row = r
+            break
+
+    header_end = max(date_row, weekday_row if weekday_row is not None else date_row)
+    first_task_row = header_end + 1
+
+    label_col = max(
+        range(first_day_col),
+        key=lambda c: (sum(not _is_blank(v) for v in values[first_task_row:, c]), c),
+    )
+
+    footer_row = _find_footer_row(values, first_task_row, label_col)
+
+    title_row, title_col = 0, 0
+    for r in range(date_row):
+        for c in range(n_cols):
+            if isinstance(values[r, c], str) and re.search(r"\d{2,3}\s*年\s*\d{1,2}\s*月", values[r, c]):
+                title_row, title_col = r, c
+                break
+        else:
+            continue
+        break
+
+    return ScheduleLayout(
+        sheet_name=sheet_name,
+        title_row=title_row,
+        title_col=title_col,
+        date_row=date_row,
+        weekday_row=weekday_row,
+        label_col=label_col,
+        first_day_col=first_day_col,
+        n_days=n_days,
+        first_task_row=first_task_row,
+        footer_row=footer_row,
+    )
+
+
+def _is_weekday_row(values: np.ndarray, r: int, first_day_col: int, n_days: int) -> bool:
+    """第 r 列的日期欄至少一半是星期。"""
+    hits = sum(_weekday_name(values[r, c]) is not None for c in range(first_day_col, first_day_col + n_days))
+    return hits * 2 >= n_days
+
+
+def _find_footer_row(values: np.ndarray, first_task_row: int, label_col: int):
+    for r in range(first_task_row, values.shape[0]):
+        if _is_footer(values[r, label_col]):
+            return r
+    return None
+
+
+def fit_layout(values: np.ndarray, layout: ScheduleLayout):
+    """
+    把已知的版面（同一份檔案，或同一種範本上個月的班表）套用到這張工作表：
+    日期列仍在同一列、從同一欄開始，星期列（若有）也還在時，只重新計算天數與附註列，回傳調整後的版面；
+    不適用時回傳 None（由呼叫端改為 detect_layout）。
+    """
+    n_rows, n_cols = values.shape
+    if max(layout.date_row, layout.title_row, layout.first_task_row - 1) >= n_rows \
+            or max(layout.first_day_col, layout.title_col) >= n_cols:
+        return None
+    col, length = _longest_date_run(values[layout.date_row])
+    if col != layout.first_day_col or length < MIN_DATE_RUN:
+        return None
+    if layout.weekday_row is not None and not (
+        layout.weekday_row < n_rows and _is_weekday_row(values, layout.weekday_row, col, length)
+    ):
+        return None
+    footer_row = _find_footer_row(values, layout.first_task_row, layout.label_col)
+    if (length, footer_row) == (layout.n_days, layout.footer_row):
+        return layout
+    return replace(layout, n_days=length, footer_row=footer_row)
+
+
+# ============================================================
+# 3) 讀取班表與灰底假日判斷
+# ============================================================
+@dataclass(frozen=True)
+class ScheduleGrid:
+    """
+    一個月班表的精簡表示，取代整張 object DataFrame（快取一整年的班表也不占多少記憶體）：
+    - title / date_row / weekday_row：標題、日期列（日）、星期列（一~日；沒有星期列時為 None），自第一個日期欄起
+    - row_labels：有效工作列的工作內容（已 intern）；空白列與「附　註」列不保留
+    - code_table：不重複的儲存格文字（字典編碼）
+    - row_ptr / day_idx / code_ids：CSR 格式的非空儲存格，
+      第 r 個工作列的儲存格為 [row_ptr[r], row_ptr[r+1])，
+      day_idx 為日期欄位序號（第一個日期欄 = 0），code_ids 指向 code_table
+    - layout：偵測到的版面
+    """
+    title: str
+    date_row: tuple
+    weekday_row: tuple
+    row_labels: tuple
+    code_table: tuple
+    row_ptr: np.ndarray
+    day_idx: np.ndarray
+    code_ids: np.ndarray
+    layout: ScheduleLayout = field(default=None, compare=False)
+
+    def nbytes(self) -> int:
+        """大約占用的記憶體（字串 + 陣列）。"""
+        strings = self.row_labels + self.code_table + (self.title,)
+        arrays = (self.row_ptr, self.day_idx, self.code_ids)
+        return sum(sys.getsizeof(x) for x in strings) + sum(a.nbytes for a in arrays)
+
+
+def compact_schedule_grid(df: pd.DataFrame, layout: ScheduleLayout = None) -> ScheduleGrid:
+    """
+    把 pd.read_excel(header=None) 讀出的 DataFrame 轉成 ScheduleGrid。
+    layout 沒給就用 detect_layout 偵測；工作內容欄空白、"nan" 的列與「附　註」列略過。
+    """
+    values = df.to_numpy(dtype=object)
+    if values.shape[0] < 2 or values.shape[1] < 2:
+        raise ScheduleConvertError("❌ 班表格式不符：至少需要日期列與工作內容欄")
+    if layout is None:
+        layout = detect_layout(values)
+
+    row_labels = []
+    code_table = {}
+    row_ptr = [0]
+    day_idx = []
+    code_ids = []
+
+    first = layout.first_day_col
+    for row in values[layout.first_task_row:]:
+        raw = row[layout.label_col]
+        if _is_blank(raw) or _is_footer(raw):
+            continue
+
+        row_labels.append(sys.intern(str(raw).strip()))
+        for day, cell in enumerate(row[first:]):
+            if pd.isna(cell):
+                continue
+            text = str(cell)
+            if not text:
+                continue
+            day_idx.append(day)
+            code_ids.append(code_table.setdefault(text, len(code_table)))
+        row_ptr.append(len(day_idx))
+
+    # 日期統一存成「日」（整數），星期統一成一~日；其它欄位（例如月底後的備註欄）照原樣保留
+    date_row = tuple(_day_number(d) or d for d in values[layout.date_row, first:].tolist())
+    weekday_row = None
+    if layout.weekday_row is not None:
+        weekday_row = tuple(_weekday_name(w) or w for w in values[layout.weekday_row, first:].tolist())
+
+    return ScheduleGrid(
+        title=str(values[layout.title_row, layout.title_col]),
+        date_row=date_row,
+        weekday_row=weekday_row,
+        row_labels=tuple(row_labels),
+        code_table=tuple(code_table),
+        # 一個月最多 31 天、代號文字通常只有數十種，用最小的整數型別存
+        row_ptr=np.array(row_ptr, dtype=np.min_scalar_type(len(day_idx))),
+        day_idx=np.array(day_idx, dtype=np.min_scalar_type(max(values.shape[1], 1))),
+        code_ids=np.array(code_ids, dtype=np.min_scalar_type(max(len(code_table), 1))),
+        layout=layout,
+    )
+
+
+def read_schedule_grid(excel_bytes: bytes, sheet_name=None) -> ScheduleGrid:
+    """
+    用 pandas 讀取一張工作表，偵測版面後轉成精簡的 ScheduleGrid（DataFrame 用完即丟）。
+    sheet_name 沒給時依序找第一張偵測得到版面的工作表。
+    """
+    if sheet_name is not None:
+        df = pd.read_excel(io.BytesIO(excel_bytes), sheet_name=sheet_name, header=None)
+        return compact_schedule_grid(df, detect_layout(df.to_numpy(dtype=object), sheet_name))
+
+    with pd.ExcelFile(io.BytesIO(excel_bytes)) as xls:
+        for name in xls.sheet_names:
+            df = xls.parse(name, header=None)
+            if df.shape[0] < 2 or df.shape[1] < 2:
+                continue
+            try:
+                layout = detect_layout(df.to_numpy(dtype=object), name)
+            except ScheduleConvertError:
+                continue
+            return compact_schedule_grid(df, layout)
+
+    raise ScheduleConvertError("❌ 班表格式不符：所有工作表都找不到日期列（需要一列連續的日期）")
+
+
+# 你目前使用的灰底 RGB（如你的班表底色不同，請改這裡）
+HOLIDAY_GRAY_RGB = "FFD9D9D9"
+
+
+def build_holiday_map(excel_bio: io.BytesIO, layout: ScheduleLayout = None) -> dict[int, bool]:
+    """
+    用 openpyxl 讀取 Excel：
+    - 日期列的底色（灰底代表假日）；沒給 layout 時為作用中工作表的第二列、B 欄起
+    回傳 holiday_map：{ openpyxl_column_index(1-based): is_holiday }
+    """
+    # openpyxl 只有轉換時才需要，延後 import 以加快頁面冷啟動
+    from openpyxl import load_workbook
+
+    excel_bio.seek(0)
+    # 唯讀模式只解析用到的那一列，不會把其它工作表整張載入
+    wb = load_workbook(excel_bio, read_only=True, data_only=True)
+    try:
+        return holiday_map_from_workbook(wb, layout)
+    finally:
+        wb.close()
+
+
+def holiday_map_from_workbook(wb, layout: ScheduleLayout = None) -> dict[int, bool]:
+    """build_holiday_map 的本體；wb 為已開啟的 openpyxl Workbook（例如 pd.ExcelFile 的 book）。"""
+    if layout is None:
+        ws, date_row, first_col = wb.active, 2, 2
+    else:
+        sheet = layout.sheet_name
+        ws = wb[sheet] if isinstance(sheet, str) else wb.worksheets[sheet]
+        date_row, first_col = layout.date_row + 1, layout.first_day_col + 1
+
+    holiday_map = {}
+    for row in ws.iter_rows(min_row=date_row, max_row=date_row, min_col=first_col):
+        for col, cell in enumerate(row, start=first_col):  # 日期欄開始（左側是工作內容）
+            fill = getattr(cell, "fill", None)
+            fg = fill.fgColor if fill is not None else None
+            is_gray = (fg is not None and fg.type == "rgb" and fg.rgb == HOLIDAY_GRAY_RGB)
+            holiday_map[col] = is_gray
+
+    return holiday_map
+
+
+# ============================================================
+# 4) 多工作表解析
+# ============================================================
+# 班表檔案超過這個大小、且有多張工作表時，才用多個行程平行解析（行程間傳檔案本身也有成本）
+PARALLEL_MIN_BYTES = 256 * 1024
+MAX_SHEET_WORKERS = 4
+
+_sheet_pool = None
+_sheet_pool_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ParsedSheet:
+    """一張工作表解析後、與代號無關的部分。"""
+    grid: ScheduleGrid
+    holiday_map: dict
+
+
+@dataclass(frozen=True)
+class ParsedWorkbook:
+    """一份班表解析後、與代號無關的部分（依工作表順序）；同一份班表的所有轉換共用。"""
+    sheets: tuple
+
+
+def list_sheet_names(excel_bytes: bytes) -> list:
+    """只讀 workbook.xml 取得工作表名稱，不解析儲存格。"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(excel_bytes), read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def parse_sheets(excel_bytes: bytes, jobs: list) -> list:
+    """
+    解析 jobs（[(工作表名稱, layout 或 None)]）指定的工作表：格子與灰底假日。
+    整份檔案只開啟一次（pd.ExcelFile 底下的唯讀 openpyxl Workbook 兩者共用）。
+    有給 layout 時以 fit_layout 套用，不適用或沒給時偵測版面；偵測不到（不是班表，例如說明頁）的工作表回傳 None。
+    平行解析時在子行程執行，所以必須是模組層級的函式。
+    """
+    sheets = []
+    with pd.ExcelFile(io.BytesIO(excel_bytes), engine="openpyxl") as xls:
+        for sheet_name, layout in jobs:
+            df = xls.parse(sheet_name, header=None)
+            layout = _sheet_layout(df, sheet_name, layout)
+            if layout is None:
+                sheets.append(None)
+                continue
+            sheets.append(ParsedSheet(
+                grid=compact_schedule_grid(df, layout),
+                holiday_map=holiday_map_from_workbook(xls.book, layout),
+            ))
+    return sheets
+
+
+def _sheet_layout(df: pd.DataFrame, sheet_name, layout: ScheduleLayout = None):
+    """一張工作表的版面：先套用已知的 layout（fit_layout），不適用或沒給時偵測；不是班表回傳 None。"""
+    if df.shape[0] < 2 or df.shape[1] < 2:
+        return None
+    values = df.to_numpy(dtype=object)
+    if layout is not None:
+        layout = fit_layout(values, layout)
+    if layout is None:
+        try:
+            layout = detect_layout(values, sheet_name)
+        except ScheduleConvertError:
+            return None
+    return layout
+
+
+def parse_sheet(excel_bytes: bytes, sheet_name, layout: ScheduleLayout = None):
+    """解析單一工作表（行程池的工作單位），不是班表時回傳 None。"""
+    return parse_sheets(excel_bytes, [(sheet_name, layout)])[0]
+
+
+# ---------- Google 試算表（Sheets API 讀出的格子） ----------
+# 原生 Google 試算表不必匯出成 xlsx：drive_client 以 spreadsheets.get 只讀格子文字與日期列底色，
+# 存成這個格式的 JSON（一樣當作「班表 bytes」快取、計算 hash），解析時完全不需要 openpyxl：
+#     {"format": "google-sheets-values", "sheets": [
+#         {"title": 工作表名稱, "values": [[儲存格文字或 null, ...], ...],
+#          "date_row": 日期列, "date_col": 第一個日期欄, "colors": ["FFD9D9D9", ...]}]}
+# date_row / date_col / colors 為日期列的底色（ARGB），不是班表的工作表沒有這三項。
+SHEETS_PAYLOAD_FORMAT = "google-sheets-values"
+_SHEETS_PAYLOAD_PREFIX = b'{"format":"' + SHEETS_PAYLOAD_FORMAT.encode("ascii") + b'"'
+
+
+def is_sheets_payload(data: bytes) -> bool:
+    return data[:len(_SHEETS_PAYLOAD_PREFIX)] == _SHEETS_PAYLOAD_PREFIX
+
+
+def encode_sheets_payload(sheets: list) -> bytes:
+    """sheets：[{title, values, date_row?, date_col?, colors?}]（見上方格式說明）。"""
+    payload = {"format": SHEETS_PAYLOAD_FORMAT, "sheets": sheets}
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def values_frame(values: list) -> pd.DataFrame:
+    """Sheets API 的列（每列長度不一，尾端空白會省略）補齊成與 pd.read_excel(header=None) 相同形狀的 DataFrame。"""
+    width = max((len(row) for row in values), default=0)
+    return pd.DataFrame([list(row) + [None] * (width - len(row)) for row in values], dtype=object)
+
+
+def sheet_values_layout(values: list, sheet_name):
+    """偵測 Sheets API 讀出的一張工作表的版面；不是班表回傳 None。"""
+    return _sheet_layout(values_frame(values), sheet_name)
+
+
+def parse_sheets_payload(data: bytes, jobs: list) -> list:
+    """
+    parse_sheets 的 Google 試算表版：jobs 為 [(工作表名稱, layout 或 None)]，layout 的用法相同。
+    假日由 payload 裡日期列的底色判斷；底色讀取的位置與版面不符時（不應發生）當作沒有假日。
+    """
+    by_title = {sheet["title"]: sheet for sheet in json.loads(data)["sheets"]}
+    parsed = []
+    for sheet_name, layout in jobs:
+        sheet = by_title.get(sheet_name)
+        if sheet is None:
+            parsed.append(None)
+            continue
+        df = values_frame(sheet["values"])
+        layout = _sheet_layout(df, sheet_name, layout)
+        if layout is None:
+            parsed.append(None)
+            continue
+
+        first_col = layout.first_day_col + 1
+        holiday_map = {}
+        if (sheet.get("date_row"), sheet.get("date_col")) == (layout.date_row, layout.first_day_col):
+            holiday_map = {
+                col: color == HOLIDAY_GRAY_RGB
+                for col, color in enumerate(sheet.get("colors", []), start=first_col)
+            }
+        else:
+            logger.warning("工作表 %s 的日期列底色與版面不符，不判斷假日", sheet_name)
+        parsed.append(ParsedSheet(grid=compact_schedule_grid(df, layout), holiday_map=holiday_map))
+    return parsed
+
+
+def get_sheet_pool():
+    """共用的解析行程池（第一次需要時才建立）。用 spawn，避免在有多個執行緒的 Streamlit 行程裡 fork。"""
+    global _sheet_pool
+    with _sheet_pool_lock:
+        if _sheet_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            _sheet_pool = ProcessPoolExecutor(
+                max_workers=min(MAX_SHEET_WORKERS, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _sheet_pool
+
+
+def _reset_sheet_pool():
+    global _sheet_pool
+    with _sheet_pool_lock:
+        pool, _sheet_pool = _sheet_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_workbook(excel_bytes: bytes, parallel: bool = None) -> ParsedWorkbook:
+    """
+    讀取每一張班表工作表的格子與灰底假日（Excel 解析是轉換最花時間的部分）。
+    excel_bytes 也可以是 Google 試算表的 Sheets API 格子（encode_sheets_payload），這時不經過 openpyxl。
+    不是班表的工作表略過。偵測到的版面存兩份：
+        layout_cache    以內容 hash 為 key，同一份檔案重新解析時沿用
+        template_cache  以工作表名稱為 key，同一種範本的新檔案（例如下個月的班表）沿用
+    沿用時只讀上次是班表的工作表，各張以 fit_layout 確認仍然適用（不適用的那張重新偵測）；
+    範本的每一張都不適用時，改為逐張偵測整份檔案。
+
+    parallel：是否用行程池同時解析各工作表；預設在檔案夠大、有多張工作表、且有多顆 CPU 時才平行，
+    讓總時間接近最大的那一張，而不是各張相加。
+    """
+    key = content_hash(excel_bytes)
+    sheets_payload = is_sheets_payload(excel_bytes)
+    layouts = layout_cache.get(key)
+    template_key = None
+    if layouts is None:
+        if sheets_payload:
+            names = tuple(sheet["title"] for sheet in json.loads(excel_bytes)["sheets"])
+        else:
+            names = tuple(list_sheet_names(excel_bytes))
+        template_key = (SHEETS_PAYLOAD_FORMAT if sheets_payload else "xlsx", names)
+        layouts = template_cache.get(template_key)
+
+    if layouts is not None:
+        sheets = _parse_jobs(excel_bytes, [(layout.sheet_name, layout) for layout in layouts], sheets_payload, parallel)
+        if not sheets and template_key is not None:
+            sheets = _parse_jobs(excel_bytes, [(name, None) for name in names], sheets_payload, parallel)
+    else:
+        sheets = _parse_jobs(excel_bytes, [(name, None) for name in names], sheets_payload, parallel)
+    if not sheets:
+        raise ScheduleConvertError("❌ 班表格式不符：所有工作表都找不到日期列（需要一列連續的日期）")
+
+    layouts = tuple(sheet.grid.layout for sheet in sheets)
+    layout_cache.set(key, layouts)
+    if template_key is not None:
+        template_cache.set(template_key, layouts)
+    return ParsedWorkbook(sheets=sheets)
+
+
+def _parse_jobs(excel_bytes: bytes, jobs: list, sheets_payload: bool, parallel: bool = None) -> tuple:
+    """依序或以行程池解析 jobs，回傳班表工作表的 ParsedSheet（不是班表的略過）。"""
+    if sheets_payload:
+        # Google 試算表的格子已經是文字，解析很快，不必動用行程池
+        parallel = False
+    elif parallel is None:
+        parallel = len(jobs) > 1 and len(excel_bytes) >= PARALLEL_MIN_BYTES and (os.cpu_count() or 1) > 1
+
+    sheets = None
+    if parallel:
+        from concurrent.futures.process import BrokenProcessPool
+
+        names = [name for name, _ in jobs]
+        sheet_layouts = [layout for _, layout in jobs]
+        try:
+            sheets = list(get_sheet_pool().map(parse_sheet, [excel_bytes] * len(jobs), names, sheet_layouts))
+        except BrokenProcessPool:
+            # 子行程異常結束（例如記憶體不足被砍）：重建行程池，這次改在本行程解析
+            logger.warning("工作表解析行程池異常，改為依序解析")
+            _reset_sheet_pool()
+    if sheets is None:
+        sheets = (parse_sheets_payload if sheets_payload else parse_sheets)(excel_bytes, jobs)
+    return tuple(sheet for sheet in sheets if sheet is not None)
+
+
+def get_parsed_workbook(excel_bytes: bytes) -> ParsedWorkbook:
+    """
+    parse_workbook 加上快取：以內容 hash 為 key，
+    同一份班表不論是哪個 session、哪個代號轉換，都只解析一次。
+    回傳的物件為共用，請勿修改。
+    """
+    key = content_hash(excel_bytes)
+    parsed = parse_cache.get(key)
+    if parsed is None:
+        parsed = parse_workbook(excel_bytes)
+        parse_cache.set(key, parsed)
+    return parsed
+
+
+def _shift_month(year: int, month: int, delta: int) -> tuple:
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+def _first_date_month(days: list, weekdays: list, year: int, month: int) -> tuple:
+    """
+    跨月的日期列（29, 30, 31, 1 ...）第一個日期所在的年月：標題 / 檔名的年月可能是這一週開始或結束的那個月。
+    依序試 (year, month) 與前一個月，取跨月前的日期都存在、且有星期列時星期也相符的那一個；都不符時用 (year, month)。
+    """
+    wrap = next(i for i in range(1, len(days)) if days[i] < days[i - 1])
+    for y, m in ((year, month), _shift_month(year, month, -1)):
+        try:
+            names = [WEEKDAY_NAMES[date(y, m, d).weekday()] for d in days[:wrap]]
+        except ValueError:
+            continue
+        if weekdays is None or all(w == n for w, n in zip(weekdays, names) if w in WEEKDAY_NAMES):
+            return y, m
+    return year, month
+
+
+def build_date_mapping(grid: ScheduleGrid, year: int, month: int):
+    """
+    由日期列、星期列建立：
+    - date_mapping：[{日期, 星期}]，依欄位順序；班表沒有星期列時由日期推算
+    - col_index_map：(日期, 星期) -> Excel 欄位 index（1-based，第一個日期欄起）
+    跨月的週班表（29, 30, 31, 1 ...）日期變小時進到下個月；第一個日期的年月見 _first_date_month。
+    """
+    weekdays = grid.weekday_row
+    columns = [(i, int(d)) for i, d in enumerate(grid.date_row) if str(d).strip().isdigit()]
+    days = [d for _, d in columns]
+
+    y, m = year, month
+    if any(b < a for a, b in zip(days, days[1:])):
+        y, m = _first_date_month(
+            days, [weekdays[i] for i, _ in columns] if weekdays is not None else None, year, month,
+        )
+
+    def weekday_of(i, y, m, d):
+        if weekdays is not None:
+            return weekdays[i]
+        try:
+            return WEEKDAY_NAMES[date(y, m, d).weekday()]
+        except ValueError:
+            return ""
+
+    date_mapping = []
+    prev = None
+    for i, d in columns:
+        if prev is not None and d < prev:
+            y, m = _shift_month(y, m, 1)
+        prev = d
+        date_mapping.append({"日期": f"{y}-{m:02d}-{d:02d}", "星期": weekday_of(i, y, m, d)})
+
+    first_col = grid.layout.first_day_col + 1 if grid.layout is not None else 2
+    col_index_map = {
+        (entry["日期"], entry["星期"]): i + first_col
+        for i, entry in enumerate(date_mapping)
+    }
+    return date_mapping, col_index_map
+
+
+# ============================================================
+# 5) 找出代號所在的班
+# ============================================================
+# 每個 Simplifier 最多記住幾種工作內容的簡化結果（一個月的班表通常只有幾十到幾百種）
+SIMPLIFIER_MEMO_SIZE = 4096
+
+
+@dataclass(eq=False)
+class Simplifier:
+    """
+    整理好的縮寫表：去掉空白列、轉成文字後的 (原始, 簡化後) 依序取代。
+    同一種工作內容只簡化一次（memo），不同代號、不同月份的轉換都共用。
+    """
+    pairs: tuple
+    hash: str
+    _memo: dict = field(default_factory=dict, repr=False)
+
+    def __call__(self, content: str) -> str:
+        simplified = self._memo.get(content)
+        if simplified is None:
+            simplified = _LOOSE_PAREN_TIME_RE.sub("", content)
+            for k, v in self.pairs:
+                simplified = simplified.replace(k, v)
+            if len(self._memo) >= SIMPLIFIER_MEMO_SIZE:
+                self._memo.clear()
+            self._memo[content] = simplified
+        return simplified
+
+
+def get_simplifier(simplify_map: dict) -> Simplifier:
+    """縮寫表 -> Simplifier；相同內容的縮寫表共用同一個（simplifier_cache）。"""
+    key = simplify_map_hash(simplify_map)
+    simplifier = simplifier_cache.get(key)
+    if simplifier is None:
+        pairs = tuple((str(k), str(v)) for k, v in simplify_map.items() if pd.notna(k) and pd.notna(v))
+        simplifier = Simplifier(pairs=pairs, hash=key)
+        simplifier_cache.set(key, simplifier)
+    return simplifier
+
+
+def simplify_content(content: str, simplify_map: dict) -> str:
+    """去掉括號時間，並依縮寫表取代字詞。"""
+    return get_simplifier(simplify_map)(content)
+
+
+def match_code_rows(grid: ScheduleGrid, code: str, date_mapping: list, simplify_map: dict) -> list:
+    """
+    找出儲存格文字包含代號的所有班（依工作列、日期順序）。
+    每個不重複的儲存格文字只比對一次，再用 code_ids 一次選出所有儲存格。
+    回傳符合代號的 [{日期, 星期, 工作內容, 簡化後內容}]。
+    """
+    hit = np.fromiter((code in text for text in grid.code_table), dtype=bool, count=len(grid.code_table))
+    mask = hit[grid.code_ids] & (grid.day_idx < len(date_mapping))
+    entries = np.flatnonzero(mask)
+    rows = np.searchsorted(grid.row_ptr, entries, side="right") - 1
+
+    simplify = get_simplifier(simplify_map)
+    results = []
+    for row, day in zip(rows.tolist(), grid.day_idx[entries].tolist()):
+        content = grid.row_labels[row]
+        results.append({
+            "日期": date_mapping[day]["日期"],
+            "星期": date_mapping[day]["星期"],
+            "工作內容": content,
+            "簡化後內容": simplify(content),
+        })
+    return results
+
+
+# ============================================================
+# 6) 套用時間規則（含你新增的中2藥局發藥括號時間）
+# ============================================================
+# 時間規則是資料，不是程式：可以發布新版本（rule_sets.py）而不必重新部署。
+# 依序比對，第一個「關鍵字」符合的規則決定時間，之後的規則不再看；
+# 「獨立」的規則不參與這個順序，每一條都另外檢查（可覆寫前面設定的時間）。
+#   名稱       說明用
+#   關鍵字     工作內容包含其中任一個就符合
+#   同時包含   另外必須全部包含（可省略）
+#   獨立       true 時另外檢查（可省略）
+#   時間       依序檢查的選項，第一個條件都成立的選項決定起訖時間；都不成立就不設定時間
+#              條件（都可省略）：假日 true / false、星期（"一"~"日"）、包含（工作內容包含的字）
+#              時間：起、迄（"HH:MM"），或 "括號時間": true 使用工作內容裡的 (HH:MM-HH:MM)
+DEFAULT_TIME_RULES = [
+    {"名稱": "調劑複核（平日 vs 假日）", "關鍵字": ["調劑複核"], "時間": [
+        {"假日": True, "起": "11:00", "迄": "15:00"},
+        {"起": "13:30", "迄": "15:00"},
+    ]},
+    {"名稱": "門診藥局調劑（括號時間）", "關鍵字": ["門診藥局調劑"], "時間": [{"括號時間": True}]},
+    {"名稱": "中2藥局發藥（括號時間）", "關鍵字": ["中2藥局"], "時間": [{"括號時間": True}]},
+    {"名稱": "處方判讀 / 化療處方判讀 / 藥物諮詢 / PreESRD（依上午/下午/小夜）",
+     "關鍵字": ["處方判讀", "化療處方判讀", "藥物諮詢", "PreESRD"], "時間": [
+        {"包含": "上午", "起": "08:00", "迄": "12:00"},
+        {"包含": "下午", "起": "13:30", "迄": "17:30"},
+        {"包含": "小夜1hr", "起": "17:30", "迄": "18:30"},
+        {"包含": "小夜", "起": "17:30", "迄": "21:30"},
+    ]},
+    {"名稱": "抗凝藥師門診：週二上午 / 週三下午", "關鍵字": ["抗凝藥師門診"], "時間": [
+        {"星期": "二", "起": "08:30", "迄": "12:00"},
+        {"星期": "三", "起": "13:30", "迄": "17:00"},
+    ]},
+    {"名稱": "移植藥師門診：目前只有上午", "關鍵字": ["移植藥師門診"], "同時包含": ["上午"], "時間": [
+        {"起": "08:30", "迄": "12:00"},
+    ]},
+    {"名稱": "中藥局調劑", "關鍵字": ["中藥局調劑"], "時間": [{"起": "08:30", "迄": "12:00"}]},
+    {"名稱": "瑞德西偉審核", "關鍵字": ["瑞德西偉審核"], "時間": [{"起": "08:00", "迄": "20:00"}]},
+    {"名稱": "假日：非常班之諮詢與藥動服務三班", "關鍵字": ["假日非常班之諮詢與藥動服務"], "獨立": True, "時間": [
+        {"假日": True, "包含": "上午", "起": "08:00", "迄": "12:30"},
+        {"假日": True, "包含": "下午", "起": "12:30", "迄": "17:00"},
+        {"假日": True, "包含": "晚上", "起": "17:00", "迄": "21:00"},
+    ]},
+]
+
+_PAREN_TIME_RE = re.compile(r"\((\d{1,2}:\d{2})-(\d{1,2}:\d{2})\)")
+# 簡化後內容要去掉的括號時間（原始文字，可能是全形括號、全形冒號、各種連字號或中間有空白）
+_LOOSE_PAREN_TIME_RE = re.compile(r"[(（]\s*\d{1,2}\s*[:：]\s*\d{2}\s*[-－‐‑–—−~～〜]\s*\d{1,2}\s*[:：]\s*\d{2}\s*[)）]")
+_HHMM_RE = re.compile(r"^\d{1,2}:\d{2}$")
+_RULE_KEYS = {"名稱", "關鍵字", "同時包含", "獨立", "時間"}
+_OPTION_KEYS = {"假日", "星期", "包含", "起", "迄", "括號時間"}
+
+
+# ------------------------------------------------------------
+# 工作內容正規化：排班者多打一個空白、全形 / 半形不同，不應該讓時間規則對不上
+#   NFKC（全形英數、括號、冒號、全形空白轉成半形）→ 去掉所有空白 → 各種連字號、波浪號統一為 "-" → 英文小寫
+# 規則的關鍵字、同時包含、包含也以同樣方式正規化，所以「中正 2樓」「中正2樓」「中正　2樓」視為相同。
+# 只用在比對；簡化後內容（日曆上的標題）仍由原始文字產生。
+# ------------------------------------------------------------
+_LABEL_DASHES = str.maketrans({c: "-" for c in "‐‑‒–—―−﹣－~〜～"})
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# 最多記住幾種工作內容的正規化結果（每種工作內容只正規化一次）
+NORMALIZE_MEMO_SIZE = 8192
+_normalized_labels = {}
+
+
+def normalize_label(text: str) -> str:
+    """工作內容（或規則關鍵字）-> 比對用的正規化文字。"""
+    normalized = _normalized_labels.get(text)
+    if normalized is None:
+        normalized = unicodedata.normalize("NFKC", text)
+        normalized = _WHITESPACE_RE.sub("", normalized).translate(_LABEL_DASHES).casefold()
+        if len(_normalized_labels) >= NORMALIZE_MEMO_SIZE:
+            _normalized_labels.clear()
+        _normalized_labels[text] = normalized
+    return normalized
+
+
+def _normalize_rule(rule: dict) -> dict:
+    """規則裡用來比對的文字都正規化（時間、名稱等不變）。"""
+    normalized = dict(rule)
+    for key in ("關鍵字", "同時包含"):
+        if key in rule:
+            normalized[key] = [normalize_label(word) for word in rule[key]]
+    normalized["時間"] = [
+        {**option, "包含": normalize_label(option["包含"])} if "包含" in option else option
+        for option in rule["時間"]
+    ]
+    return normalized
+
+
+@dataclass(frozen=True, eq=False)
+class TimeRules:
+    """
+    一組時間規則（格式見 DEFAULT_TIME_RULES）與它的內容 hash（轉換結果快取 key 的一部分）。
+    ordered / independent 為正規化後的 (規則序號, 規則)；match 的結果依工作內容記住，每種工作內容只比對一次。
+    """
+    rules: tuple
+    hash: str
+    ordered: tuple = ()
+    independent: tuple = ()
+    _matches: dict = field(default_factory=dict, repr=False)
+
+    def match(self, label: str) -> tuple:
+        """工作內容 -> (正規化後內容, 符合的 (規則序號, 規則))；順序規則最多一條，之後是符合的獨立規則。"""
+        result = self._matches.get(label)
+        if result is None:
+            content = normalize_label(label)
+            first = next((item for item in self.ordered if _rule_matches(item[1], content)), None)
+            matched = ([first] if first is not None else []) + [
+                item for item in self.independent if _rule_matches(item[1], content)
+            ]
+            result = (content, tuple(matched))
+            if len(self._matches) >= NORMALIZE_MEMO_SIZE:
+                self._matches.clear()
+            self._matches[label] = result
+        return result
+
+
+def _check_time_rule(i: int, rule) -> None:
+    where = f"時間規則第 {i + 1} 條"
+    if not isinstance(rule, dict) or set(rule) - _RULE_KEYS:
+        raise ValueError(f"{where}：只能有 {'、'.join(sorted(_RULE_KEYS))} 欄位")
+    for key in ("關鍵字", "同時包含"):
+        words = rule.get(key, [])
+        if not isinstance(words, list) or not all(isinstance(w, str) and w for w in words):
+            raise ValueError(f"{where}：{key}必須是文字清單")
+    if not rule.get("關鍵字"):
+        raise ValueError(f"{where}：至少要有一個關鍵字")
+    options = rule.get("時間")
+    if not isinstance(options, list) or not options:
+        raise ValueError(f"{where}：時間必須是非空的清單")
+    for option in options:
+        if not isinstance(option, dict) or set(option) - _OPTION_KEYS:
+            raise ValueError(f"{where}：時間選項只能有 {'、'.join(sorted(_OPTION_KEYS))} 欄位")
+        if "星期" in option and (not isinstance(option["星期"], str) or option["星期"] not in WEEKDAY_NAMES):
+            raise ValueError(f"{where}：星期必須是「一」到「日」")
+        if option.get("括號時間"):
+            continue
+        if not all(isinstance(option.get(k), str) and _HHMM_RE.match(option[k]) for k in ("起", "迄")):
+            raise ValueError(f"{where}：時間選項需要「起」「迄」（HH:MM）或 \"括號時間\": true")
+
+
+def compile_time_rules(rules: list) -> TimeRules:
+    """檢查格式並計算 hash；格式不對拋出 ValueError（訊息可直接顯示）。"""
+    if not isinstance(rules, list):
+        raise ValueError("時間規則必須是清單")
+    for i, rule in enumerate(rules):
+        _check_time_rule(i, rule)
+    # RULES_VERSION 一起算進 hash：規則引擎或輸出格式改動時，舊的快取結果同樣失效
+    canonical = json.dumps({"engine": RULES_VERSION, "rules": rules}, ensure_ascii=False, sort_keys=True)
+    normalized = list(enumerate(_normalize_rule(rule) for rule in rules))
+    return TimeRules(
+        rules=tuple(rules),
+        hash=content_hash(canonical.encode("utf-8")),
+        ordered=tuple(item for item in normalized if not item[1].get("獨立")),
+        independent=tuple(item for item in normalized if item[1].get("獨立")),
+    )
+
+
+BUILTIN_TIME_RULES = compile_time_rules(DEFAULT_TIME_RULES)
+
+
+def _rule_matches(rule: dict, content: str) -> bool:
+    return any(k in content for k in rule["關鍵字"]) and all(k in content for k in rule.get("同時包含", ()))
+
+
+def _rule_times(rule: dict, content: str, weekday: str, is_holiday: bool):
+    """第一個條件都成立的時間選項 -> (起, 迄)；沒有成立的選項回傳 None。content 為正規化後的工作內容。"""
+    for option in rule["時間"]:
+        if "假日" in option and option["假日"] != is_holiday:
+            continue
+        if "星期" in option and option["星期"] != weekday:
+            continue
+        if "包含" in option and option["包含"] not in content:
+            continue
+        if option.get("括號時間"):
+            match = _PAREN_TIME_RE.search(content)
+            return (match.group(1), match.group(2)) if match else None
+        return option["起"], option["迄"]
+    return None
+
+
+def resolve_times(time_rules: TimeRules, label: str, weekday: str, is_holiday: bool) -> tuple:
+    """
+    一個班的時間：(起, 迄, 設定時間的規則序號, 符合的規則序號)。
+    沒有時間時起訖為 ""、規則序號為 -1；獨立規則可以覆寫前面的時間，序號為最後設定時間的規則。
+    """
+    content, matched = time_rules.match(label)
+    weekday = str(weekday).strip()
+    start, end, index = "", "", -1
+    for i, rule in matched:
+        times = _rule_times(rule, content, weekday, is_holiday)
+        if times is not None:
+            (start, end), index = times, i
+    return start, end, index, tuple(i for i, _ in matched)
+
+
+def apply_time_rules(df, holiday_map, column_map, time_rules: TimeRules = None, inputs: set = None):
+    """
+    df 欄位應含：日期、星期、工作內容、簡化後內容、Start Time、End Time
+    holiday_map：欄位底色假日判定
+    column_map： (日期, 星期) -> Excel 欄位 index（B=2 起）
+    time_rules：compile_time_rules 的結果，預設為內建規則（BUILTIN_TIME_RULES）
+    inputs：有給 set 時加入每個班套用規則的 (工作內容, 星期, 是否假日)（見 rule_inputs_cache）
+    """
+    time_rules = time_rules or BUILTIN_TIME_RULES
+
+    for idx, row in df.iterrows():
+        weekday = str(row["星期"]).strip()
+        col_idx = column_map.get((row["日期"], weekday), None)
+        is_holiday = bool(holiday_map.get(col_idx, False))
+        if inputs is not None:
+            inputs.add((row["工作內容"], weekday, is_holiday))
+
+        start, end, _, _ = resolve_times(time_rules, row["工作內容"], weekday, is_holiday)
+        if start:
+            df.at[idx, "Start Time"], df.at[idx, "End Time"] = start, end
+
+    return df
+
+
+# ============================================================
+# 7) 型別化的轉換結果與 Google 日曆 CSV
+# ============================================================
+_CLOCK_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*$")
+
+# 一天 1440 分鐘各自的 "HH:MM"，時間轉文字用查表（比逐筆 strftime 快得多）
+_CLOCK_LABELS = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)])
+
+
+def _parse_clock(text: str) -> float:
+    m = _CLOCK_RE.match(text)
+    return int(m.group(1)) * 60 + int(m.group(2)) if m else np.nan
+
+
+def clock_minutes(values: pd.Series) -> np.ndarray:
+    """"HH:MM" 文字 -> 當天的分鐘數（float）；空白或格式不對為 NaN。每種文字只解析一次。"""
+    codes, uniques = pd.factorize(values.astype(str))
+    parsed = np.array([_parse_clock(text) for text in uniques], dtype=float)
+    return parsed[codes] if len(codes) else np.empty(0)
+
+
+def _at_minutes(days: np.ndarray, minutes: np.ndarray) -> np.ndarray:
+    """日期（datetime64[D]）+ 分鐘數 -> datetime64[m]；分鐘數為 NaN 時為 NaT。"""
+    missing = np.isnan(minutes)
+    times = days.astype("datetime64[m]") + np.where(missing, 0, minutes).astype(np.int64).astype("timedelta64[m]")
+    times[missing] = np.datetime64("NaT")
+    return times
+
+
+def shift_frame(df_result: pd.DataFrame) -> pd.DataFrame:
+    """
+    apply_time_rules 的結果（日期、時間都是文字）-> 型別化的轉換結果（SHIFT_COLUMNS）。
+    結束時間不晚於開始時間視為跨夜，End 在隔天；沒有開始時間的班 Start、End 都是 NaT。
+    """
+    days = np.array(df_result["日期"].to_numpy(dtype=str), dtype="datetime64[D]")
+    start = clock_minutes(df_result["Start Time"])
+    end = clock_minutes(df_result["End Time"])
+    end = np.where(end <= start, end + 24 * 60, end)
+    end[np.isnan(start)] = np.nan
+    return pd.DataFrame({
+        "Subject": df_result["簡化後內容"].to_numpy(),
+        "Date": days.astype("datetime64[ns]"),
+        "Start": _at_minutes(days, start).astype("datetime64[ns]"),
+        "End": _at_minutes(days, end).astype("datetime64[ns]"),
+    })
+
+
+def empty_shift_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "Subject": pd.Series(dtype=object),
+        "Date": pd.Series(dtype="datetime64[ns]"),
+        "Start": pd.Series(dtype="datetime64[ns]"),
+        "End": pd.Series(dtype="datetime64[ns]"),
+    })
+
+
+def date_labels(times) -> np.ndarray:
+    """datetime64 -> "YYYY-MM-DD"；NaT 為 "NaT"。"""
+    return np.datetime_as_string(np.asarray(times, dtype="datetime64[ns]"), unit="D")
+
+
+def clock_labels(times) -> np.ndarray:
+    """datetime64 -> "HH:MM"；NaT 為空字串。"""
+    values = np.asarray(times, dtype="datetime64[ns]")
+    minutes = values.astype("datetime64[m]").astype(np.int64) % (24 * 60)
+    return np.where(np.isnat(values), "", _CLOCK_LABELS[minutes])
+
+
+def calendar_arrays(df_shifts: pd.DataFrame) -> dict:
+    """
+    型別化的轉換結果 -> Google 日曆匯入格式 {CSV 欄位: 文字陣列}（依 CSV_COLUMNS 順序）；
+    沒有時間的欄位為空字串。只用 numpy，不建立中間的 DataFrame（結果通常只有幾十列，建表的固定成本比轉換本身高）。
+    """
+    start_date = date_labels(df_shifts["Date"])
+    end = df_shifts["End"].to_numpy(dtype="datetime64[ns]")
+    return {
+        "Subject": df_shifts["Subject"].to_numpy(),
+        "Start Date": start_date,
+        "Start Time": clock_labels(df_shifts["Start"]),
+        "End Date": np.where(np.isnat(end), start_date, date_labels(end)),
+        "End Time": clock_labels(end),
+    }
+
+
+def calendar_columns(df_shifts: pd.DataFrame) -> pd.DataFrame:
+    """calendar_arrays 的 DataFrame 版本（頁面預覽用）。"""
+    return pd.DataFrame(calendar_arrays(df_shifts), index=df_shifts.index)
+
+
+def export_calendar_csv(df_shifts: pd.DataFrame) -> str:
+    """Google 日曆匯入用 CSV 文字（schedule_export.csv_export 的字串版本）。"""
+    return calendar_columns(df_shifts).to_csv(index=False)
+
+
+# ============================================================
+# 8) 轉換核心流程
+# ============================================================
+def simplify_map_hash(simplify_map: dict) -> str:
+    """縮寫表的 hash（保留順序：取代是依序進行的，順序不同結果可能不同）。"""
+    pairs = [
+        [str(k), str(v)] for k, v in simplify_map.items()
+        if pd.notna(k) and pd.notna(v)
+    ]
+    return content_hash(json.dumps(pairs, ensure_ascii=False).encode("utf-8"))
+
+
+# 整份班表（與代號、縮寫無關）的結果在 result_cache 裡的 key 第二個元素；見 workload_summary、rule_diagnostics
+WORKBOOK_RESULT_KINDS = ("全員統計", "規則診斷")
+
+
+def result_cache_key(
+    code: str, source: str, excel_bytes: bytes, drive_file_name: str, simplify_map: dict,
+    time_rules: TimeRules = None,
+) -> tuple:
+    """
+    轉換結果快取的 key：(內容 hash, 代號, 年月判斷依據, 縮寫表 hash, 時間規則 hash)。
+    Drive 來源的年月看檔名，所以檔名也是 key 的一部分；上傳 Excel 的年月只看內容。
+    時間規則 hash 放最後，規則發布新版本時 rule_sets 以它挑出要清掉的結果。
+    """
+    ym_basis = drive_file_name if source in DRIVE_SOURCES else None
+    rules_hash = (time_rules or BUILTIN_TIME_RULES).hash
+    return (content_hash(excel_bytes), code, ym_basis, simplify_map_hash(simplify_map), rules_hash)
+
+
+def resolve_sheet_months(parsed: ParsedWorkbook, source: str, drive_file_name: str) -> tuple:
+    """
+    各工作表的年月：Drive 來源都看檔名；上傳 Excel 看各自的標題，沒有標題的沿用第一個解析得到的年月。
+    回傳 ([(年, 月)]（依工作表順序）, 顯示用年月字串)；每一張都判斷不出來時拋出第一個錯誤。
+    """
+    resolved = []
+    first_error = None
+    for sheet in parsed.sheets:
+        try:
+            resolved.append(resolve_year_month(sheet.grid, source, drive_file_name))
+        except ScheduleConvertError as e:
+            first_error = first_error or e
+            resolved.append(None)
+    fallback = next((ym for ym in resolved if ym is not None), None)
+    if fallback is None:
+        raise first_error
+    months = [(year, month) for year, month, _ in (ym or fallback for ym in resolved)]
+    return months, fallback[2]
+
+
+def convert_schedule(
+    code: str,
+    source: str,
+    excel_bytes: bytes,
+    drive_file_name: str,
+    simplify_map: dict,
+    use_cache: bool = True,
+    time_rules: TimeRules = None,
+):
+    """
+    將已載入的班表 bytes + 班表代號 + 縮寫表
+    轉為該代號的班（型別化的 DataFrame，欄位見 SHIFT_COLUMNS）。
+    time_rules 為 compile_time_rules 的結果，預設為內建規則。
+
+    回傳 (df_shifts, year_month)；匯出成 CSV / ICS 時才轉成文字（calendar_columns、schedule_export）。
+    解析失敗拋出 ScheduleConvertError，找不到代號拋出 NoMatchingShiftsError。
+    結果存在 result_cache，同樣的輸入不論哪個 session 都直接回傳；回傳的 DataFrame 為共用，請勿修改。
+    """
+    if not use_cache:
+        return _convert_schedule(code, source, excel_bytes, drive_file_name, simplify_map, time_rules)
+
+    key = result_cache_key(code, source, excel_bytes, drive_file_name, simplify_map, time_rules)
+    result = result_cache.get(key)
+    if result is None:
+        inputs = set()
+        result = _convert_schedule(code, source, excel_bytes, drive_file_name, simplify_map, time_rules, inputs)
+        result_cache.set(key, result)
+        rule_inputs_cache.set(key, frozenset(inputs))
+    return result
+
+
+def _convert_schedule(
+    code: str, source: str, excel_bytes: bytes, drive_file_name: str, simplify_map: dict,
+    time_rules: TimeRules = None, inputs: set = None,
+):
+    """convert_schedule 的本體（不經過結果快取）；inputs 見 apply_time_rules。"""
+    parsed = get_parsed_workbook(excel_bytes)
+    months, year_month = resolve_sheet_months(parsed, source, drive_file_name)
+
+    # 每張工作表分別比對、套用時間規則（假日底色各自不同），再依工作表順序合併
+    frames = []
+    for sheet, (year, month) in zip(parsed.sheets, months):
+        date_mapping, col_index_map = build_date_mapping(sheet.grid, year, month)
+        results = match_code_rows(sheet.grid, code, date_mapping, simplify_map)
+        if not results:
+            continue
+        df_sheet = pd.DataFrame(results)
+        df_sheet["Start Time"] = ""
+        df_sheet["End Time"] = ""
+        frames.append(apply_time_rules(df_sheet, sheet.holiday_map, col_index_map, time_rules, inputs))
+
+    if not frames:
+        raise NoMatchingShiftsError("找不到符合此代號的班表內容。請確認代號是否正確，或該月未排班。")
+    df_result = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return shift_frame(df_result), year_month
+
+
+# ============================================================
+# 9) 全員統計：每個代號的班數、小夜、假日班與時數
+# ============================================================
+# 一格放多個代號時的分隔符號（與頁面上輸入多個代號的拆法相同）
+CODE_SEPARATOR_RE = re.compile(r"[\s,，、;；]+")
+
+SUMMARY_COLUMNS = ["代號", "班數", "小夜", "假日班", "總時數", "平均每週時數", "單週最高時數", "未定時間班數"]
+
+
+def discover_codes(grid: ScheduleGrid) -> list:
+    """儲存格文字以分隔符號拆開後得到的所有代號（依第一次出現的順序）。"""
+    codes = {}
+    for text in grid.code_table:
+        for token in CODE_SEPARATOR_RE.split(text):
+            if token:
+                codes.setdefault(token)
+    return list(codes)
+
+
+def shift_minutes(start: pd.Series, end: pd.Series) -> pd.Series:
+    """
+    "HH:MM" 起訖時間 -> 分鐘數；結束不晚於開始視為跨夜（加 24 小時），
+    與 shift_frame 的判斷相同。沒有時間的班為 NaN。
+    """
+    duration = clock_minutes(end) - clock_minutes(start)
+    return pd.Series(np.where(duration > 0, duration, duration + 24 * 60), index=start.index)
+
+
+SHIFT_TABLE_COLUMNS = ["code_idx", "row", "day", "date", "weekday", "night", "holiday", "minutes", "rule"]
+COMBO_COLUMNS = ["row", "day", "weekday", "holiday", "minutes", "rule", "matched"]
+
+
+def _sheet_shift_table(
+    sheet: ParsedSheet, codes: list, year: int, month: int, time_rules: TimeRules = None,
+) -> tuple:
+    """
+    一張工作表上「每個代號的每一個班」，回傳 (shifts, combos)：
+        shifts  [代號索引, 工作列, 日期序號, 日期, 星期, 小夜, 假日, 分鐘, 設定時間的規則序號]
+        combos  每個 (工作列, 星期, 假日) 組合的時間判斷：[..., 分鐘, 規則序號, 符合的規則序號]
+    時間只跟工作內容、星期、是否假日有關，所以時間規則只對這三者的每種組合各跑一次（resolve_times），
+    再以 merge 對回所有班，不必每個代號各轉換一次。
+    """
+    grid = sheet.grid
+    date_mapping, col_index_map = build_date_mapping(grid, year, month)
+
+    # (代號, 不重複儲存格文字) 的命中表；比對方式與 match_code_rows 相同（代號 in 儲存格）
+    hit = np.array([[code in text for text in grid.code_table] for code in codes], dtype=bool)
+    hit = hit.reshape(len(codes), len(grid.code_table))
+    valid = grid.day_idx < len(date_mapping)
+    code_idx, entries = np.nonzero(hit[:, grid.code_ids] & valid)
+    if not len(entries):
+        return pd.DataFrame(columns=SHIFT_TABLE_COLUMNS), pd.DataFrame(columns=COMBO_COLUMNS)
+
+    rows = np.searchsorted(grid.row_ptr, entries, side="right") - 1
+    days = grid.day_idx[entries]
+
+    day_dates = pd.to_datetime([entry["日期"] for entry in date_mapping], format="%Y-%m-%d").to_numpy()
+    day_weekdays = np.array([entry["星期"] for entry in date_mapping])
+    day_holidays = np.array([
+        bool(sheet.holiday_map.get(col_index_map.get((entry["日期"], entry["星期"])), False))
+        for entry in date_mapping
+    ])
+    night = np.array(["小夜" in label for label in grid.row_labels], dtype=bool)
+
+    shifts = pd.DataFrame({
+        "code_idx": code_idx,
+        "row": rows,
+        "day": days,
+        "date": day_dates[days],
+        "weekday": day_weekdays[days],
+        "holiday": day_holidays[days],
+        "night": night[rows],
+    })
+
+    # 時間規則：每個 (工作列, 星期, 假日) 組合取一個代表日期套用一次
+    time_rules = time_rules or BUILTIN_TIME_RULES
+    combos = shifts.drop_duplicates(["row", "weekday", "holiday"])[["row", "day", "weekday", "holiday"]]
+    resolved = [
+        resolve_times(time_rules, grid.row_labels[row], weekday, holiday)
+        for row, weekday, holiday in zip(
+            combos["row"].tolist(), combos["weekday"].tolist(), combos["holiday"].tolist(),
+        )
+    ]
+    start, end, rule, matched = zip(*resolved)
+    combos = combos.assign(
+        minutes=shift_minutes(pd.Series(start), pd.Series(end)).to_numpy(),
+        rule=np.array(rule, dtype=np.int64),
+        matched=list(matched),
+    )
+
+    shifts = shifts.merge(
+        combos[["row", "weekday", "holiday", "minutes", "rule"]], on=["row", "weekday", "holiday"], how="left",
+    )
+    return shifts[SHIFT_TABLE_COLUMNS], combos[COMBO_COLUMNS]
+
+
+def summarize_workload(
+    parsed: ParsedWorkbook, months: list, time_rules: TimeRules = None, inputs: set = None,
+) -> pd.DataFrame:
+    """
+    全部代號的統計（一次處理整份班表，不是每個代號各轉換一次）。
+    months：各工作表的 (年, 月)，見 resolve_sheet_months。
+    回傳欄位為 SUMMARY_COLUMNS，依代號第一次出現的順序；時數以 apply_time_rules 的起訖時間計算。
+    inputs：有給 set 時加入套用規則的 (工作內容, 星期, 是否假日) 組合（見 rule_inputs_cache）。
+    """
+    codes = list(dict.fromkeys(code for sheet in parsed.sheets for code in discover_codes(sheet.grid)))
+    frames = []
+    for sheet, (year, month) in zip(parsed.sheets, months):
+        shifts, combos = _sheet_shift_table(sheet, codes, year, month, time_rules)
+        frames.append(shifts)
+        if inputs is not None:
+            inputs.update(
+                (sheet.grid.row_labels[row], str(weekday).strip(), bool(holiday))
+                for row, weekday, holiday in zip(
+                    combos["row"].tolist(), combos["weekday"].tolist(), combos["holiday"].tolist(),
+                )
+            )
+    # 沒有班的工作表不參與合併（空表的 object 欄位會讓 date 失去 datetime64 型別）
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    shifts = pd.concat(frames, ignore_index=True)
+
+    shifts["hours"] = shifts["minutes"] / 60
+    # 週一為一週的開始
+    shifts["week"] = shifts["date"] - pd.to_timedelta(shifts["date"].dt.weekday, unit="D")
+    n_weeks = shifts["date"].nunique() / 7
+
+    by_code = shifts.groupby("code_idx")
+    summary = pd.DataFrame({
+        "班數": by_code.size(),
+        "小夜": by_code["night"].sum(),
+        "假日班": by_code["holiday"].sum(),
+        "總時數": by_code["hours"].sum(),
+        "未定時間班數": by_code.size() - by_code["minutes"].count(),
+    })
+    weekly = shifts.groupby(["code_idx", "week"])["hours"].sum()
+    summary["單週最高時數"] = weekly.groupby(level="code_idx").max()
+    summary["平均每週時數"] = summary["總時數"] / n_weeks
+    summary["代號"] = [codes[i] for i in summary.index]
+
+    summary = summary.sort_index().reset_index(drop=True)
+    summary[["班數", "小夜", "假日班", "未定時間班數"]] = summary[["班數", "小夜", "假日班", "未定時間班數"]].astype(int)
+    summary[["總時數", "平均每週時數", "單週最高時數"]] = summary[["總時數", "平均每週時數", "單週最高時數"]].round(1)
+    return summary[SUMMARY_COLUMNS]
+
+
+def workload_summary(
+    source: str, excel_bytes: bytes, drive_file_name: str, use_cache: bool = True,
+    time_rules: TimeRules = None,
+):
+    """
+    整份班表的全員統計，回傳 (df_summary, year_month)。
+    與代號、縮寫表無關，同一份班表（同一組時間規則）只計算一次（存在 result_cache）。
+    """
+    ym_basis = drive_file_name if source in DRIVE_SOURCES else None
+    time_rules = time_rules or BUILTIN_TIME_RULES
+    # 內容 hash 放第一個，Drive 檔案更新時與轉換結果一起被 invalidate_drive_files 清掉；
+    # 時間規則 hash 放最後（與 result_cache_key 相同），規則改版時一起清掉
+    key = (content_hash(excel_bytes), "全員統計", ym_basis, time_rules.hash)
+    result = result_cache.get(key) if use_cache else None
+    if result is None:
+        parsed = get_parsed_workbook(excel_bytes)
+        months, year_month = resolve_sheet_months(parsed, source, drive_file_name)
+        inputs = set()
+        result = (summarize_workload(parsed, months, time_rules, inputs), year_month)
+        if use_cache:
+            result_cache.set(key, result)
+            rule_inputs_cache.set(key, frozenset(inputs))
+    return result
+
+
+# ============================================================
+# 10) 沒有對應時間規則的工作內容
+# ============================================================
+UNMATCHED_COLUMNS = ["工作內容", "正規化後", "班數"]
+
+
+def unmatched_labels(parsed: ParsedWorkbook, time_rules: TimeRules = None) -> pd.DataFrame:
+    """
+    整份班表裡有排班、但沒有任何時間規則的關鍵字符合的工作內容（這些班會是全天事件）。
+    回傳欄位為 UNMATCHED_COLUMNS，依第一次出現的順序；班數為所有工作表該工作內容的非空儲存格數。
+    規則比對結果依工作內容記住（TimeRules.match），改了規則後重新檢查不必重新轉換。
+    """
+    time_rules = time_rules or BUILTIN_TIME_RULES
+    counts = {}
+    for sheet in parsed.sheets:
+        n_cells = np.diff(sheet.grid.row_ptr)
+        for label, n in zip(sheet.grid.row_labels, n_cells.tolist()):
+            if n:
+                counts[label] = counts.get(label, 0) + n
+    rows = []
+    for label, n in counts.items():
+        content, matched = time_rules.match(label)
+        if not matched:
+            rows.append((label, content, n))
+    return pd.DataFrame(rows, columns=UNMATCHED_COLUMNS)
+
+
+# ============================================================
+# 11) 時間規則診斷：每條規則的命中數與沒有時間的班（所有代號）
+# ============================================================
+RULE_STATS_COLUMNS = ["序號", "名稱", "符合班數", "設定時間班數", "狀態"]
+UNTIMED_COLUMNS = ["工作表", "工作內容", "日期", "星期", "假日", "代號", "班數", "原因"]
+
+UNTIMED_NO_RULE = "沒有符合的規則"
+UNTIMED_NO_OPTION = "規則符合，但星期 / 假日條件沒有適用的時間"
+
+
+def diagnose_rules(parsed: ParsedWorkbook, months: list, time_rules: TimeRules = None) -> tuple:
+    """
+    整份班表（所有代號）套用時間規則的情形，回傳 (df_rule_stats, df_untimed)：
+        df_rule_stats  每條規則的符合班數、設定時間班數與狀態（未使用 / 符合但沒有設定時間），欄位 RULE_STATS_COLUMNS
+        df_untimed     沒有時間（會匯出成全天事件）的每一格，欄位 UNTIMED_COLUMNS
+                       （代號為顯示用文字；班數為這一格的代號數，也就是這一格沒有時間的班數）
+    班數與全員統計相同，以「代號 × 班」計算（一格兩個代號算兩個班）；規則只對不重複的組合判斷一次。
+    """
+    time_rules = time_rules or BUILTIN_TIME_RULES
+    codes = list(dict.fromkeys(code for sheet in parsed.sheets for code in discover_codes(sheet.grid)))
+    n_rules = len(time_rules.rules)
+    matched_counts = np.zeros(n_rules, dtype=np.int64)
+    timed_counts = np.zeros(n_rules, dtype=np.int64)
+    untimed = []
+
+    for sheet_no, (sheet, (year, month)) in enumerate(zip(parsed.sheets, months), start=1):
+        shifts, combos = _sheet_shift_table(sheet, codes, year, month, time_rules)
+        if not len(shifts):
+            continue
+        sizes = shifts.groupby(["row", "weekday", "holiday"]).size()
+        for row, weekday, holiday, matched in zip(
+            combos["row"].tolist(), combos["weekday"].tolist(), combos["holiday"].tolist(), combos["matched"],
+        ):
+            for i in matched:
+                matched_counts[i] += sizes[(row, weekday, holiday)]
+        timed = shifts["rule"].to_numpy()
+        timed_counts += np.bincount(timed[timed >= 0], minlength=n_rules)
+
+        # 沒有時間的班依格子（工作列、日期）合併，列出格子裡的代號
+        no_time = shifts[shifts["rule"] < 0]
+        if not len(no_time):
+            continue
+        reasons = {
+            (row, weekday, holiday): UNTIMED_NO_OPTION if matched else UNTIMED_NO_RULE
+            for row, weekday, holiday, matched in zip(
+                combos["row"].tolist(), combos["weekday"].tolist(), combos["holiday"].tolist(), combos["matched"],
+            )
+        }
+        cells = no_time.groupby(["row", "day"], sort=True).agg(
+            date=("date", "first"), weekday=("weekday", "first"), holiday=("holiday", "first"),
+            codes=("code_idx", list),
+        )
+        for (row, _), date, weekday, holiday, code_ids in zip(
+            cells.index, date_labels(cells["date"]), cells["weekday"], cells["holiday"], cells["codes"],
+        ):
+            untimed.append((
+                sheet_no, sheet.grid.row_labels[row], date, weekday, bool(holiday),
+                "、".join(codes[i] for i in code_ids), len(code_ids), reasons[(row, weekday, holiday)],
+            ))
+
+    def status(matched: int, timed: int) -> str:
+        if not matched:
+            return "未使用"
+        return "符合但沒有設定時間" if not timed else ""
+
+    df_rule_stats = pd.DataFrame([
+        (i, rule.get("名稱", ""), int(matched_counts[i]), int(timed_counts[i]), status(matched_counts[i], timed_counts[i]))
+        for i, rule in enumerate(time_rules.rules)
+    ], columns=RULE_STATS_COLUMNS)
+    return df_rule_stats, pd.DataFrame(untimed, columns=UNTIMED_COLUMNS)
+
+
+def rule_diagnostics(
+    source: str, excel_bytes: bytes, drive_file_name: str, use_cache: bool = True,
+    time_rules: TimeRules = None,
+):
+    """
+    整份班表的時間規則診斷，回傳 (df_rule_stats, df_untimed, year_month)（見 diagnose_rules）。
+    與全員統計一樣存在 result_cache，key 的最後一個元素為時間規則 hash。
+    """
+    ym_basis = drive_file_name if source in DRIVE_SOURCES else None
+    time_rules = time_rules or BUILTIN_TIME_RULES
+    key = (content_hash(excel_bytes), "規則診斷", ym_basis, time_rules.hash)
+    result = result_cache.get(key) if use_cache else None
+    if result is None:
+        parsed = get_parsed_workbook(excel_bytes)
+        months, year_month = resolve_sheet_months(parsed, source, drive_file_name)
+        result = (*diagnose_rules(parsed, months, time_rules), year_month)
+        if use_cache:
+            result_cache.set(key, result)
+    return result
+
+
+def diagnostics_json(df_rule_stats: pd.DataFrame, df_untimed: pd.DataFrame, year_month: str, time_rules: TimeRules = None) -> dict:
+    """診斷結果 -> 可輸出成 JSON 的指標（頁面下載與 API 共用）。"""
+    time_rules = time_rules or BUILTIN_TIME_RULES
+    total = int(df_rule_stats["設定時間班數"].sum())
+    n_untimed_shifts = int(df_untimed["班數"].sum())
+    return {
+        "year_month": year_month,
+        "rules_hash": time_rules.hash,
+        "timed_shifts": total,
+        "untimed_shifts": n_untimed_shifts,
+        "rules": [
+            {"index": int(i), "name": name, "matched": int(matched), "timed": int(timed), "status": status}
+            for i, name, matched, timed, status in df_rule_stats.itertuples(index=False)
+        ],
+        "dead_rules": [int(i) for i in df_rule_stats.loc[df_rule_stats["符合班數"] == 0, "序號"]],
+        "untimed": [
+            {"sheet": int(sheet), "label": label, "date": date, "weekday": weekday, "holiday": bool(holiday),
+             "codes": codes, "shifts": int(shifts), "reason": reason}
+            for sheet, label, date, weekday, holiday, codes, shifts, reason in df_untimed.itertuples(index=False)
+        ],
+    }
@@ -0,0 +1,391 @@
+"""
+班表轉換結果的匯出（CSV / ICS / ZIP），邊產生邊寫入暫存檔。
+
+原本下載前要先把整份 CSV 組成一個字串放在 session 裡，下載按鈕再複製一份；
+多個代號或多個月份一次匯出時，記憶體會跟著匯出量一起長。這裡改成：
+    - 一列一列寫入 SpooledTemporaryFile：小檔案留在記憶體，超過 SPOOL_MAX_BYTES 自動改寫到磁碟
+    - ZIP 一次只寫一個檔案成員，寫完就丟
+    - 回傳唯讀的 ExportFile（io.RawIOBase），用 iter_chunks 分段送出（HTTP API，記憶體只有一段）；
+      頁面的下載按鈕每次按下拿一個 reader()，讀完隨即歸還，最後一個參照歸還時刪除暫存檔
+      （st.download_button 會把整份內容讀進 Streamlit 自己的記憶體儲存區，頁面下載的大小上限由它決定，
+      這裡只保證不再多留一份、暫存檔不必等垃圾回收）
+
+不依賴 Streamlit；轉換本身在 schedule_core。
+"""
+import csv
+import hashlib
+import io
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from schedule_core import CSV_COLUMNS, calendar_arrays
+
+
+# 超過這個大小就從記憶體改寫到磁碟暫存檔
+SPOOL_MAX_BYTES = 1024 * 1024
+
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+CALENDAR_TIMEZONE = "Asia/Taipei"
+
+# 台灣沒有日光節約時間，VTIMEZONE 只需要一段標準時間
+_VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    f"TZID:{CALENDAR_TIMEZONE}",
+    "BEGIN:STANDARD",
+    "DTSTART:19700101T000000",
+    "TZOFFSETFROM:+0800",
+    "TZOFFSETTO:+0800",
+    "TZNAME:CST",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+
+class ExportClosedError(ValueError):
+    """ExportFile 已經關閉（暫存檔已刪除），內容讀不到了；訊息可直接顯示給使用者。"""
+
+
+class ExportFile(io.RawIOBase):
+    """
+    SpooledTemporaryFile 的唯讀包裝；size 為總位元組數。關閉時一併刪除暫存檔。
+
+    建立者持有一個參照：自己用完直接 close()（或 with），要交給別人讀時改用 reader() 與 release()，
+    最後一個參照歸還時才關閉。例如背景工作的 ZIP：工作表持有一個，每次下載各持有一個。
+    """
+
+    def __init__(self, spooled, size: int):
+        super().__init__()
+        self._file = spooled
+        self.size = size
+        self._file.seek(0)
+        self._refs = 1
+        self._lock = threading.RLock()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def _read_at(self, offset: int, size: int) -> bytes:
+        """從 offset 讀 size 個位元組（不影響自己的讀取位置）；已經關閉時拋出 ExportClosedError。"""
+        with self._lock:
+            if self.closed:
+                raise ExportClosedError("❌ 這份下載內容已經過期，請重新產生後再下載。")
+            pos = self._file.tell()
+            self._file.seek(offset)
+            try:
+                return self._file.read(size)
+            finally:
+                self._file.seek(pos)
+
+    def getvalue(self) -> bytes:
+        """整份內容（不影響讀取位置）。已經關閉時拋出 ExportClosedError。"""
+        return self._read_at(0, self.size)
+
+    def iter_chunks(self, chunk_size: int = EXPORT_CHUNK_BYTES):
+        """從頭分段讀出內容，讀完自動關閉。"""
+        try:
+            self.seek(0)
+            while True:
+                chunk = self._file.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def reader(self) -> "ExportReader":
+        """新的讀取端（自己的讀取位置，持有一個參照）；已經關閉時拋出 ExportClosedError。"""
+        with self._lock:
+            if self.closed:
+                raise ExportClosedError("❌ 這份下載內容已經過期，請重新產生後再下載。")
+            self._refs += 1
+        return ExportReader(self)
+
+    def release(self):
+        """歸還一個參照；沒有任何參照時關閉並刪除暫存檔。"""
+        with self._lock:
+            self._refs -= 1
+            if self._refs <= 0:
+                self.close()
+
+    def close(self):
+        with self._lock:
+            if not self.closed:
+                self._file.close()
+            super().close()
+
+
+class ExportReader(io.RawIOBase):
+    """
+    ExportFile 的一個讀取端：讀到結尾或 close() 時歸還參照。
+    交給 st.download_button 的 data：Streamlit 從頭讀到尾（read()）後就歸還，不必等垃圾回收。
+    """
+
+    def __init__(self, export: ExportFile):
+        super().__init__()
+        self._export = export
+        self._pos = 0
+        self.size = export.size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._export._read_at(self._pos, len(buffer))
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        if not data:
+            self.close()
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self.size}[whence]
+        self._pos = max(base + offset, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._export.release()
+        super().close()
+
+
+def spooled_export(write, *args, **kwargs) -> ExportFile:
+    """呼叫 write(fileobj, *args, **kwargs) 寫入新的暫存檔，回傳可讀取的 ExportFile。"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+    try:
+        write(spooled, *args, **kwargs)
+        size = spooled.tell()
+    except BaseException:
+        spooled.close()
+        raise
+    return ExportFile(spooled, size)
+
+
+def download_reader(export, *args, **kwargs) -> ExportReader:
+    """
+    呼叫 export(*args, **kwargs)（csv_export、ics_export ...），回傳只給這一次下載用的讀取端：
+    給 st.download_button 按下時才執行的 data 用，Streamlit 讀到結尾時暫存檔隨即關閉刪除。
+    """
+    export_file = export(*args, **kwargs)
+    try:
+        return export_file.reader()
+    finally:
+        export_file.release()
+
+
+def _text_writer(fileobj, encoding: str = "utf-8"):
+    """在二進位檔案上包一層文字介面；用完要 detach，才不會連底下的檔案一起關掉。"""
+    return io.TextIOWrapper(fileobj, encoding=encoding, newline="", write_through=True)
+
+
+def _cell(value) -> str:
+    return "" if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value)
+
+
+# ============================================================
+# 1) CSV
+# ============================================================
+def write_calendar_csv(fileobj, df_shifts: pd.DataFrame):
+    """
+    把 convert_schedule 的 df_shifts 逐列寫成 Google 日曆匯入用 CSV。
+    內容與 schedule_core.export_calendar_csv（UTF-8、\\n 換行）逐位元組相同。
+    """
+    text = _text_writer(fileobj)
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    for row in zip(*calendar_arrays(df_shifts).values()):
+        writer.writerow([_cell(v) for v in row])
+    text.flush()
+    text.detach()
+
+
+def csv_export(df_shifts: pd.DataFrame) -> ExportFile:
+    return spooled_export(write_calendar_csv, df_shifts)
+
+
+def write_table_csv(fileobj, df: pd.DataFrame):
+    """一般表格（例如全員統計）寫成 CSV；加上 BOM，Excel 直接開啟中文才不會變亂碼。"""
+    text = _text_writer(fileobj, encoding="utf-8-sig")
+    df.to_csv(text, index=False, lineterminator="\n")
+    text.flush()
+    text.detach()
+
+
+def table_csv_export(df: pd.DataFrame) -> ExportFile:
+    return spooled_export(write_table_csv, df)
+
+
+# ============================================================
+# 2) ICS（iCalendar）
+# ============================================================
+def _ics_escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _ics_fold(line: str) -> str:
+    """RFC 5545：每行最多 75 bytes，續行以一個空白開頭（不切斷 UTF-8 字元）。"""
+    if len(line.encode("utf-8")) <= 75:
+        return line + "\r\n"
+    parts, current, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        limit = 75 if not parts else 74
+        if size + n > limit:
+            parts.append(current)
+            current, size = "", 0
+        current += ch
+        size += n
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def calendar_events(df_shifts: pd.DataFrame) -> dict:
+    """
+    型別化的轉換結果 -> 日曆事件 {summary, all_day, start, end}（numpy 陣列，start / end 為 datetime64）。
+    沒有時間的班當作整天事件（end 為隔天 00:00）；只有開始時間的班預設一小時。
+    跨夜的班 End 已經在隔天（schedule_core.shift_frame）。
+    """
+    day = df_shifts["Date"].to_numpy(dtype="datetime64[ns]")
+    start = df_shifts["Start"].to_numpy(dtype="datetime64[ns]")
+    end = df_shifts["End"].to_numpy(dtype="datetime64[ns]")
+    all_day = np.isnat(start)
+    end = np.where(np.isnat(end), start + np.timedelta64(1, "h"), end)
+    return {
+        "summary": [_cell(v) for v in df_shifts["Subject"].tolist()],
+        "all_day": all_day,
+        "start": np.where(all_day, day, start),
+        "end": np.where(all_day, day + np.timedelta64(1, "D"), end),
+    }
+
+
+def _ics_times(name: str, times: np.ndarray, all_day: np.ndarray) -> np.ndarray:
+    """DTSTART / DTEND 整行：整天事件只有日期，其他以 Asia/Taipei 當地時間表示。"""
+    def compact(values):
+        return np.char.replace(np.char.replace(values, "-", ""), ":", "")
+
+    if not len(times):
+        return np.array([], dtype=str)
+    return np.where(
+        all_day,
+        np.char.add(f"{name};VALUE=DATE:", compact(np.datetime_as_string(times, unit="D"))),
+        np.char.add(f"{name};TZID={CALENDAR_TIMEZONE}:", compact(np.datetime_as_string(times, unit="s"))),
+    )
+
+
+def event_uid(start_key: str, summary: str, calendar_name: str, ordinal: int = 0) -> str:
+    """
+    同一個班每次匯出都得到相同的 UID，重新匯入時日曆會更新而不是重複新增。
+    start_key：開始時間的 ISO 格式（整天事件只有日期）。
+    ordinal：同一個日曆裡開始時間與內容都相同的第幾個班（不同工作列簡化後可能相同）；
+    第一個（0）的 UID 與先前匯出的檔案相同，之後的各自不同，不會被日曆當成同一個事件覆蓋。
+    """
+    key = f"{calendar_name}|{start_key}|{summary}"
+    if ordinal:
+        key += f"|{ordinal}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + "@duty-schedule-app"
+
+
+def write_calendar_ics(fileobj, df_shifts: pd.DataFrame, calendar_name: str = "班表", dtstamp: datetime = None):
+    """
+    逐筆寫出 iCalendar；時間以 Asia/Taipei 表示。
+    dtstamp 沒給時用現在時間（給固定值可讓相同內容產生相同的檔案，方便做 ETag）。
+    日期時間整欄一次格式化，逐筆只剩組字串。
+    """
+    stamp = (dtstamp or datetime.now(timezone.utc)).astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    text = _text_writer(fileobj)
+
+    def emit(*lines):
+        text.write("".join(_ics_fold(line) for line in lines))
+
+    emit(*[
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//duty-schedule-app//班表轉換//ZH-TW",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_ics_escape(calendar_name)}",
+        f"X-WR-TIMEZONE:{CALENDAR_TIMEZONE}",
+        *_VTIMEZONE,
+    ])
+
+    events = calendar_events(df_shifts)
+    all_day = events["all_day"]
+    # UID 沿用 ISO 格式的開始時間（整天事件只有日期），與先前匯出的檔案相同，重新匯入不會重複
+    start_keys = np.where(
+        all_day,
+        np.datetime_as_string(events["start"], unit="D"),
+        np.datetime_as_string(events["start"], unit="s"),
+    )
+    dtstarts = _ics_times("DTSTART", events["start"], all_day)
+    dtends = _ics_times("DTEND", events["end"], all_day)
+
+    seen = {}
+    for summary, start_key, dtstart, dtend in zip(events["summary"], start_keys, dtstarts, dtends):
+        ordinal = seen.get((start_key, summary), 0)
+        seen[(start_key, summary)] = ordinal + 1
+        # 一個事件的所有行一次寫入
+        emit(
+            "BEGIN:VEVENT",
+            f"UID:{event_uid(start_key, summary, calendar_name, ordinal)}",
+            f"DTSTAMP:{stamp}",
+            dtstart,
+            dtend,
+            f"SUMMARY:{_ics_escape(summary)}",
+            "END:VEVENT",
+        )
+
+    emit("END:VCALENDAR")
+    text.flush()
+    text.detach()
+
+
+def ics_export(df_shifts: pd.DataFrame, calendar_name: str = "班表", dtstamp: datetime = None) -> ExportFile:
+    return spooled_export(write_calendar_ics, df_shifts, calendar_name, dtstamp)
+
+
+# ============================================================
+# 3) ZIP（多個代號 / 多個月份）
+# ============================================================
+def write_zip(fileobj, entries):
+    """
+    entries：可迭代的 (檔名, write)，write(member) 把內容寫進 ZIP 成員。
+    一次只處理一個成員；entries 可以是產生器，讓每個代號的轉換到寫入時才進行。
+    """
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, write in entries:
+            with zf.open(arcname, "w", force_zip64=True) as member:
+                write(member)
+
+
+def zip_export(entries) -> ExportFile:
+    return spooled_export(write_zip, entries)
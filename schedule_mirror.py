@@ -0,0 +1,307 @@
+"""
+共用班表的本機鏡像：Drive 很慢或連不上時，「現有共用班表檔案」照常可以選、可以載入。
+
+背景同步（MirrorSyncWorker，或命令列 sync）定期把 Drive 列檔結果與班表內容寫進 MIRROR_DIR：
+    index.json          最後一次列檔的 metadata（id / name / mimeType / modifiedTime / size）與同步時間
+    files/<id>.xlsx     檔名看得出年月（parse_year_month_from_drive_filename）的班表內容；
+    files/<id>.json     原生試算表以 Sheets API 讀取時為格子 JSON（與 download_drive_file_as_bytes 相同）
+只下載 modifiedTime 改變的檔案；某個檔案下載失敗時保留上一次同步的版本。寫入都先寫暫存檔再換名，
+讀取端不會看到寫到一半的檔案。
+
+頁面與 HTTP API 先讀鏡像：
+    list_schedule_files()      鏡像有同步過就用 index.json（不連線），否則照原本向 Drive 列檔；
+                               超過 MIRROR_MAX_AGE_SECONDS 沒有同步成功時改向 Drive 列檔，
+                               連 Drive 也失敗才用舊的鏡像（呼叫端以 mirror_is_stale 顯示警告）
+    load_schedule_file(meta)   選到的檔案在鏡像裡、而且是同一個版本時才從磁碟讀（用到時才讀，
+                               讀完放進 download_cache），否則照原本從 Drive 下載
+
+設定：SCHEDULE_MIRROR_DIR（預設 .cache/mirror；設為空字串關閉鏡像）、
+      SCHEDULE_MIRROR_MAX_AGE_SECONDS（預設 3600）。
+命令列（在 repo 根目錄）：
+    python -m schedule_mirror sync       同步一次（例如由 cron 執行）
+    python -m schedule_mirror list       列出鏡像內容
+不依賴 Streamlit。
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from drive_client import download_drive_file_as_bytes, list_recent_drive_files
+from schedule_cache import download_cache, remember_drive_file_content
+from schedule_core import parse_year_month_from_drive_filename
+
+
+logger = logging.getLogger(__name__)
+
+_mirror_dir = os.environ.get("SCHEDULE_MIRROR_DIR", str(Path(__file__).resolve().parent / ".cache" / "mirror"))
+MIRROR_DIR = Path(_mirror_dir) if _mirror_dir else None
+
+MIRROR_SYNC_SECONDS = 10 * 60
+
+# 鏡像超過這麼久沒有同步成功（同步已經連續失敗好幾輪）就不再直接使用，先試著向 Drive 列檔
+MIRROR_MAX_AGE_SECONDS = int(os.environ.get("SCHEDULE_MIRROR_MAX_AGE_SECONDS", 60 * 60))
+# 向 Drive 列檔失敗後，這段時間內直接用舊的鏡像（Drive 連不上時不必每次 rerun 都等列檔逾時）
+STALE_RETRY_SECONDS = 60
+
+# index.json 每個檔案另外記錄的欄位（不屬於 Drive metadata）
+_LOCAL_FIELDS = ("path", "bytes")
+
+_index_lock = threading.Lock()
+_index_cache = [None, None]   # [index.json 的 (mtime_ns, size), 內容]
+_sync_lock = threading.Lock()
+_live_retry_at = [0.0]        # 鏡像過期時，下一次可以再向 Drive 列檔的時間（time.monotonic）
+
+
+def _index_path() -> Path:
+    return MIRROR_DIR / "index.json"
+
+
+def _write_atomic(path: Path, data: bytes):
+    """先寫同目錄的暫存檔再換名，讀取端只會看到舊檔或完整的新檔。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+# ============================================================
+# 1) 讀取鏡像
+# ============================================================
+def load_index():
+    """鏡像的 index.json；沒有鏡像或無法讀取時回傳 None。檔案沒變時直接用上一次讀到的內容。"""
+    if MIRROR_DIR is None:
+        return None
+    path = _index_path()
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _index_lock:
+        if _index_cache[0] == signature:
+            return _index_cache[1]
+    try:
+        index = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning("無法讀取班表鏡像 %s：%s", path, e)
+        return None
+    with _index_lock:
+        _index_cache[:] = [signature, index]
+    return index
+
+
+def _public_meta(entry: dict) -> dict:
+    return {k: v for k, v in entry.items() if k not in _LOCAL_FIELDS}
+
+
+def mirror_metadata(file_id: str):
+    """檔案在鏡像中的 metadata；不在鏡像裡回傳 None。"""
+    index = load_index()
+    for entry in (index or {}).get("files", []):
+        if entry["id"] == file_id:
+            return _public_meta(entry)
+    return None
+
+
+def read_mirrored(file_id: str, modified_time: str = None):
+    """
+    鏡像裡的班表內容；沒有鏡像、不是同一個版本（modifiedTime 不同）或檔案不完整時回傳 None。
+    """
+    index = load_index()
+    entry = next((e for e in (index or {}).get("files", []) if e["id"] == file_id), None)
+    if entry is None or not entry.get("path"):
+        return None
+    if modified_time is not None and entry.get("modifiedTime") != modified_time:
+        return None
+    try:
+        data = (MIRROR_DIR / entry["path"]).read_bytes()
+    except OSError as e:
+        logger.warning("無法讀取鏡像的班表 %s：%s", entry["path"], e)
+        return None
+    if len(data) != entry.get("bytes"):
+        return None
+    return data
+
+
+def mirror_is_stale(synced_at: str) -> bool:
+    """鏡像的最後同步時間（index.json 的 synced_at）是否已經超過 MIRROR_MAX_AGE_SECONDS。"""
+    try:
+        synced = datetime.fromisoformat(synced_at)
+    except (TypeError, ValueError):
+        return True
+    return (datetime.now(timezone.utc) - synced).total_seconds() > MIRROR_MAX_AGE_SECONDS
+
+
+def list_schedule_files(months_approx_days: int = 92, page_size: int = 100) -> tuple:
+    """
+    「現有共用班表檔案」的清單，回傳 (files, synced_at)：
+    鏡像有同步過時用鏡像（不連線，synced_at 為最後同步時間），否則向 Drive 列檔（synced_at 為 None）。
+    鏡像過期（mirror_is_stale）時也向 Drive 列檔；列檔失敗才用舊的鏡像，synced_at 照實回傳，
+    呼叫端以 mirror_is_stale(synced_at) 判斷要不要提醒清單可能不是最新的。
+    """
+    index = load_index()
+    if index is None:
+        return list_recent_drive_files(months_approx_days=months_approx_days, page_size=page_size), None
+
+    files, synced_at = [_public_meta(entry) for entry in index.get("files", [])], index.get("synced_at")
+    if not mirror_is_stale(synced_at) or time.monotonic() < _live_retry_at[0]:
+        return files, synced_at
+    try:
+        return list_recent_drive_files(months_approx_days=months_approx_days, page_size=page_size), None
+    except Exception as e:
+        logger.warning("班表鏡像超過 %s 秒沒有同步（最後同步：%s），向 Drive 列檔也失敗：%s",
+                       MIRROR_MAX_AGE_SECONDS, synced_at, e)
+        _live_retry_at[0] = time.monotonic() + STALE_RETRY_SECONDS
+        return files, synced_at
+
+
+def load_schedule_file(meta: dict) -> tuple:
+    """
+    列檔結果的一個檔案 -> (bio, file_name)，與 download_drive_file_as_bytes 相同。
+    已下載過（download_cache）或鏡像裡有同一個版本時不連線。
+    """
+    file_id, file_name = meta["id"], meta.get("name", "")
+    cache_key = (file_id, meta.get("modifiedTime"))
+    cached = download_cache.get(cache_key)
+    if cached is not None:
+        data, file_name = cached
+        return io.BytesIO(data), file_name
+
+    data = read_mirrored(file_id, meta.get("modifiedTime"))
+    if data is None:
+        return download_drive_file_as_bytes(file_id, meta=meta)
+    download_cache.set(cache_key, (data, file_name))
+    remember_drive_file_content(file_id, data)
+    return io.BytesIO(data), file_name
+
+
+# ============================================================
+# 2) 同步
+# ============================================================
+def sync_mirror(files: list = None) -> dict:
+    """
+    向 Drive 列檔，下載有更新的班表寫進鏡像，並清掉已經不在清單裡的檔案。
+    files 為已經列好的清單（例如預載剛列的，見 prefetch.refresh_after_change）；沒給時重新列檔。
+    回傳 {"files": 清單檔案數, "downloaded": [檔名], "failed": [檔名], "removed": 刪除的檔案數}；
+    沒有設定鏡像目錄時回傳 None。列檔失敗時拋出例外，鏡像維持原狀。
+    """
+    if MIRROR_DIR is None:
+        return None
+    with _sync_lock:
+        if files is None:
+            files = list_recent_drive_files(use_cache=False)
+        previous = {entry["id"]: entry for entry in (load_index() or {}).get("files", [])}
+        entries, downloaded, failed = [], [], []
+        for meta in files:
+            entry = dict(meta)
+            old = previous.get(meta["id"])
+            if parse_year_month_from_drive_filename(meta.get("name")) is not None:
+                if old and old.get("path") and old.get("modifiedTime") == meta.get("modifiedTime") \
+                        and (MIRROR_DIR / old["path"]).exists():
+                    entry.update(path=old["path"], bytes=old["bytes"])
+                else:
+                    try:
+                        bio, _ = download_drive_file_as_bytes(meta["id"], meta=meta)
+                    except Exception as e:
+                        logger.warning("鏡像下載 %s 失敗，保留上一次同步的版本：%s", meta.get("name"), e)
+                        failed.append(meta.get("name", meta["id"]))
+                        if old:
+                            entry = dict(old)
+                    else:
+                        data = bio.getvalue()
+                        path = f"files/{meta['id']}{'.xlsx' if data[:2] == b'PK' else '.json'}"
+                        _write_atomic(MIRROR_DIR / path, data)
+                        entry.update(path=path, bytes=len(data))
+                        downloaded.append(meta.get("name", meta["id"]))
+            entries.append(entry)
+
+        index = {"synced_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "files": entries}
+        _write_atomic(_index_path(), json.dumps(index, ensure_ascii=False, indent=1).encode("utf-8"))
+
+        keep = {entry["path"] for entry in entries if entry.get("path")}
+        removed = 0
+        for path in (MIRROR_DIR / "files").glob("*"):
+            if path.is_file() and f"files/{path.name}" not in keep and not path.name.startswith("."):
+                path.unlink(missing_ok=True)
+                removed += 1
+    return {"files": len(entries), "downloaded": downloaded, "failed": failed, "removed": removed}
+
+
+class MirrorSyncWorker(threading.Thread):
+    """
+    每隔 interval 秒執行一次 sync_mirror 的背景執行緒。
+    清單經過 listing_cache：背景預載剛重新列過檔（或變更追蹤確認過沒有變更）時不必再列一次。
+    """
+
+    def __init__(self, interval: float = MIRROR_SYNC_SECONDS):
+        super().__init__(name="schedule-mirror", daemon=True)
+        self.interval = interval
+        self.last_result = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.last_result = sync_mirror(files=list_recent_drive_files())
+                logger.info("同步班表鏡像：%s", self.last_result)
+            except Exception:
+                # 同步失敗時頁面照常使用上一次同步的鏡像
+                logger.exception("同步班表鏡像失敗")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_mirror_sync_worker(interval: float = MIRROR_SYNC_SECONDS):
+    """沒有設定鏡像目錄時不啟動，回傳 None。"""
+    if MIRROR_DIR is None:
+        return None
+    worker = MirrorSyncWorker(interval=interval)
+    worker.start()
+    return worker
+
+
+# ============================================================
+# 3) 命令列
+# ============================================================
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m schedule_mirror", description="共用班表的本機鏡像")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("sync", help="同步一次")
+    sub.add_parser("list", help="列出鏡像內容")
+    args = parser.parse_args(argv)
+
+    if MIRROR_DIR is None:
+        print("SCHEDULE_MIRROR_DIR 設為空字串，鏡像已關閉", file=sys.stderr)
+        return 1
+
+    if args.command == "sync":
+        result = sync_mirror()
+        print(f"同步完成：清單 {result['files']} 個檔案，下載 {len(result['downloaded'])} 份，"
+              f"刪除 {result['removed']} 份")
+        for name in result["failed"]:
+            print(f"  ⚠️ 下載失敗（保留上一次的版本）：{name}")
+        return 1 if result["failed"] else 0
+
+    index = load_index()
+    if index is None:
+        print(f"{MIRROR_DIR} 還沒有同步過")
+        return 1
+    print(f"{MIRROR_DIR}（最後同步：{index.get('synced_at')}）")
+    for entry in index.get("files", []):
+        size = f"{entry['bytes'] / 1024:.0f}KB" if entry.get("path") else "只有 metadata"
+        print(f"  {entry.get('name', ''):<20} {entry.get('modifiedTime', '')}  {size}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())